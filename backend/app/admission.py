@@ -0,0 +1,194 @@
+"""
+Контроль допуска запросов к эндпоинтам, работающим с БД.
+
+Запросы делятся на классы: public (чтение календаря), admin (запросы с верным X-ADMIN-TOKEN)
+и worker (API напоминаний). У каждого класса свой лимит одновременных запросов и своя
+ограниченная очередь: всплеск публичного чтения не занимает места админских записей и worker-а,
+а суммарная параллельность не превышает пул соединений БД. Запрос, которому не хватило места
+в очереди или который прождал дольше дедлайна, сразу получает 503 с Retry-After.
+Лимиты, как и пул соединений, у каждого процесса свои (под gunicorn — на воркер).
+"""
+import asyncio
+import hmac
+import os
+import re
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from prometheus_client import Counter, Gauge, Histogram
+from starlette.responses import JSONResponse
+
+from common import tracing
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+ADMISSION_REQUESTS_TOTAL = Counter(
+    "admission_requests_total",
+    "Requests by admission class and outcome (admitted, queue_full, deadline)",
+    ["class", "outcome"],
+)
+ADMISSION_QUEUE_WAIT_SECONDS = Histogram(
+    "admission_queue_wait_seconds",
+    "Time requests spent waiting for a slot before being admitted",
+    ["class"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+ADMISSION_QUEUED = Gauge(
+    "admission_queued_requests",
+    "Requests currently waiting for a slot",
+    ["class"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    "admission_in_flight_requests",
+    "Requests currently holding a slot",
+    ["class"],
+    multiprocess_mode="livesum",
+)
+
+# Без лимита: метрики, документация, долгоживущий SSE (держал бы слот часами)
+EXEMPT_PATHS = {"/metrics", "/events/stream", "/docs", "/redoc", "/openapi.json"}
+WORKER_PATH_RE = re.compile(
+    r"^/events/(reminders/\w+|due_reminders|upcoming_reminders|\d+/mark_reminder_sent)$"
+)
+
+
+@dataclass
+class ClassLimits:
+    concurrency: int     # одновременно выполняемых запросов
+    queue: int           # сколько может ждать; больше — сразу 503
+    deadline: float      # сколько секунд можно ждать в очереди
+    retry_after: int     # подсказка клиенту в Retry-After
+
+
+def _limits(name: str, concurrency: int, queue: int, deadline: float, retry_after: int) -> ClassLimits:
+    prefix = f"ADMISSION_{name.upper()}_"
+    return ClassLimits(
+        concurrency=int(os.getenv(prefix + "CONCURRENCY", str(concurrency))),
+        queue=int(os.getenv(prefix + "QUEUE", str(queue))),
+        deadline=float(os.getenv(prefix + "DEADLINE", str(deadline))),
+        retry_after=int(os.getenv(prefix + "RETRY_AFTER", str(retry_after))),
+    )
+
+
+# По умолчанию в сумме 15 = pool_size (5) + max_overflow (10) пула SQLAlchemy
+CLASS_LIMITS = {
+    "public": _limits("public", concurrency=8, queue=64, deadline=2.0, retry_after=2),
+    "admin": _limits("admin", concurrency=4, queue=32, deadline=10.0, retry_after=1),
+    "worker": _limits("worker", concurrency=3, queue=16, deadline=5.0, retry_after=1),
+}
+
+
+class Rejected(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class Limiter:
+    """
+    Семафор с ограниченной FIFO-очередью и дедлайном ожидания.
+    Освободившийся слот передаётся первому ждущему напрямую, без гонки с новыми запросами.
+    """
+
+    def __init__(self, name: str, limits: ClassLimits):
+        self.name = name
+        self.limits = limits
+        self.active = 0
+        self._waiters: deque = deque()
+
+    async def acquire(self) -> float:
+        """Занимает слот; возвращает время ожидания в секундах или бросает Rejected."""
+        if self.active < self.limits.concurrency and not self._waiters:
+            self.active += 1
+            return 0.0
+        if len(self._waiters) >= self.limits.queue:
+            raise Rejected("queue_full")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.limits.deadline)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # слот успели передать в момент таймаута/отмены — возвращаем его следующему
+                self.release()
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise Rejected("deadline")
+        return time.monotonic() - started
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)  # слот переходит ждущему, active не меняется
+                return
+        self.active -= 1
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+
+_limiters = {name: Limiter(name, limits) for name, limits in CLASS_LIMITS.items()}
+
+
+def classify(method: str, path: str, headers: dict) -> str | None:
+    """Класс запроса или None, если запрос не ограничивается."""
+    if method == "OPTIONS" or path in EXEMPT_PATHS:
+        return None
+    if WORKER_PATH_RE.match(path):
+        return "worker"
+    token = headers.get("x-admin-token")
+    # Сравниваем байты: compare_digest не принимает строки с не-ASCII символами (заголовок декодирован как latin-1)
+    if ADMIN_TOKEN and token and hmac.compare_digest(token.encode("latin-1"), ADMIN_TOKEN.encode()):
+        return "admin"
+    # Без верного токена запись всё равно получит 401/403 — не занимаем ради неё админские слоты
+    return "public"
+
+
+class AdmissionMiddleware:
+    """ASGI-middleware: слот держится до конца ответа, включая потоковые (например, /calendar.ics)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        name = classify(scope["method"], scope["path"], headers)
+        if name is None:
+            return await self.app(scope, receive, send)
+
+        limiter = _limiters[name]
+        ADMISSION_QUEUED.labels(name).inc()
+        try:
+            waited = await limiter.acquire()
+        except Rejected as e:
+            ADMISSION_REQUESTS_TOTAL.labels(name, e.reason).inc()
+            response = JSONResponse(
+                {"detail": "Сервер перегружен, повторите запрос позже"},
+                status_code=503,
+                headers={"Retry-After": str(limiter.limits.retry_after)},
+            )
+            return await response(scope, receive, send)
+        finally:
+            ADMISSION_QUEUED.labels(name).dec()
+
+        ADMISSION_REQUESTS_TOTAL.labels(name, "admitted").inc()
+        ADMISSION_QUEUE_WAIT_SECONDS.labels(name).observe(waited)
+        current = tracing.current_span()
+        if current is not None:
+            current.set(**{"admission.class": name, "admission.wait_ms": round(waited * 1000, 3)})
+        ADMISSION_IN_FLIGHT.labels(name).inc()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            ADMISSION_IN_FLIGHT.labels(name).dec()
+            limiter.release()
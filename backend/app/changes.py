@@ -0,0 +1,177 @@
+"""
+Поток изменений событий для подписчиков (SSE /events/stream).
+
+После каждого commit crud публикует короткое сообщение {op, ids, dates, version}.
+Если задан REDIS_URL и установлен пакет redis, сообщения идут через Redis pub/sub
+и доходят до подписчиков всех реплик и процессов backend; иначе — только внутри процесса
+(достаточно для одного процесса в dev).
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+
+try:
+    import redis
+    import redis.asyncio as redis_asyncio
+except ImportError:  # redis не обязателен: без него работает локальная рассылка
+    redis = None
+    redis_asyncio = None
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL")
+CHANGES_CHANNEL = os.getenv("CHANGES_CHANNEL", "m15:event_changes")
+# Число процессов backend (ту же переменную читают gunicorn и uvicorn --workers)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY") or "1")
+# Сколько сообщений может накопить медленный подписчик, прежде чем получит resync
+SUBSCRIBER_QUEUE_SIZE = 256
+
+_lock = threading.Lock()
+_subscribers: set = set()
+_redis_pub = None
+_listener_task: asyncio.Task | None = None
+# Последняя версия данных, известная из сообщений об изменениях; None — неизвестна (читать из БД)
+_version: int | None = None
+
+
+class Subscription:
+    """Очередь сообщений одного подписчика, привязанная к его event loop."""
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def _put(self, message: dict) -> None:
+        if self.queue.full():
+            # Подписчик не успевает: выбрасываем накопленное и просим перечитать данные целиком
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            message = {"op": "resync", "version": message.get("version")}
+        self.queue.put_nowait(message)
+
+    def deliver(self, message: dict) -> None:
+        self.loop.call_soon_threadsafe(self._put, message)
+
+    async def get(self, timeout: float) -> dict | None:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+def subscribe() -> Subscription:
+    sub = Subscription()
+    with _lock:
+        _subscribers.add(sub)
+    return sub
+
+
+def unsubscribe(sub: Subscription) -> None:
+    with _lock:
+        _subscribers.discard(sub)
+
+
+def known_version() -> int | None:
+    """
+    Текущая версия данных без запроса к БД: каждая запись публикует новую версию, а сюда приходят
+    все публикации (с Redis — со всех реплик). None — после старта или разрыва связи с Redis,
+    а также без Redis при нескольких процессах: записи соседних процессов сюда не доходят.
+    """
+    if _redis_pub is None and WEB_CONCURRENCY > 1:
+        return None
+    return _version
+
+
+def note_version(version: int | None) -> None:
+    """Запоминает версию, если она новее известной; None забывает её (версию надо перечитать из БД)."""
+    global _version
+    with _lock:
+        if version is None:
+            _version = None
+        elif _version is None or version > _version:
+            _version = version
+
+
+def _fan_out(message: dict) -> None:
+    note_version(message.get("version"))
+    with _lock:
+        subs = list(_subscribers)
+    for sub in subs:
+        try:
+            sub.deliver(message)
+        except RuntimeError:
+            # event loop подписчика уже закрыт
+            unsubscribe(sub)
+
+
+def publish(op: str, ids: list, dates: list | None = None, version: int | None = None) -> None:
+    """
+    Публикует изменение (потокобезопасно, вызывается из crud после commit).
+    op — insert / update / delete; dates — затронутые даты (ISO), чтобы клиент понял, нужно ли перечитывать.
+    """
+    message = {
+        "op": op,
+        "ids": [i for i in ids if i is not None],
+        "dates": sorted({d.isoformat() if hasattr(d, "isoformat") else str(d) for d in (dates or []) if d is not None}),
+        "version": version,
+    }
+    # Свою запись процесс учитывает сразу, не дожидаясь эха из Redis: иначе GET сразу после записи
+    # в этом же процессе получил бы 304 или закэшированную ленту прошлой версии
+    note_version(version)
+    if _redis_pub is not None:
+        try:
+            _redis_pub.publish(CHANGES_CHANNEL, json.dumps(message))
+            return
+        except Exception as e:
+            logger.warning("Redis недоступен, изменения рассылаются только локально: %s", e)
+    _fan_out(message)
+
+
+async def _listen() -> None:
+    """Читает канал Redis и раздаёт сообщения локальным подписчикам (со всех реплик)."""
+    client = redis_asyncio.from_url(REDIS_URL)
+    while True:
+        try:
+            pubsub = client.pubsub()
+            await pubsub.subscribe(CHANGES_CHANNEL)
+            async for item in pubsub.listen():
+                if item.get("type") != "message":
+                    continue
+                try:
+                    _fan_out(json.loads(item["data"]))
+                except ValueError:
+                    continue
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("подписка на Redis прервана, переподключение: %s", e)
+            # Пока нет связи, подписчики могли пропустить изменения — просим перечитать
+            _fan_out({"op": "resync", "version": None})
+            await asyncio.sleep(1.0)
+
+
+def start() -> None:
+    """Включает рассылку через Redis, если он настроен (вызывается на старте приложения)."""
+    global _redis_pub, _listener_task
+    if not REDIS_URL or redis is None:
+        if REDIS_URL:
+            logger.warning("REDIS_URL задан, но пакет redis не установлен — рассылка только локальная")
+        if WEB_CONCURRENCY > 1:
+            logger.warning("без Redis подписчики /events/stream видят только изменения своего процесса (WEB_CONCURRENCY=%s)", WEB_CONCURRENCY)
+        return
+    _redis_pub = redis.Redis.from_url(REDIS_URL)
+    _listener_task = asyncio.get_running_loop().create_task(_listen())
+
+
+async def stop() -> None:
+    global _redis_pub, _listener_task
+    if _listener_task is not None:
+        _listener_task.cancel()
+        try:
+            await _listener_task
+        except asyncio.CancelledError:
+            pass
+        _listener_task = None
+    _redis_pub = None
@@ -1,10 +1,170 @@
 from sqlmodel import select, Session
-from .models import Event
+from .models import Event, DataVersion, Reminder
 from .database import engine
+from . import changes
+from sqlalchemy import update, delete, case, and_, or_, exists, func
 from sqlalchemy.exc import SQLAlchemyError
 from typing import List
+from collections import defaultdict
+import os
+import random
+import uuid
 from datetime import datetime, timedelta
-from datetime import date as date_type
+from datetime import date as date_type, time as time_type
+
+# Повторы неудачных напоминаний: экспоненциальная пауза base * 2^(n-1) (не больше max) со случайным
+# разбросом ±JITTER, после REMINDER_MAX_ATTEMPTS попыток напоминание уходит в dead
+REMINDER_MAX_ATTEMPTS = int(os.getenv("REMINDER_MAX_ATTEMPTS", "5"))
+REMINDER_RETRY_BASE_SECONDS = int(os.getenv("REMINDER_RETRY_BASE_SECONDS", "60"))
+REMINDER_RETRY_MAX_SECONDS = int(os.getenv("REMINDER_RETRY_MAX_SECONDS", "3600"))
+REMINDER_RETRY_JITTER = 0.2
+
+
+# Строки счётчика data_version: события (ETag ленты и сводки, поток /events/stream) и статусы
+# напоминаний (ack/fail/retry от worker-а не должны сбрасывать кэши календаря)
+EVENTS_VERSION = 1
+REMINDERS_VERSION = 2
+
+
+def _bump_version(session: Session, counter: int = EVENTS_VERSION) -> int:
+    """
+    Увеличивает версию в той же транзакции, что и изменение, и возвращает новую.
+    EVENTS_VERSION — перед commit каждой записи в event (после commit изменение публикуется в changes);
+    REMINDERS_VERSION — при смене статуса напоминаний без изменения событий.
+    """
+    session.exec(
+        update(DataVersion)
+        .where(DataVersion.id == counter)
+        .values(version=DataVersion.version + 1, updated_at=datetime.utcnow())
+    )
+    return session.exec(select(DataVersion.version).where(DataVersion.id == counter)).first() or 0
+
+
+def get_data_version() -> int:
+    """
+    Возвращает текущую версию данных (0, если счётчик ещё не создан).
+    """
+    with Session(engine) as session:
+        row = session.get(DataVersion, EVENTS_VERSION)
+        return row.version if row else 0
+
+
+def get_data_version_info() -> tuple:
+    """
+    Текущая версия данных и время последней записи (UTC): (version, updated_at).
+    """
+    with Session(engine) as session:
+        row = session.get(DataVersion, EVENTS_VERSION)
+        return (row.version, row.updated_at) if row else (0, None)
+
+
+def get_reminder_version() -> int:
+    """Версия статусов напоминаний (0, если счётчик ещё не создан)."""
+    with Session(engine) as session:
+        row = session.get(DataVersion, REMINDERS_VERSION)
+        return row.version if row else 0
+
+
+def event_reminder_offsets(ev: Event) -> List[int]:
+    """
+    Смещения напоминаний события в часах (по убыванию): reminder_offsets или одно reminder_offset_hours.
+    """
+    if ev.reminder_offsets:
+        try:
+            return sorted({int(h) for h in str(ev.reminder_offsets).split(",") if h.strip()}, reverse=True)
+        except ValueError:
+            pass
+    return [ev.reminder_offset_hours]
+
+
+def _event_start(ev: Event) -> datetime | None:
+    """Дата/время начала события (если time пуст — 00:00)."""
+    if ev.date is None:
+        return None
+    event_time = ev.time if ev.time else datetime.min.time()
+    return datetime.combine(ev.date, event_time)
+
+
+def _coerce_field(name: str, value):
+    """Строки дат/времени из API -> date/time, чтобы расчёт напоминаний и SQLite работали одинаково."""
+    if isinstance(value, str):
+        if name == 'date':
+            return date_type.fromisoformat(value) if value else None
+        if name in ('time', 'end_time'):
+            return time_type.fromisoformat(value) if value else None
+    return value
+
+
+def _sync_reminders(session: Session, events: List[Event], now: datetime | None = None) -> None:
+    """
+    Приводит строки reminder в соответствие с датой/временем/смещениями событий (в той же транзакции).
+    Напоминания ведутся для событий с reminder_sent == False или уже имеющих строки reminder.
+    Строки с прежним fire_at сохраняют статус; перенесённые снова становятся pending.
+    Из нескольких уже просроченных pending-напоминаний отправится только ближайшее к событию.
+    """
+    if now is None:
+        now = datetime.utcnow()
+    ids = [ev.id for ev in events if ev.id is not None]
+    if not ids:
+        return
+    existing = defaultdict(dict)
+    for row in session.exec(select(Reminder).where(Reminder.event_id.in_(ids))).all():
+        existing[row.event_id][row.offset_hours] = row
+
+    for ev in events:
+        rows = existing.get(ev.id, {})
+        start = _event_start(ev)
+        if start is None or (ev.reminder_sent and not rows):
+            for row in rows.values():
+                if row.status == 'pending':
+                    session.delete(row)
+            continue
+
+        desired = {off: start - timedelta(hours=off) for off in event_reminder_offsets(ev)}
+        for off, row in rows.items():
+            if off not in desired:
+                session.delete(row)
+        pending = []
+        for off, fire_at in desired.items():
+            row = rows.get(off)
+            if row is None:
+                row = Reminder(event_id=ev.id, offset_hours=off, fire_at=fire_at)
+                session.add(row)
+            elif row.fire_at != fire_at:
+                row.fire_at = fire_at
+                row.status = 'pending'
+                row.sent_message_id = None
+                row.sent_at = None
+                row.lease_id = None
+                row.lease_until = None
+                row.attempts = 0
+                row.next_attempt_at = None
+                row.last_error = None
+                session.add(row)
+            if row.status == 'pending':
+                pending.append(row)
+
+        overdue = sorted((r for r in pending if r.fire_at <= now), key=lambda r: r.fire_at)
+        for row in overdue[:-1]:
+            row.status = 'skipped'
+            session.add(row)
+        ev.reminder_sent = not any(r.status == 'pending' for r in pending)
+        session.add(ev)
+
+
+def backfill_reminders() -> int:
+    """
+    Создаёт строки reminder для событий, ждущих напоминания, но ещё не имеющих их
+    (события, созданные до появления таблицы reminder). Возвращает число обработанных событий.
+    """
+    with Session(engine) as session:
+        has_rows = exists().where(Reminder.event_id == Event.id)
+        rows = session.exec(select(Event).where(Event.reminder_sent == False, ~has_rows)).all()
+        if not rows:
+            return 0
+        _sync_reminders(session, rows)
+        session.commit()
+        return len(rows)
 
 
 def add_event(event: Event) -> Event:
@@ -14,8 +174,12 @@ def add_event(event: Event) -> Event:
     try:
         with Session(engine) as session:
             session.add(event)
+            session.flush()
+            _sync_reminders(session, [event])
+            version = _bump_version(session)
             session.commit()
             session.refresh(event)
+            changes.publish('insert', [event.id], [event.date], version)
             return event
     except SQLAlchemyError:
         raise
@@ -31,40 +195,357 @@ def get_public_events(limit: int = 500) -> List[Event]:
         return result[:limit]
 
 
-def get_due_reminders(now: datetime | None = None) -> List[Event]:
+def iter_dated_events(start_date: date_type | None = None, end_date: date_type | None = None, batch_size: int = 500):
+    """
+    Отдаёт события с датой (в диапазоне, если он задан) пачками по batch_size в порядке id.
+    Каждая пачка — отдельный короткий запрос по ключу (id больше последнего), поэтому длинная
+    выдача не держит соединение открытым и не собирает всю таблицу в память.
+    """
+    last_id = 0
+    while True:
+        with Session(engine) as session:
+            statement = select(Event).where(Event.date != None, Event.id > last_id)
+            if start_date:
+                statement = statement.where(Event.date >= start_date)
+            if end_date:
+                statement = statement.where(Event.date <= end_date)
+            rows = session.exec(statement.order_by(Event.id).limit(batch_size)).all()
+        if rows:
+            yield rows
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1].id
+
+
+# Канонические типы (как _canonical_type в main.py) для условий в SQL; при совпадении нескольких побеждает первый.
+# Шаблоны без первой буквы: lower() в SQLite не переводит кириллицу в нижний регистр
+_TYPE_PATTERNS = (
+    ('transfer', ('%transfer%', '%еренос%')),
+    ('homework', ('%homework%', '%омаш%')),
+    ('exam_control', ('%exam_control%', '%онтрольн%', '%кзамен%')),
+    ('schedule', ('%schedule%', '%аспис%')),
+    ('announcement', ('%announcement%', '%бъяв%')),
+)
+
+
+def _type_is(canonical: str):
+    """Условие «канонический тип события — canonical»."""
+    raw = func.lower(Event.type)
+    earlier = []
+    for name, patterns in _TYPE_PATTERNS:
+        match = or_(*(raw.like(p) for p in patterns))
+        if name == canonical:
+            return and_(match, *(~e for e in earlier))
+        earlier.append(match)
+    return and_(func.trim(raw) == canonical, *(~e for e in earlier))
+
+
+# Порядок событий в ячейке календаря, как во frontend: контрольная/экзамен, домашка, остальное.
+# Те же условия _type_is, что у exclude_types и счётчиков, — порядок не расходится с типом карточки
+_CELL_ORDER = case((_type_is('exam_control'), 0), (_type_is('homework'), 1), else_=2)
+
+
+def get_calendar_summary(start_date: date_type, end_date: date_type, titles_per_day: int = 5, exclude_types=()) -> tuple:
     """
-    Возвращает события, у которых reminder_sent == False и время напоминания <= now.
+    Сводка для сетки календаря: (counts, titles).
+    counts — [(дата, тип, число событий)] одним GROUP BY по индексу (date, type);
+    titles — первые titles_per_day событий каждого дня в порядке ячейки (только поля для мини-карточки).
+    exclude_types — канонические типы, которых нет ни в counts, ни в titles.
+    """
+    with Session(engine) as session:
+        in_range = (Event.date >= start_date, Event.date <= end_date, *(~_type_is(t) for t in exclude_types))
+        counts = session.exec(
+            select(Event.date, Event.type, func.count(Event.id))
+            .where(*in_range)
+            .group_by(Event.date, Event.type)
+            .order_by(Event.date)
+        ).all()
+        if titles_per_day <= 0:
+            return counts, []
+        rank = func.row_number().over(
+            partition_by=Event.date,
+            order_by=(_CELL_ORDER, Event.time == None, Event.time, Event.id),
+        ).label('rank')
+        ranked = select(
+            Event.id, Event.date, Event.type, Event.title, Event.subject, Event.body,
+            Event.time, Event.end_time, Event.room, Event.lesson_type, rank,
+        ).where(*in_range).subquery()
+        titles = session.execute(
+            select(ranked).where(ranked.c.rank <= titles_per_day).order_by(ranked.c.date, ranked.c.rank)
+        ).all()
+        return counts, titles
+
+
+def get_undated_events(limit: int = 500) -> List[Event]:
+    """
+    События без даты (например, импортированные без распознанной даты).
+    """
+    with Session(engine) as session:
+        statement = select(Event).where(Event.date == None).order_by(Event.id).limit(limit)
+        return session.exec(statement).all()
+
+
+def _retry_due(now: datetime):
+    """Условие: пауза после неудачной попытки (если была) уже прошла."""
+    return or_(Reminder.next_attempt_at == None, Reminder.next_attempt_at <= now)
+
+
+def get_due_reminders(now: datetime | None = None) -> List[tuple]:
+    """
+    Возвращает наступившие напоминания [(Reminder, Event)]: status == pending и fire_at <= now.
+    Запрос идёт по индексу (status, fire_at), события целиком не сканируются.
     """
     if now is None:
         now = datetime.utcnow()
     with Session(engine) as session:
-        statement = select(Event).where(Event.reminder_sent == False)
-        rows = session.exec(statement).all()
-        due = []
-        for ev in rows:
-            if ev.date is None:
-                continue
-            # Сборка datetime события (если time пуст — берем 00:00)
-            event_time = ev.time if ev.time else datetime.min.time()
-            event_dt = datetime.combine(ev.date, event_time)
-            remind_at = event_dt - timedelta(hours=ev.reminder_offset_hours)
-            if remind_at <= now:
-                due.append(ev)
-        return due
+        statement = (
+            select(Reminder, Event)
+            .join(Event, Event.id == Reminder.event_id)
+            .where(Reminder.status == 'pending', Reminder.fire_at <= now, _retry_due(now))
+            .order_by(Reminder.fire_at)
+        )
+        return session.exec(statement).all()
 
 
-def mark_reminder_sent(event_id: int) -> bool:
+def get_upcoming_reminders() -> List[dict]:
     """
-    Помечает reminder_sent = True для заданного event_id.
+    Возвращает все ожидающие напоминания как [{id, event_id, remind_at}], отсортированные по времени.
+    Для повторов remind_at — время следующей попытки. Используется worker для точного планирования.
     """
+    with Session(engine) as session:
+        statement = (
+            select(Reminder.id, Reminder.event_id, Reminder.fire_at, Reminder.next_attempt_at)
+            .where(Reminder.status == 'pending')
+        )
+        rows = [
+            {"id": rid, "event_id": event_id, "remind_at": max(fire_at, next_at) if next_at else fire_at}
+            for rid, event_id, fire_at, next_at in session.exec(statement).all()
+        ]
+        return sorted(rows, key=lambda r: r["remind_at"])
+
+
+def mark_reminder_sent(event_id: int, now: datetime | None = None) -> bool:
+    """
+    Устаревшее подтверждение по событию (новый worker шлёт POST /events/reminders/ack по id напоминаний).
+    Помечает отправленным только самое раннее наступившее pending-напоминание: остальные смещения
+    события ждут своего времени. reminder_sent = True, когда ожидающих напоминаний не осталось.
+    """
+    if now is None:
+        now = datetime.utcnow()
     with Session(engine) as session:
         ev = session.get(Event, event_id)
-        if ev:
+        if ev is None:
+            return False
+        pending = select(Reminder).where(Reminder.event_id == event_id, Reminder.status == 'pending')
+        row = session.exec(pending.where(Reminder.fire_at <= now).order_by(Reminder.fire_at).limit(1)).first()
+        if row is not None:
+            row.status = 'sent'
+            row.sent_at = now
+            row.lease_id = None
+            row.lease_until = None
+            session.add(row)
+            session.flush()
+            _bump_version(session, REMINDERS_VERSION)
+        flipped = not ev.reminder_sent and session.exec(pending.limit(1)).first() is None
+        if flipped:
             ev.reminder_sent = True
             session.add(ev)
+            version = _bump_version(session)
+        session.commit()
+        if flipped:
+            changes.publish('update', [event_id], [ev.date], version)
+        return True
+
+
+def claim_due_reminders(limit: int = 100, lease_seconds: int = 300, now: datetime | None = None) -> tuple:
+    """
+    Атомарно берёт в аренду до limit наступивших напоминаний и возвращает (lease_id, lease_until, [(Reminder, Event)]).
+    Берутся только pending-напоминания без аренды (или с истёкшей арендой), у которых прошла пауза
+    после неудачной попытки, самые ранние первыми.
+    PostgreSQL: строки-кандидаты блокируются FOR UPDATE SKIP LOCKED, параллельные worker-ы их пропускают.
+    SQLite: условный UPDATE (аренда свободна или истекла) — второй worker просто ничего не захватит.
+    """
+    if now is None:
+        now = datetime.utcnow()
+    lease_id = uuid.uuid4().hex
+    lease_until = now + timedelta(seconds=lease_seconds)
+    lease_free = or_(Reminder.lease_until == None, Reminder.lease_until < now)
+    with Session(engine) as session:
+        statement = (
+            select(Reminder.id)
+            .where(Reminder.status == 'pending', Reminder.fire_at <= now, lease_free, _retry_due(now))
+            .order_by(Reminder.fire_at)
+            .limit(limit)
+        )
+        if engine.dialect.name == 'postgresql':
+            statement = statement.with_for_update(skip_locked=True)
+        ids = session.exec(statement).all()
+        if not ids:
             session.commit()
-            return True
-        return False
+            return lease_id, lease_until, []
+        session.exec(
+            update(Reminder)
+            .where(Reminder.id.in_(ids), Reminder.status == 'pending', lease_free)
+            .values(lease_id=lease_id, lease_until=lease_until)
+        )
+        session.commit()
+        claimed = session.exec(
+            select(Reminder, Event)
+            .join(Event, Event.id == Reminder.event_id)
+            .where(Reminder.lease_id == lease_id)
+            .order_by(Reminder.fire_at)
+        ).all()
+        return lease_id, lease_until, claimed
+
+
+def release_reminders(lease_id: str, ids: List[int] | None = None) -> int:
+    """
+    Снимает аренду (например, после неудачной отправки), чтобы напоминания можно было взять снова.
+    ids — id напоминаний; если не задан — снимает всю аренду lease_id. Возвращает число освобождённых строк.
+    """
+    with Session(engine) as session:
+        statement = update(Reminder).where(Reminder.lease_id == lease_id)
+        if ids is not None:
+            statement = statement.where(Reminder.id.in_(ids))
+        result = session.exec(statement.values(lease_id=None, lease_until=None))
+        session.commit()
+        return result.rowcount
+
+
+def ack_reminders(acks: List[dict], lease_id: str | None = None) -> int:
+    """
+    Помечает пачку напоминаний отправленными одним UPDATE ... WHERE id IN (...) и снимает аренду.
+    acks — [{id напоминания, sent_message_id?}]. Если задан lease_id, подтверждаются только строки
+    этой аренды (напоминание, перенесённое во время отправки, снова pending и не затрётся).
+    События без оставшихся pending-напоминаний получают reminder_sent = True; версия данных меняется
+    и изменение публикуется только для них. Возвращает число строк.
+    """
+    ids = sorted({int(a["id"]) for a in acks})
+    if not ids:
+        return 0
+    now = datetime.utcnow()
+    values = {"status": "sent", "sent_at": now, "lease_id": None, "lease_until": None}
+    message_ids = {int(a["id"]): int(a["sent_message_id"]) for a in acks if a.get("sent_message_id")}
+    if message_ids:
+        values["sent_message_id"] = case(message_ids, value=Reminder.id, else_=Reminder.sent_message_id)
+    statement = update(Reminder).where(Reminder.id.in_(ids), Reminder.status == 'pending')
+    if lease_id is not None:
+        statement = statement.where(Reminder.lease_id == lease_id)
+    with Session(engine) as session:
+        result = session.exec(statement.values(**values))
+        if not result.rowcount:
+            session.commit()
+            return 0
+        event_ids = session.exec(select(Reminder.event_id).where(Reminder.id.in_(ids)).distinct()).all()
+        still_pending = exists().where(Reminder.event_id == Event.id, Reminder.status == 'pending')
+        flipped = session.exec(
+            select(Event.id).where(Event.id.in_(event_ids), Event.reminder_sent == False, ~still_pending)
+        ).all()
+        if flipped:
+            session.exec(
+                update(Event)
+                .where(Event.id.in_(flipped))
+                .values(reminder_sent=True)
+                .execution_options(synchronize_session=False)
+            )
+            version = _bump_version(session)
+        _bump_version(session, REMINDERS_VERSION)
+        session.commit()
+        if flipped:
+            changes.publish('update', list(flipped), [], version)
+        return result.rowcount
+
+
+def _retry_delay(attempts: int, retry_after: int | None = None) -> float:
+    """Пауза перед следующей попыткой: экспонента с разбросом, но не меньше retry_after от Telegram."""
+    delay = min(REMINDER_RETRY_MAX_SECONDS, REMINDER_RETRY_BASE_SECONDS * 2 ** max(0, attempts - 1))
+    delay *= random.uniform(1 - REMINDER_RETRY_JITTER, 1 + REMINDER_RETRY_JITTER)
+    if retry_after:
+        delay = max(delay, float(retry_after))
+    return delay
+
+
+def fail_reminders(lease_id: str, failures: List[dict], now: datetime | None = None) -> dict:
+    """
+    Записывает неудачные попытки отправки и снимает аренду.
+    failures — [{id напоминания, error?, permanent?, retry_after?}]. Каждое напоминание получает
+    attempts + 1 и next_attempt_at с экспоненциальной паузой; постоянная ошибка или исчерпанные
+    попытки переводят его в dead (отправка прекращается до ручного повтора).
+    Возвращает {"retry": n, "dead": n}.
+    """
+    if now is None:
+        now = datetime.utcnow()
+    by_id = {int(f["id"]): f for f in failures}
+    result = {"retry": 0, "dead": 0}
+    if not by_id:
+        return result
+    with Session(engine) as session:
+        rows = session.exec(
+            select(Reminder).where(
+                Reminder.id.in_(list(by_id)), Reminder.lease_id == lease_id, Reminder.status == 'pending'
+            )
+        ).all()
+        if not rows:
+            session.commit()
+            return result
+        for row in rows:
+            failure = by_id[row.id]
+            row.attempts = (row.attempts or 0) + 1
+            row.last_error = str(failure.get("error") or "")[:1000] or None
+            row.lease_id = None
+            row.lease_until = None
+            if failure.get("permanent") or row.attempts >= REMINDER_MAX_ATTEMPTS:
+                row.status = 'dead'
+                row.next_attempt_at = None
+                result["dead"] += 1
+            else:
+                row.next_attempt_at = now + timedelta(seconds=_retry_delay(row.attempts, failure.get("retry_after")))
+                result["retry"] += 1
+            session.add(row)
+        # События не меняются (reminder_sent остаётся False) — только версия напоминаний
+        _bump_version(session, REMINDERS_VERSION)
+        session.commit()
+        return result
+
+
+def get_dead_reminders(limit: int = 500) -> List[tuple]:
+    """Возвращает напоминания, отправка которых прекращена ([(Reminder, Event)], последние сначала)."""
+    with Session(engine) as session:
+        statement = (
+            select(Reminder, Event)
+            .join(Event, Event.id == Reminder.event_id)
+            .where(Reminder.status == 'dead')
+            .order_by(Reminder.fire_at.desc())
+            .limit(limit)
+        )
+        return session.exec(statement).all()
+
+
+def retry_reminder(reminder_id: int) -> bool:
+    """
+    Возвращает dead-напоминание в очередь: pending, счётчик попыток сброшен, отправка при ближайшем цикле.
+    Возвращает False, если такого dead-напоминания нет.
+    """
+    with Session(engine) as session:
+        row = session.get(Reminder, reminder_id)
+        if row is None or row.status != 'dead':
+            return False
+        row.status = 'pending'
+        row.attempts = 0
+        row.next_attempt_at = None
+        row.last_error = None
+        session.add(row)
+        ev = session.get(Event, row.event_id)
+        flipped = ev is not None and ev.reminder_sent
+        if flipped:
+            ev.reminder_sent = False
+            session.add(ev)
+            version = _bump_version(session)
+        _bump_version(session, REMINDERS_VERSION)
+        session.commit()
+        if flipped:
+            changes.publish('update', [row.event_id], [], version)
+        return True
 
 
 def set_sent_message(event_id: int, message_id: int) -> bool:
@@ -76,7 +557,9 @@ def set_sent_message(event_id: int, message_id: int) -> bool:
         if ev:
             ev.sent_message_id = message_id
             session.add(ev)
+            version = _bump_version(session)
             session.commit()
+            changes.publish('update', [event_id], [ev.date], version)
             return True
         return False
 
@@ -97,8 +580,12 @@ def delete_event(event_id: int) -> bool:
         ev = session.get(Event, event_id)
         if not ev:
             return False
+        deleted_date = ev.date
+        session.exec(delete(Reminder).where(Reminder.event_id == event_id))
         session.delete(ev)
+        version = _bump_version(session)
         session.commit()
+        changes.publish('delete', [event_id], [deleted_date], version)
         return True
 
 
@@ -110,11 +597,16 @@ def update_event(event_id: int, **fields) -> bool:
         ev = session.get(Event, event_id)
         if not ev:
             return False
+        dates = [ev.date]
         for k, v in fields.items():
             if hasattr(ev, k):
-                setattr(ev, k, v)
+                setattr(ev, k, _coerce_field(k, v))
         session.add(ev)
+        _sync_reminders(session, [ev])
+        version = _bump_version(session)
         session.commit()
+        dates.append(ev.date)
+        changes.publish('update', [event_id], dates, version)
         return True
 
 
@@ -126,16 +618,46 @@ def update_events_by_series(series_id: str, **fields) -> int:
         statement = select(Event).where(Event.series_id == series_id)
         rows = session.exec(statement).all()
         count = 0
+        ids = []
+        dates = []
         for ev in rows:
+            dates.append(ev.date)
             for k, v in fields.items():
                 if hasattr(ev, k):
-                    setattr(ev, k, v)
+                    setattr(ev, k, _coerce_field(k, v))
             session.add(ev)
+            ids.append(ev.id)
             count += 1
+        _sync_reminders(session, rows)
+        version = _bump_version(session)
         session.commit()
+        dates.extend(ev.date for ev in rows)
+        changes.publish('update', ids, dates, version)
         return count
 
 
+def get_events_by_series(series_id: str) -> List[Event]:
+    """
+    Возвращает все события серии.
+    """
+    with Session(engine) as session:
+        statement = select(Event).where(Event.series_id == series_id)
+        return session.exec(statement).all()
+
+
+def get_posted_events_in_range(start_date: date_type, end_date: date_type) -> List[Event]:
+    """
+    Возвращает события в диапазоне дат, у которых уже есть пост в Telegram (sent_message_id).
+    """
+    with Session(engine) as session:
+        statement = select(Event).where(
+            Event.date >= start_date,
+            Event.date <= end_date,
+            Event.sent_message_id != None,
+        )
+        return session.exec(statement).all()
+
+
 def delete_events_by_date(target_date: date_type) -> int:
     """
     Удаляет все события на определённую дату. Возвращает количество удалённых.
@@ -143,11 +665,17 @@ def delete_events_by_date(target_date: date_type) -> int:
     with Session(engine) as session:
         statement = select(Event).where(Event.date == target_date)
         rows = session.exec(statement).all()
+        ids = [ev.id for ev in rows]
+        dates = [ev.date for ev in rows]
+        if ids:
+            session.exec(delete(Reminder).where(Reminder.event_id.in_(ids)))
         count = 0
         for ev in rows:
             session.delete(ev)
             count += 1
+        version = _bump_version(session)
         session.commit()
+        changes.publish('delete', ids, dates, version)
         return count
 
 
@@ -158,9 +686,15 @@ def delete_events_in_range(start_date: date_type, end_date: date_type) -> int:
     with Session(engine) as session:
         statement = select(Event).where(Event.date >= start_date, Event.date <= end_date)
         rows = session.exec(statement).all()
+        ids = [ev.id for ev in rows]
+        dates = [ev.date for ev in rows]
+        if ids:
+            session.exec(delete(Reminder).where(Reminder.event_id.in_(ids)))
         count = 0
         for ev in rows:
             session.delete(ev)
             count += 1
+        version = _bump_version(session)
         session.commit()
+        changes.publish('delete', ids, dates, version)
         return count
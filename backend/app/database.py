@@ -1,11 +1,21 @@
+import logging
 import os
 from sqlmodel import SQLModel, create_engine, Session
+from sqlalchemy import text
+from .models import DataVersion
+from common import tracing
 from typing import Generator
 
+logger = logging.getLogger(__name__)
+
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./dev.db")
 
 # echo=False для менее разговорчивого лога; включи True при отладке
 engine = create_engine(DATABASE_URL, echo=False)
+# Спан на каждый SQL-запрос внутри трассы запроса
+tracing.instrument_sqlalchemy(engine)
+# Схема готова в этом процессе или в мастере gunicorn до fork (gunicorn.conf.py)
+_schema_ready = False
 
 
 def init_db() -> None:
@@ -13,26 +23,65 @@ def init_db() -> None:
     Создаёт таблицы в БД, если их нет.
     Вызывается при старте приложения.
     """
+    global _schema_ready
     SQLModel.metadata.create_all(engine)
+    # Строки счётчиков версии: 1 — события, 2 — статусы напоминаний (crud.EVENTS_VERSION / REMINDERS_VERSION)
+    with Session(engine) as session:
+        for counter in (1, 2):
+            if session.get(DataVersion, counter) is None:
+                session.add(DataVersion(id=counter, version=0))
+        session.commit()
     # Попытка добавить колонны, если их нет (безопасно для sqlite и postgres)
+    _ensure_columns('event', [
+        ('end_time', 'time', 'TEXT'),
+        ('room', 'TEXT', 'TEXT'),
+        ('teacher', 'TEXT', 'TEXT'),
+        ('series_id', 'TEXT', 'TEXT'),
+        ('reminder_offsets', 'TEXT', 'TEXT'),
+    ])
+    _ensure_columns('reminder', [
+        ('attempts', 'INTEGER NOT NULL DEFAULT 0', 'INTEGER NOT NULL DEFAULT 0'),
+        ('next_attempt_at', 'TIMESTAMP', 'DATETIME'),
+        ('last_error', 'TEXT', 'TEXT'),
+    ])
+    # create_all не добавляет индексы в уже существующие таблицы
+    _ensure_index('ix_event_date_type', 'event', ['date', 'type'])
+    _schema_ready = True
+
+
+def schema_ready() -> bool:
+    return _schema_ready
+
+
+def _ensure_columns(table: str, columns: list) -> None:
+    """
+    Добавляет недостающие колонки: columns — [(имя, тип PostgreSQL, тип SQLite)].
+    Каждая колонка отдельно, чтобы уже существующая не мешала добавить следующие.
+    """
+    dialect = engine.dialect.name
+    for name, pg_type, sqlite_type in columns:
+        try:
+            with engine.begin() as conn:
+                if dialect == 'postgresql':
+                    # PostgreSQL поддерживает IF NOT EXISTS
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {name} {pg_type}"))
+                else:
+                    # SQLite / другие БД: попытка добавить колонну, игнорируем ошибку если она уже есть
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {sqlite_type}"))
+        except Exception:
+            # некритично; если схема уже есть или БД не позволяет, игнорируем
+            pass
+
+
+def _ensure_index(name: str, table: str, columns: list) -> None:
+    """
+    Создаёт индекс, если его нет (IF NOT EXISTS понимают и PostgreSQL, и SQLite).
+    """
     try:
-        with engine.connect() as conn:
-            dialect = engine.dialect.name
-            if dialect == 'postgresql':
-                # PostgreSQL поддерживает IF NOT EXISTS
-                conn.execute("ALTER TABLE event ADD COLUMN IF NOT EXISTS end_time time")
-                conn.execute("ALTER TABLE event ADD COLUMN IF NOT EXISTS room TEXT")
-                conn.execute("ALTER TABLE event ADD COLUMN IF NOT EXISTS teacher TEXT")
-                conn.execute("ALTER TABLE event ADD COLUMN IF NOT EXISTS series_id TEXT")
-            else:
-                # SQLite / другие БД: попытка добавить колонны, игнорируем ошибки
-                conn.execute("ALTER TABLE event ADD COLUMN end_time TEXT")
-                conn.execute("ALTER TABLE event ADD COLUMN room TEXT")
-                conn.execute("ALTER TABLE event ADD COLUMN teacher TEXT")
-                conn.execute("ALTER TABLE event ADD COLUMN series_id TEXT")
-    except Exception:
-        # некритично; если схема уже есть или БД не позволяет, игнорируем
-        pass
+        with engine.begin() as conn:
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"))
+    except Exception as e:
+        logger.warning("не удалось создать индекс %s: %s", name, e)
 
 
 def get_session() -> Generator[Session, None, None]:
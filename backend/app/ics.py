@@ -0,0 +1,151 @@
+"""
+Лента событий в формате iCalendar (RFC 5545) для подписки из календаря телефона.
+
+Текст ленты зависит только от событий и фильтров, поэтому отрендеренная лента кэшируется
+по (версия данных, фильтры) и отдаётся повторно, пока в event ничего не записали.
+"""
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+# Зона времени событий (IANA, например Europe/Moscow); без неё время «плавающее» — как в БД
+CALENDAR_TZID = os.getenv("CALENDAR_TZID")
+CALENDAR_NAME = os.getenv("CALENDAR_NAME", "М15")
+# Сколько вариантов ленты (разных фильтров) держать в кэше
+FEED_CACHE_SIZE = int(os.getenv("CALENDAR_FEED_CACHE_SIZE", "64"))
+MEDIA_TYPE = "text/calendar"
+PRODID = "-//M15//University Telegram Scheduler//RU"
+
+
+def _escape(value) -> str:
+    return (
+        str(value).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+        .replace("\r\n", "\\n").replace("\n", "\\n").replace("\r", "\\n")
+    )
+
+
+def _fold(line: str) -> str:
+    """Строка контента, свёрнутая по 75 октетов (продолжение начинается с пробела) и с CRLF."""
+    raw = line.encode("utf-8")
+    if len(raw) <= 75:
+        return line + "\r\n"
+    parts, start, limit = [], 0, 75
+    while start < len(raw):
+        end = min(start + limit, len(raw))
+        # не режем многобайтный символ UTF-8 посередине
+        while end < len(raw) and (raw[end] & 0xC0) == 0x80:
+            end -= 1
+        parts.append(raw[start:end].decode("utf-8"))
+        start, limit = end, 74
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _local(d: date, t: time) -> str:
+    stamp = datetime.combine(d, t).strftime("%Y%m%dT%H%M%S")
+    return f";TZID={CALENDAR_TZID}:{stamp}" if CALENDAR_TZID else f":{stamp}"
+
+
+def http_date(value: datetime) -> str:
+    """Дата для Last-Modified; value — наивное время UTC (как updated_at в БД)."""
+    return format_datetime(value.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+
+def not_modified_since(header: str | None, last_modified: datetime) -> bool:
+    """True, если If-Modified-Since не раньше last_modified (с точностью до секунды)."""
+    if not header:
+        return False
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return last_modified.replace(microsecond=0) <= since
+
+
+def etag_matches(header: str | None, etag: str) -> bool:
+    """Сравнение If-None-Match со списком тегов (или *)."""
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def header() -> bytes:
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{_escape(CALENDAR_NAME)}",
+    ]
+    if CALENDAR_TZID:
+        lines.append(f"X-WR-TIMEZONE:{CALENDAR_TZID}")
+    return "".join(_fold(line) for line in lines).encode("utf-8")
+
+
+FOOTER = b"END:VCALENDAR\r\n"
+
+
+def vevent(ev, category: str, stamp: datetime, link: str) -> str:
+    """VEVENT одного события; stamp (UTC) — время последней записи в данные, одинаковое для всей ленты."""
+    summary = ev.title or ev.subject or (ev.body or "").strip().split("\n", 1)[0][:80] or category
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:event-{ev.id}@m15",
+        f"DTSTAMP:{stamp.strftime('%Y%m%dT%H%M%SZ')}",
+    ]
+    if ev.time:
+        lines.append("DTSTART" + _local(ev.date, ev.time))
+        if ev.end_time and ev.end_time > ev.time:
+            lines.append("DTEND" + _local(ev.date, ev.end_time))
+    else:
+        lines.append(f"DTSTART;VALUE=DATE:{ev.date.strftime('%Y%m%d')}")
+        lines.append(f"DTEND;VALUE=DATE:{(ev.date + timedelta(days=1)).strftime('%Y%m%d')}")
+    lines.append(f"SUMMARY:{_escape(summary)}")
+    description = [ev.body or ""]
+    if ev.teacher:
+        description.append(f"Преподаватель: {ev.teacher}")
+    description = "\n".join(d for d in description if d)
+    if description:
+        lines.append(f"DESCRIPTION:{_escape(description)}")
+    if ev.room:
+        lines.append(f"LOCATION:{_escape(ev.room)}")
+    if category:
+        lines.append(f"CATEGORIES:{_escape(category)}")
+    lines.append(f"URL:{link}")
+    lines.append("END:VEVENT")
+    return "".join(_fold(line) for line in lines)
+
+
+class FeedCache:
+    """
+    Отрендеренные ленты {(версия, фильтры): (тело, last_modified)}.
+    Запись новой версии выбрасывает ленты старых версий; всего не больше FEED_CACHE_SIZE вариантов.
+    """
+
+    def __init__(self, size: int = FEED_CACHE_SIZE):
+        self.size = size
+        self._items: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> tuple | None:
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+            return item
+
+    def put(self, key: tuple, body: bytes, last_modified: datetime) -> None:
+        version = key[0]
+        with self._lock:
+            for old in [k for k in self._items if k[0] < version]:
+                del self._items[old]
+            if any(k[0] > version for k in self._items):
+                return
+            self._items[key] = (body, last_modified)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
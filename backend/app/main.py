@@ -1,20 +1,32 @@
+import logging
 import os
 import time as _time
+import uuid
 from fastapi import FastAPI, HTTPException, Header, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import Path
+from fastapi.concurrency import run_in_threadpool
 from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
-from app.database import init_db
-from app.schemas import EventCreate, EventPublic
+from starlette.responses import Response, JSONResponse, StreamingResponse
+from starlette.requests import Request
+import json
+from app.database import init_db, schema_ready
+from app import telegram_sync, changes, ics
+from app.admission import AdmissionMiddleware
+from app.schemas import EventCreate, EventPublic, ReminderAckRequest, ReminderClaimRequest, ReminderReleaseRequest, ReminderFailRequest, normalize_reminder_offsets
 from app.models import Event
-from app.crud import add_event, get_public_events, get_due_reminders, mark_reminder_sent, set_sent_message
+from app.crud import add_event, get_public_events, get_due_reminders, mark_reminder_sent, set_sent_message, event_reminder_offsets
 import httpx
 from typing import List, Optional
 import calendar as _calendar
-from datetime import datetime, date, time
-from pydantic import BaseModel
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from datetime import datetime, date, time, timedelta
+from pydantic import BaseModel, validator
+from prometheus_client import CollectorRegistry, Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST, multiprocess
+from common import jsonlog, tracing
+
+jsonlog.setup("backend")
+tracing.setup("backend")
+logger = logging.getLogger(__name__)
 
 BOT_SERVICE_URL = os.getenv("BOT_SERVICE_URL", "http://bot:8081")
 # IP или имя хоста для сервисов при развёртывании (пример: 185.28.85.183)
@@ -74,6 +86,8 @@ class PrometheusMetricsMiddleware(BaseHTTPMiddleware):
             HTTP_REQUEST_DURATION_SECONDS.labels(method=method, path=path).observe(elapsed)
 
 
+# Порядок: id корреляции и спан запроса снаружи всего, затем CORS, метрики HTTP (видят и отказы 503), внутри — контроль допуска
+app.add_middleware(AdmissionMiddleware)
 app.add_middleware(PrometheusMetricsMiddleware)
 
 app.add_middleware(
@@ -83,16 +97,40 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(tracing.TracingMiddleware)
+app.add_middleware(jsonlog.CorrelationMiddleware)
 
 
 @app.on_event("startup")
 def startup():
+    from .crud import backfill_reminders
+    # Под gunicorn схему уже подготовил мастер, воркеры не делают это наперегонки
+    if schema_ready():
+        return
     init_db()
+    backfill_reminders()
+
+
+@app.on_event("startup")
+async def start_background():
+    telegram_sync.start()
+    changes.start()
+
+
+@app.on_event("shutdown")
+async def stop_background():
+    await telegram_sync.stop()
+    await changes.stop()
 
 
 @app.get("/metrics")
 def metrics():
-    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+    if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+    # Несколько процессов (gunicorn.conf.py): сумма по файлам метрик всех воркеров, включая завершившиеся
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
 
 
 def _resolve_chat_id(ev_obj):
@@ -162,12 +200,16 @@ def _canonical_type(t: str) -> str:
     return n
 
 
+def _event_link(event_id) -> str:
+    return f"{FRONTEND_URL}/calendar/m15/event/{event_id}"
+
+
 def _build_telegram_message_text(ev) -> str:
     """
     Текст поста в Telegram. Для exam_control — формат с хэштегами по выбору вида;
     для остальных типов — прежняя схема + ссылка.
     """
-    link = f"{FRONTEND_URL}/calendar/m15/event/{getattr(ev, 'id', 0)}"
+    link = _event_link(getattr(ev, 'id', 0))
     canon = _canonical_type(getattr(ev, "type", "") or "")
 
     if canon == "exam_control":
@@ -204,6 +246,70 @@ def _build_telegram_message_text(ev) -> str:
     return "\n".join([p for p in parts if p is not None and p != ""])
 
 
+def _enqueue_post_edits(before: dict, events) -> int:
+    """
+    Ставит в очередь правку постов для событий с sent_message_id, текст которых изменился.
+    before — {event_id: текст поста до обновления}. Вся пачка уходит одним проходом.
+    """
+    jobs = []
+    for ev in events:
+        if not getattr(ev, "sent_message_id", None):
+            continue
+        text = _build_telegram_message_text(ev)
+        if before.get(ev.id) == text:
+            continue
+        jobs.append(telegram_sync.SyncJob(chat_id=_resolve_chat_id(ev), message_id=ev.sent_message_id, text=text, event_id=ev.id))
+    return telegram_sync.enqueue(jobs)
+
+
+def _current_post_text(event_id: int) -> Optional[str]:
+    """Текст поста по текущему состоянию события в БД (для правок из telegram_sync)."""
+    from .crud import get_event_by_id
+    ev = get_event_by_id(event_id)
+    if ev is None or not getattr(ev, "sent_message_id", None):
+        return None
+    return _build_telegram_message_text(ev)
+
+
+telegram_sync.current_text = _current_post_text
+
+
+def _enqueue_post_deletes(events) -> int:
+    """Ставит в очередь удаление постов удалённых событий (только с sent_message_id)."""
+    jobs = [
+        telegram_sync.SyncJob(chat_id=_resolve_chat_id(ev), message_id=ev.sent_message_id)
+        for ev in events
+        if getattr(ev, "sent_message_id", None)
+    ]
+    return telegram_sync.enqueue(jobs)
+
+
+async def _post_bot(client: httpx.AsyncClient, payload: dict, timeout: float, event_id) -> httpx.Response:
+    """POST /send в bot-service в отдельном спане; id корреляции и traceparent уходят в заголовках."""
+    with tracing.span("bot-service POST /send", kind="client", event_id=event_id) as s:
+        resp = await client.post(
+            f"{BOT_SERVICE_URL}/send", json=payload, headers=tracing.inject(jsonlog.propagation_headers()), timeout=timeout,
+        )
+        s.set(**{"http.status_code": resp.status_code})
+        return resp
+
+
+def _bot_response_data(resp, event_id) -> dict:
+    """Разобранный ответ bot-service ({} если не JSON); тело целиком — только в DEBUG-лог."""
+    try:
+        data = resp.json()
+    except Exception:
+        data = {}
+    if resp.status_code >= 400 or not data:
+        logger.warning(
+            "bot-service /send вернул %s", resp.status_code,
+            extra={"event_id": event_id, "body": resp.text[:500]},
+        )
+    else:
+        logger.debug("bot-service /send response", extra={"event_id": event_id, "status": resp.status_code, "data": data})
+    return data
+
+
 def require_admin(x_admin_token: str | None = Header(None)):
     """
     Требует валидный X-ADMIN-TOKEN в заголовке, соответствующий ADMIN_TOKEN из переменных среды.
@@ -251,13 +357,14 @@ async def create_and_send(event_in: EventCreate, admin_ok: bool = Depends(requir
                 ev.chat_id = int(DEFAULT_CHAT_ID)
             except:
                 ev.chat_id = None
+    if ev.type == 'schedule':
+        ev.reminder_sent = True
 
     # Подготовка события в базе данных (sent_message_id ещё не установлен)
     created = add_event(ev)
 
-    # Для schedule событий не отправлять уведомления — пометить как отправленные
+    # Для schedule событий не отправлять уведомления (reminder_sent выставлен до сохранения)
     if created.type == 'schedule':
-        mark_reminder_sent(created.id)
         # Нормализуем возвращаемый тип для согласованности фронтенда
         try:
             created.type = _canonical_type(created.type)
@@ -272,55 +379,38 @@ async def create_and_send(event_in: EventCreate, admin_ok: bool = Depends(requir
     target_thread = _resolve_thread_id(created)
 
     # Отправляем на bot-service — логируем исходящий payload и ответ
+    # Один ключ на пост: повтор без thread_id не создаст дубль, если первая попытка всё же дошла
+    idempotency_key = f"event:{created.id}:post"
     payload = {
         "chat_id": target_chat,
         "thread_id": target_thread,
-        "text": text
+        "text": text,
+        "idempotency_key": idempotency_key,
     }
-    print("DEBUG: исходящий запрос к bot-service:", payload)
+    logger.debug("bot-service /send request", extra={"event_id": created.id, "payload": payload})
     async with httpx.AsyncClient() as client:
         try:
-            resp = await client.post(f"{BOT_SERVICE_URL}/send", json=payload, timeout=10.0)
-            # Логирование ответа для дотрансляции
-            try:
-                resp_text = resp.text
-            except Exception:
-                resp_text = '<unable to read response body>'
-            print("DEBUG: ответ bot-service:", resp.status_code, resp_text)
-
-            try:
-                data = resp.json()
-            except Exception:
-                data = {}
-            print('DEBUG: разобранные данные ответа:', data)
+            resp = await _post_bot(client, payload, 10.0, created.id)
+            data = _bot_response_data(resp, created.id)
 
             # Если не получили message_id и пытались отправить в потоке, повторяем без thread_id
             message_id = data.get('message_id')
             if not message_id and target_thread is not None:
-                print('DEBUG: не получен message_id; повтор без thread_id')
-                payload2 = {"chat_id": target_chat, "text": text}
+                logger.info("bot-service не вернул message_id; повтор без thread_id", extra={"event_id": created.id})
+                payload2 = {"chat_id": target_chat, "text": text, "idempotency_key": idempotency_key}
                 try:
-                    resp2 = await client.post(f"{BOT_SERVICE_URL}/send", json=payload2, timeout=10.0)
-                    try:
-                        resp2_text = resp2.text
-                    except Exception:
-                        resp2_text = '<unable to read response body>'
-                    print('DEBUG: bot-service response (retry):', resp2.status_code, resp2_text)
-                    try:
-                        data2 = resp2.json()
-                    except Exception:
-                        data2 = {}
-                    message_id = data2.get('message_id')
+                    resp2 = await _post_bot(client, payload2, 10.0, created.id)
+                    message_id = _bot_response_data(resp2, created.id).get('message_id')
                     if message_id:
                         set_sent_message(created.id, int(message_id))
                 except Exception as e:
-                    print('Предупреждение: повтор без thread_id не удался:', e)
+                    logger.warning("повтор без thread_id не удался: %s", e, extra={"event_id": created.id})
             else:
                 if message_id:
                     set_sent_message(created.id, int(message_id))
         except Exception as e:
             # Не падаем — запись создана, но отправка не удалась
-            print("Предупреждение: ошибка при отправке на bot-service:", e)
+            logger.warning("ошибка при отправке на bot-service: %s", e, extra={"event_id": created.id})
 
     # Нормализуем возвращаемый тип для согласованности фронтенда
     try:
@@ -357,6 +447,7 @@ def public_events():
             'sent_message_id': getattr(ev, 'sent_message_id', None),
             'source': ev.source,
             'reminder_offset_hours': getattr(ev, 'reminder_offset_hours', 24),
+            'reminder_offsets': event_reminder_offsets(ev),
         })
     return out
 
@@ -366,12 +457,14 @@ def delete_events_day(date: str, admin_ok: bool = Depends(require_admin)):
     """
     Удалить все события на указанную дату (YYYY-MM-DD).
     """
-    from .crud import delete_events_by_date
+    from .crud import delete_events_by_date, get_posted_events_in_range
     try:
         d = datetime.strptime(date, '%Y-%m-%d').date()
     except Exception:
         raise HTTPException(status_code=400, detail='неверный формат даты')
+    posted = get_posted_events_in_range(d, d)
     cnt = delete_events_by_date(d)
+    _enqueue_post_deletes(posted)
     return {'deleted': cnt}
 
 
@@ -380,7 +473,7 @@ def delete_events_month(year: int, month: int, admin_ok: bool = Depends(require_
     """
     Удалить все события в указанном месяце (year, month) — month: 1-12
     """
-    from .crud import delete_events_in_range
+    from .crud import delete_events_in_range, get_posted_events_in_range
     try:
         y = int(year)
         m = int(month)
@@ -391,7 +484,9 @@ def delete_events_month(year: int, month: int, admin_ok: bool = Depends(require_
     first = date(y, m, 1)
     last_day = _calendar.monthrange(y, m)[1]
     last = date(y, m, last_day)
+    posted = get_posted_events_in_range(first, last)
     cnt = delete_events_in_range(first, last)
+    _enqueue_post_deletes(posted)
     return {'deleted': cnt}
 
 
@@ -412,39 +507,154 @@ def resolve_chat(event_id: int):
 
 @app.delete("/events/{event_id}")
 def delete_event_endpoint(event_id: int, admin_ok: bool = Depends(require_admin)):
-    from .crud import delete_event
+    from .crud import delete_event, get_event_by_id
     # Авторизация отключена для локальной разработки
+    ev = get_event_by_id(event_id)
     ok = delete_event(event_id)
     if not ok:
         raise HTTPException(status_code=404, detail="событие не найдено")
+    _enqueue_post_deletes([ev])
     return {"ok": True}
 
 
+def _reminder_payload(reminder, ev) -> dict:
+    """Минимальный набор полей напоминания и его события для отправки worker-ом."""
+    return {
+        "reminder_id": reminder.id,
+        "offset_hours": reminder.offset_hours,
+        "fire_at": reminder.fire_at.isoformat(),
+        "id": ev.id,
+        "type": _canonical_type(ev.type),
+        "title": ev.title,
+        "subject": getattr(ev, "subject", None),
+        "body": ev.body,
+        "date": ev.date.isoformat() if ev.date else None,
+        "time": ev.time.isoformat() if ev.time else None,
+        "room": getattr(ev, 'room', None),
+        "teacher": getattr(ev, 'teacher', None),
+        "lesson_type": getattr(ev, "lesson_type", None),
+        # return resolved chat/thread so worker can post into correct topic
+        "chat_id": _resolve_chat_id(ev),
+        "thread_id": _resolve_thread_id(ev)
+    }
+
+
+# Как часто слать keep-alive комментарий в SSE, чтобы прокси не рвали простаивающее соединение
+STREAM_KEEPALIVE_SECONDS = 15.0
+
+
+@app.get("/events/stream")
+async def events_stream(request: Request):
+    """
+    Server-Sent Events: поток изменений событий (insert / update / delete) по мере их commit.
+    Первое сообщение — hello с текущей версией данных; op=resync означает «перечитай всё».
+    Сообщения маленькие: {op, ids, dates, version} — клиент сам решает, что перечитать.
+    """
+    from .crud import get_data_version
+    sub = changes.subscribe()
+    version = await run_in_threadpool(get_data_version)
+
+    async def gen():
+        try:
+            yield f"event: hello\ndata: {json.dumps({'version': version})}\n\n"
+            while not await request.is_disconnected():
+                message = await sub.get(timeout=STREAM_KEEPALIVE_SECONDS)
+                if message is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                event_id = f"id: {message['version']}\n" if message.get("version") is not None else ""
+                yield f"{event_id}event: change\ndata: {json.dumps(message)}\n\n"
+        finally:
+            changes.unsubscribe(sub)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(gen(), media_type="text/event-stream", headers=headers)
+
+
 @app.get("/events/due_reminders")
 def events_due_reminders():
     """
-    Эндпоинт для worker: вернуть события, которым надо отправить напоминание.
+    Эндпоинт для worker: вернуть наступившие напоминания (по одному на пару событие/смещение).
     Возвращаем минимальный набор полей в JSON.
     """
-    due = get_due_reminders()
-    result = []
-    for ev in due:
-        result.append({
-            "id": ev.id,
-            "type": _canonical_type(ev.type),
-            "title": ev.title,
-            "subject": getattr(ev, "subject", None),
-            "body": ev.body,
-            "date": ev.date.isoformat() if ev.date else None,
-            "time": ev.time.isoformat() if ev.time else None,
-            "room": getattr(ev, 'room', None),
-            "teacher": getattr(ev, 'teacher', None),
-            "lesson_type": getattr(ev, "lesson_type", None),
-            # return resolved chat/thread so worker can post into correct topic
-            "chat_id": _resolve_chat_id(ev),
-            "thread_id": _resolve_thread_id(ev)
-        })
-    return result
+    return [_reminder_payload(reminder, ev) for reminder, ev in get_due_reminders()]
+
+
+@app.post("/events/reminders/claim")
+def claim_reminders_endpoint(req: ReminderClaimRequest):
+    """
+    Эндпоинт для worker: атомарно арендовать пачку наступивших напоминаний.
+    Пока аренда не истекла, другие worker-ы эти события не получат; после истечения
+    (worker упал) события снова станут доступны. Завершение — ack или release.
+    """
+    from .crud import claim_due_reminders
+    limit = max(1, min(req.limit, 1000))
+    lease_seconds = max(1, req.lease_seconds)
+    lease_id, lease_until, events = claim_due_reminders(limit=limit, lease_seconds=lease_seconds)
+    return {
+        "lease_id": lease_id,
+        "lease_until": lease_until.isoformat(),
+        "events": [_reminder_payload(reminder, ev) for reminder, ev in events],
+    }
+
+
+@app.post("/events/reminders/release")
+def release_reminders_endpoint(req: ReminderReleaseRequest):
+    """Эндпоинт для worker: вернуть арендованные напоминания (например, после неудачной отправки)."""
+    from .crud import release_reminders
+    cnt = release_reminders(req.lease_id, req.ids)
+    return {"ok": True, "released": cnt}
+
+
+@app.post("/events/reminders/fail")
+def fail_reminders_endpoint(req: ReminderFailRequest):
+    """
+    Эндпоинт для worker: сообщить о неудачных отправках. Напоминание повторяется с экспоненциальной
+    паузой, а после REMINDER_MAX_ATTEMPTS попыток или постоянной ошибки переходит в dead.
+    """
+    from .crud import fail_reminders
+    counts = fail_reminders(req.lease_id, [item.dict() for item in req.items])
+    return {"ok": True, **counts}
+
+
+@app.get("/admin/reminders/dead")
+def dead_reminders_endpoint(limit: int = 500, admin_ok: bool = Depends(require_admin)):
+    """Напоминания, отправка которых прекращена: событие, число попыток и последняя ошибка."""
+    from .crud import get_dead_reminders
+    items = []
+    for reminder, ev in get_dead_reminders(limit=max(1, min(limit, 1000))):
+        item = _reminder_payload(reminder, ev)
+        item.update({"attempts": reminder.attempts, "last_error": reminder.last_error})
+        items.append(item)
+    return items
+
+
+@app.post("/admin/reminders/{reminder_id}/retry")
+def retry_reminder_endpoint(reminder_id: int, admin_ok: bool = Depends(require_admin)):
+    """Вернуть dead-напоминание в очередь: worker отправит его в ближайшем цикле."""
+    from .crud import retry_reminder
+    if not retry_reminder(reminder_id):
+        raise HTTPException(status_code=404, detail="напоминание не найдено среди неотправленных")
+    return {"ok": True}
+
+
+@app.get("/events/upcoming_reminders")
+def events_upcoming_reminders(if_none_match: str | None = Header(None)):
+    """
+    Эндпоинт для worker: все ожидающие напоминания [{id, event_id, remind_at}] и версия данных.
+    ETag = версия данных и версия статусов напоминаний (ack/fail событий не меняют);
+    при совпадении If-None-Match отвечаем 304, не читая напоминания.
+    """
+    from .crud import get_data_version, get_reminder_version, get_upcoming_reminders
+    version = get_data_version()
+    etag = f'"{version}.{get_reminder_version()}"'
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    reminders = [
+        {"id": r["id"], "event_id": r["event_id"], "remind_at": r["remind_at"].isoformat()}
+        for r in get_upcoming_reminders()
+    ]
+    return JSONResponse({"version": version, "reminders": reminders}, headers={"ETag": etag})
 
 
 @app.get('/calendar')
@@ -485,17 +695,207 @@ def calendar_view(start: str | None = None, end: str | None = None, type: str |
             'chat_id': ev.chat_id,
             'thread_id': ev.topic_thread_id,
             'reminder_offset_hours': getattr(ev, 'reminder_offset_hours', 24),
+            'reminder_offsets': event_reminder_offsets(ev),
         })
     return filtered
 
 
+# Сводка календаря: не больше года за запрос и не больше 20 заголовков на ячейку
+SUMMARY_MAX_DAYS = 370
+SUMMARY_MAX_TITLES = 20
+
+
+def _summary_item(row, category: str) -> dict:
+    """Мини-карточка события для ячейки календаря."""
+    text = f"{row.title or ''} {row.body or ''}".lower()
+    return {
+        'id': row.id,
+        'type': category,
+        'title': row.title or row.subject or None,
+        'time': row.time.isoformat() if row.time else None,
+        'end_time': row.end_time.isoformat() if row.end_time else None,
+        'room': row.room,
+        'lesson_type': row.lesson_type,
+        # frontend красит такие события как перенос, даже если тип другой
+        'transfer': 'перенос' in text or 'перенес' in text,
+    }
+
+
+@app.get('/calendar/summary')
+def calendar_summary(
+    start: str,
+    end: str,
+    granularity: str = 'day',
+    titles: int = 5,
+    exclude_types: str | None = None,
+    if_none_match: str | None = Header(None),
+):
+    """
+    Сводка для сетки календаря: по дням (или неделям с понедельника) — число событий по каноническим
+    типам и первые `titles` событий в порядке ячейки, плюс события без даты.
+    exclude_types — канонические типы через запятую, которые не попадают в сводку (например, homework).
+    Полные данные дня — через /calendar?start=<день>&end=<день>. ETag — версия данных.
+    """
+    from .crud import get_calendar_summary, get_data_version, get_undated_events
+    start_date, end_date = _parse_date_param('start', start), _parse_date_param('end', end)
+    if start_date is None or end_date is None:
+        raise HTTPException(status_code=400, detail="start и end обязательны (YYYY-MM-DD)")
+    if granularity not in ('day', 'week'):
+        raise HTTPException(status_code=400, detail="granularity: day или week")
+    if end_date < start_date or (end_date - start_date).days > SUMMARY_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"диапазон: от start до end, не больше {SUMMARY_MAX_DAYS} дней")
+    titles = max(0, min(titles, SUMMARY_MAX_TITLES))
+    excluded = {t.strip().lower() for t in (exclude_types or '').split(',') if t.strip()}
+
+    version = changes.known_version()
+    if version is None:
+        version = get_data_version()
+        changes.note_version(version)
+    etag = f'"summary-{version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if ics.etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    counts, title_rows = get_calendar_summary(start_date, end_date, titles, sorted(excluded))
+
+    def bucket_of(d: date) -> date:
+        return d - timedelta(days=d.weekday()) if granularity == 'week' else d
+
+    buckets: dict = {}
+    for d, ev_type, count in counts:
+        b = buckets.setdefault(bucket_of(d), {'total': 0, 'counts': {}, 'items': []})
+        category = _canonical_type(ev_type)
+        b['counts'][category] = b['counts'].get(category, 0) + count
+        b['total'] += count
+    for row in title_rows:
+        b = buckets.get(bucket_of(row.date))
+        if b is not None and len(b['items']) < titles:
+            b['items'].append(_summary_item(row, _canonical_type(row.type)))
+
+    undated = [
+        {'id': ev.id, 'type': _canonical_type(ev.type), 'title': ev.title, 'subject': ev.subject, 'body': ev.body}
+        for ev in get_undated_events()
+        if _canonical_type(ev.type) not in excluded
+    ]
+    return JSONResponse({
+        'start': start_date.isoformat(),
+        'end': end_date.isoformat(),
+        'granularity': granularity,
+        'version': version,
+        'buckets': [
+            {
+                'date': key.isoformat(),
+                **({'end': (key + timedelta(days=6)).isoformat()} if granularity == 'week' else {}),
+                **b,
+            }
+            for key, b in sorted(buckets.items())
+        ],
+        'undated': undated,
+    }, headers=headers)
+
+
+# Отрендеренные ленты /calendar.ics: живут до следующей записи в event
+_ics_cache = ics.FeedCache()
+
+
+def _parse_date_param(name: str, value: str | None) -> date | None:
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name}: ожидается дата YYYY-MM-DD")
+
+
+@app.get('/calendar.ics')
+def calendar_ics(
+    start: str | None = None,
+    end: str | None = None,
+    type: str | None = None,
+    if_none_match: str | None = Header(None),
+    if_modified_since: str | None = Header(None),
+):
+    """
+    Подписка на события в формате iCalendar, с теми же фильтрами, что у /calendar.
+    ETag и Last-Modified — версия данных и время последней записи: пока данные не менялись,
+    условный запрос получает 304 без обращения к БД, а полный — ленту из кэша.
+    После записи лента читается из БД пачками и отдаётся по мере рендера.
+    """
+    from .crud import get_data_version, get_data_version_info, iter_dated_events
+    start_date, end_date = _parse_date_param('start', start), _parse_date_param('end', end)
+    headers = {"Cache-Control": "no-cache"}
+
+    version = changes.known_version()
+    if version is not None:
+        key = (version, type, start_date, end_date)
+        etag = f'"ics-{version}"'
+        cached = _ics_cache.get(key)
+        if ics.etag_matches(if_none_match, etag):
+            headers["ETag"] = etag
+            if cached is not None:
+                headers["Last-Modified"] = ics.http_date(cached[1])
+            return Response(status_code=304, headers=headers)
+        if cached is not None:
+            body, last_modified = cached
+            headers.update({"ETag": etag, "Last-Modified": ics.http_date(last_modified)})
+            if if_none_match is None and ics.not_modified_since(if_modified_since, last_modified):
+                return Response(status_code=304, headers=headers)
+            return Response(body, media_type=ics.MEDIA_TYPE, headers=headers)
+
+    version, updated_at = get_data_version_info()
+    changes.note_version(version)
+    updated_at = updated_at or datetime.utcnow()
+    key = (version, type, start_date, end_date)
+    headers.update({"ETag": f'"ics-{version}"', "Last-Modified": ics.http_date(updated_at)})
+    if ics.etag_matches(if_none_match, headers["ETag"]) or (
+        if_none_match is None and ics.not_modified_since(if_modified_since, updated_at)
+    ):
+        return Response(status_code=304, headers=headers)
+
+    def gen():
+        chunks = [ics.header()]
+        yield chunks[0]
+        for batch in iter_dated_events(start_date, end_date):
+            parts = []
+            for ev in batch:
+                category = _canonical_type(ev.type)
+                if type and category != type:
+                    continue
+                parts.append(ics.vevent(ev, category, updated_at, _event_link(ev.id)))
+            if parts:
+                chunks.append("".join(parts).encode("utf-8"))
+                yield chunks[-1]
+        chunks.append(ics.FOOTER)
+        yield ics.FOOTER
+        # Если во время чтения данные изменились, лента может смешивать версии — не кэшируем её
+        if get_data_version() == version:
+            _ics_cache.put(key, b"".join(chunks), updated_at)
+
+    return StreamingResponse(gen(), media_type=ics.MEDIA_TYPE, headers=headers)
+
+
 @app.post("/events/{event_id}/mark_reminder_sent")
 def mark_reminder(event_id: int):
+    """
+    Устаревший эндпоинт подтверждения по событию: отмечает только самое раннее наступившее напоминание.
+    worker подтверждает напоминания по их id через POST /events/reminders/ack.
+    """
     ok = mark_reminder_sent(event_id)
     if not ok:
         raise HTTPException(status_code=404, detail="событие не найдено")
     return {"ok": True}
 
+
+@app.post("/events/reminders/ack")
+def ack_reminders_endpoint(req: ReminderAckRequest):
+    """
+    Эндпоинт для worker: подтвердить все отправленные за цикл напоминания одним запросом
+    (одна транзакция UPDATE ... WHERE id IN (...)).
+    """
+    from .crud import ack_reminders
+    cnt = ack_reminders([item.dict() for item in req.items], lease_id=req.lease_id)
+    return {"ok": True, "acked": cnt}
+
 # На настоящий момент PDF импорт неподдерживается
 
 
@@ -504,7 +904,7 @@ def create_event(event_in: EventCreate, admin_ok: bool = Depends(require_admin))
     """
     Новое событие в базе данных без отправки через бот.
     Ручные записи: source=manual (скрыты во вкладке «События»).
-    Расписание — без напоминаний; домашка и контрольные/экзамены — с напоминаниями по reminder_offset_hours.
+    Расписание — без напоминаний; домашка и контрольные/экзамены — с напоминаниями по reminder_offsets (или reminder_offset_hours).
     """
     # Авторизация временно отключена для локальной разработки
     from .models import Event
@@ -555,6 +955,11 @@ class EventUpdate(BaseModel):
     teacher: Optional[str] = None   # Новый преподаватель
     lesson_type: Optional[str] = None  # exam / control для exam_control; lecture / practice для schedule
     reminder_offset_hours: Optional[int] = None
+    reminder_offsets: Optional[str] = None  # Несколько напоминаний: [168, 24, 1] или "168,24,1"
+
+    @validator('reminder_offsets', pre=True)
+    def _offsets_to_csv(cls, v):
+        return normalize_reminder_offsets(v)
 
 
 @app.put('/events/{event_id}')
@@ -562,22 +967,27 @@ def update_event_endpoint(event_id: int, update: EventUpdate, admin_ok: bool = D
     """
     Обновляем поля события (используется рля переноса/перемещения событий).
     Если apply_to_series=True и событие часть серии, применяем изменения к всем событиям в серии.
+    Уже опубликованные посты (sent_message_id) правятся в Telegram фоновым проходом.
     """
-    from .crud import update_event, get_event_by_id, update_events_by_series
+    from .crud import update_event, get_event_by_id, update_events_by_series, get_events_by_series
     ev = get_event_by_id(event_id)
     if not ev:
         raise HTTPException(status_code=404, detail='событие не найдено')
     fields = {k:v for k,v in update.dict().items() if v is not None}
     if apply_to_series and getattr(ev, 'series_id', None):
+        before = {e.id: _build_telegram_message_text(e) for e in get_events_by_series(ev.series_id) if e.sent_message_id}
         cnt = update_events_by_series(ev.series_id, **fields)
         if cnt == 0:
             raise HTTPException(status_code=404, detail='событий в серии не найдено')
-        return {'ok': True, 'updated': cnt}
+        queued = _enqueue_post_edits(before, get_events_by_series(ev.series_id)) if before else 0
+        return {'ok': True, 'updated': cnt, 'edits_queued': queued}
     else:
+        before = {ev.id: _build_telegram_message_text(ev)} if ev.sent_message_id else {}
         ok = update_event(event_id, **fields)
         if not ok:
             raise HTTPException(status_code=500, detail='не удалось обновить')
-        return {'ok': True}
+        queued = _enqueue_post_edits(before, [get_event_by_id(event_id)]) if before else 0
+        return {'ok': True, 'edits_queued': queued}
 
 @app.post("/events/{event_id}/send_now")
 async def send_now(event_id: int = Path(..., description="ID события"), admin_ok: bool = Depends(require_admin)):
@@ -602,38 +1012,22 @@ async def send_now(event_id: int = Path(..., description="ID события"), a
 
     # Отправляем в bot-service
     # Отправляем в bot-service — debug outgoing payload and response
-    payload = {"chat_id": chat_id, "thread_id": thread_id, "text": text}
-    print("DEBUG: send_now исходящий к bot-service:", payload)
+    # Ключ на каждое нажатие «отправить сейчас»: повтор без thread_id внутри запроса не дублирует пост
+    idempotency_key = f"event:{ev.id}:send_now:{uuid.uuid4()}"
+    payload = {"chat_id": chat_id, "thread_id": thread_id, "text": text, "idempotency_key": idempotency_key}
+    logger.debug("bot-service /send request (send_now)", extra={"event_id": ev.id, "payload": payload})
     async with httpx.AsyncClient() as client:
         try:
-            resp = await client.post(f"{BOT_SERVICE_URL}/send", json=payload, timeout=15.0)
-            try:
-                resp_text = resp.text
-            except Exception:
-                resp_text = '<невозможно прочитать тело ответа>'
-            print("DEBUG: send_now ответ bot-service:", resp.status_code, resp_text)
-
-            try:
-                data = resp.json()
-            except Exception:
-                data = {}
-            print('DEBUG: send_now разобранные данные ответа:', data)
+            resp = await _post_bot(client, payload, 15.0, ev.id)
+            data = _bot_response_data(resp, ev.id)
 
             message_id = data.get('message_id')
             if not message_id and thread_id is not None:
-                print('DEBUG: send_now не получен message_id; повтор без thread_id')
-                payload2 = {"chat_id": chat_id, "text": text}
+                logger.info("send_now: bot-service не вернул message_id; повтор без thread_id", extra={"event_id": ev.id})
+                payload2 = {"chat_id": chat_id, "text": text, "idempotency_key": idempotency_key}
                 try:
-                    resp2 = await client.post(f"{BOT_SERVICE_URL}/send", json=payload2, timeout=15.0)
-                    try:
-                        resp2_text = resp2.text
-                    except Exception:
-                        resp2_text = '<невозможно прочитать тело ответа>'
-                    print('DEBUG: send_now ответ bot-service (повтор):', resp2.status_code, resp2_text)
-                    try:
-                        data2 = resp2.json()
-                    except Exception:
-                        data2 = {}
+                    resp2 = await _post_bot(client, payload2, 15.0, ev.id)
+                    data2 = _bot_response_data(resp2, ev.id)
                     message_id = data2.get('message_id')
                     if message_id:
                         set_sent_message(ev.id, int(message_id))
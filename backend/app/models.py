@@ -2,11 +2,14 @@ from typing import Optional
 import datetime as dt
 
 from sqlmodel import SQLModel, Field
-from sqlalchemy import Column, BigInteger
+from sqlalchemy import Column, BigInteger, Integer, ForeignKey, Index
 
 
 class Event(SQLModel, table=True):
     """Модель события для расписания, домашних заданий и объявлений."""
+    # Сводка календаря группирует по (date, type) в диапазоне дат — хватает одного индекса
+    __table_args__ = (Index("ix_event_date_type", "date", "type"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
 
     type: str = Field(index=True)
@@ -33,5 +36,39 @@ class Event(SQLModel, table=True):
 
     created_at: dt.datetime = Field(default_factory=dt.datetime.utcnow)
     reminder_offset_hours: int = Field(default=24)
+    # Несколько напоминаний: смещения в часах через запятую (например "168,24,1");
+    # если пусто — одно напоминание за reminder_offset_hours
+    reminder_offsets: Optional[str] = Field(default=None)
+    # True — напоминаний нет или все уже отправлены (сами напоминания — в таблице reminder)
     reminder_sent: bool = Field(default=False)
     source: Optional[str] = Field(default="admin")
+
+
+class DataVersion(SQLModel, table=True):
+    """
+    Счётчики версии: id 1 увеличивается при каждой записи в event (ETag и поток изменений),
+    id 2 — при смене статуса напоминаний (ETag расписания worker-а).
+    """
+    id: int = Field(default=1, primary_key=True)
+    version: int = Field(default=0)
+    updated_at: dt.datetime = Field(default_factory=dt.datetime.utcnow)
+
+
+class Reminder(SQLModel, table=True):
+    """Одно напоминание о событии: строка на пару (событие, смещение) с заранее вычисленным временем."""
+    __table_args__ = (Index("ix_reminder_status_fire_at", "status", "fire_at"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    event_id: int = Field(sa_column=Column(Integer, ForeignKey("event.id", ondelete="CASCADE"), nullable=False, index=True))
+    offset_hours: int                                # За сколько часов до события
+    fire_at: dt.datetime                             # Когда отправлять (UTC, как и остальные времена)
+    status: str = Field(default="pending")           # pending / sent / skipped / dead
+    sent_message_id: Optional[int] = Field(default=None, sa_column=Column(BigInteger, nullable=True))
+    sent_at: Optional[dt.datetime] = Field(default=None)
+    # Аренда worker-ом: пока lease не истёк, другие worker-ы напоминание не берут
+    lease_id: Optional[str] = Field(default=None, index=True)
+    lease_until: Optional[dt.datetime] = Field(default=None)
+    # Повторы неудачных отправок: после REMINDER_MAX_ATTEMPTS попыток (или постоянной ошибки) — status = dead
+    attempts: int = Field(default=0)
+    next_attempt_at: Optional[dt.datetime] = Field(default=None)
+    last_error: Optional[str] = Field(default=None)
@@ -1,8 +1,23 @@
 from pydantic import BaseModel, validator
-from typing import Optional
+from typing import List, Optional
 from datetime import date as date_type, time as time_type
 
 
+def normalize_reminder_offsets(v):
+    """Список или строка смещений (часы) -> "168,24,1" (уникальные, по убыванию); пусто -> None."""
+    if v is None or v == "" or v == []:
+        return None
+    if isinstance(v, str):
+        v = [p for p in v.replace(";", ",").split(",") if p.strip()]
+    try:
+        hours = sorted({int(h) for h in v}, reverse=True)
+    except (TypeError, ValueError):
+        raise ValueError("reminder_offsets: ожидается список целых часов")
+    if any(h < 0 for h in hours):
+        raise ValueError("reminder_offsets: смещение не может быть отрицательным")
+    return ",".join(str(h) for h in hours) or None
+
+
 class EventCreate(BaseModel):
     """Схема для создания события."""
     type: str          # Тип события (schedule, homework, exam_control, announcement, transfer)
@@ -19,6 +34,11 @@ class EventCreate(BaseModel):
     chat_id: Optional[int] = None  # ID чата Telegram
     topic_thread_id: Optional[int] = None  # ID темы/потока
     reminder_offset_hours: int = 24  # Смещение напоминания в часах
+    reminder_offsets: Optional[str] = None  # Несколько напоминаний: [168, 24, 1] или "168,24,1"
+
+    @validator('reminder_offsets', pre=True)
+    def _offsets_to_csv(cls, v):
+        return normalize_reminder_offsets(v)
 
     @validator('date', pre=True)
     def _empty_date_to_none(cls, v):
@@ -60,6 +80,50 @@ class EventPublic(BaseModel):
     sent_message_id: Optional[int] = None
     source: Optional[str] = None
     reminder_offset_hours: int = 24
+    reminder_offsets: Optional[List[int]] = None
+
+    @validator('reminder_offsets', pre=True)
+    def _csv_to_offsets(cls, v):
+        csv = normalize_reminder_offsets(v)
+        return [int(h) for h in csv.split(",")] if csv else None
 
     class Config:
         orm_mode = True
+
+
+class ReminderAck(BaseModel):
+    """Подтверждение отправленного напоминания."""
+    id: int                                 # ID напоминания (строки reminder)
+    sent_message_id: Optional[int] = None   # ID сообщения-напоминания в Telegram
+
+
+class ReminderAckRequest(BaseModel):
+    """Пачка подтверждений от worker за один цикл."""
+    items: List[ReminderAck]
+    lease_id: Optional[str] = None  # Если задан — подтверждаются только напоминания этой аренды
+
+
+class ReminderClaimRequest(BaseModel):
+    """Запрос worker-а на аренду наступивших напоминаний."""
+    limit: int = 100            # Сколько напоминаний взять за раз
+    lease_seconds: int = 300    # На сколько секунд арендовать
+
+
+class ReminderReleaseRequest(BaseModel):
+    """Снять аренду с напоминаний (всех по lease_id или только перечисленных)."""
+    lease_id: str
+    ids: Optional[List[int]] = None
+
+
+class ReminderFailure(BaseModel):
+    """Неудачная попытка отправки напоминания."""
+    id: int                                 # ID напоминания (строки reminder)
+    error: Optional[str] = None             # Текст ошибки для администратора
+    permanent: bool = False                 # Повтор не поможет (бот удалён из чата, нет темы и т.п.)
+    retry_after: Optional[int] = None       # Подсказка Telegram (429): не повторять раньше, секунд
+
+
+class ReminderFailRequest(BaseModel):
+    """Пачка неудачных отправок от worker за один цикл."""
+    lease_id: str
+    items: List[ReminderFailure]
@@ -0,0 +1,131 @@
+"""
+Фоновая синхронизация уже отправленных постов с событиями в БД.
+
+Эндпоинты ставят в очередь правки (editMessageText) и удаления (deleteMessage)
+для событий с sent_message_id, а один фоновый цикл отправляет их в bot-service
+с ограничением частоты. Задания склеиваются по (chat_id, message_id):
+повторная правка того же поста заменяет предыдущую, удаление отменяет правку.
+Очередь у каждого процесса своя, поэтому перед отправкой правки текст перечитывается
+из БД: пост получит актуальный текст, даже если правки одного события стояли в очередях
+разных воркеров gunicorn и ушли не в том порядке.
+"""
+import asyncio
+import logging
+import os
+import threading
+from dataclasses import dataclass
+
+import httpx
+
+from common import tracing
+
+logger = logging.getLogger(__name__)
+
+BOT_SERVICE_URL = os.getenv("BOT_SERVICE_URL", "http://bot:8081")
+# Пауза между вызовами Telegram в одном проходе (лимит Telegram ~20 сообщений в минуту на группу)
+TELEGRAM_EDIT_INTERVAL = float(os.getenv("TELEGRAM_EDIT_INTERVAL", "3.0"))
+
+
+@dataclass
+class SyncJob:
+    """Правка (text задан) или удаление (text=None) отправленного поста."""
+    chat_id: int
+    message_id: int
+    text: str | None = None
+    event_id: int | None = None
+
+    @property
+    def is_delete(self) -> bool:
+        return self.text is None
+
+
+_lock = threading.Lock()
+_pending: dict[tuple[int, int], SyncJob] = {}
+_loop: asyncio.AbstractEventLoop | None = None
+_wakeup: asyncio.Event | None = None
+_task: asyncio.Task | None = None
+# event_id -> актуальный текст поста или None (событие удалено); задаёт main.py
+current_text = None
+
+
+def enqueue(jobs: list[SyncJob]) -> int:
+    """
+    Ставит пачку заданий в очередь (потокобезопасно, можно звать из sync-эндпоинтов).
+    Вся пачка попадает в один проход фонового цикла. Возвращает число поставленных заданий.
+    """
+    added = 0
+    with _lock:
+        for job in jobs:
+            if not job.chat_id or not job.message_id:
+                continue
+            key = (int(job.chat_id), int(job.message_id))
+            prev = _pending.get(key)
+            # Удаление важнее правки: не воскрешаем пост, который уже решили удалить
+            if prev is not None and prev.is_delete and not job.is_delete:
+                continue
+            _pending[key] = job
+            added += 1
+    if added and _loop is not None and _wakeup is not None:
+        _loop.call_soon_threadsafe(_wakeup.set)
+    return added
+
+
+def _take_pending() -> list[SyncJob]:
+    with _lock:
+        jobs = list(_pending.values())
+        _pending.clear()
+    return jobs
+
+
+async def _apply(client: httpx.AsyncClient, job: SyncJob) -> None:
+    path = "/delete" if job.is_delete else "/edit"
+    payload = {"chat_id": job.chat_id, "message_id": job.message_id}
+    if not job.is_delete:
+        text = job.text
+        if job.event_id is not None and current_text is not None:
+            text = await asyncio.to_thread(current_text, job.event_id)
+            if text is None:
+                # Событие удалено — пост уберёт задание на удаление
+                return
+        payload["text"] = text
+    with tracing.span(f"bot-service POST {path}", kind="client", message_id=job.message_id) as s:
+        resp = await client.post(f"{BOT_SERVICE_URL}{path}", json=payload, headers=tracing.inject(), timeout=60.0)
+        s.set(**{"http.status_code": resp.status_code})
+    resp.raise_for_status()
+
+
+async def _run() -> None:
+    async with httpx.AsyncClient() as client:
+        while True:
+            await _wakeup.wait()
+            _wakeup.clear()
+            jobs = _take_pending()
+            for idx, job in enumerate(jobs):
+                if idx:
+                    await asyncio.sleep(TELEGRAM_EDIT_INTERVAL)
+                try:
+                    await _apply(client, job)
+                except Exception as e:
+                    logger.warning("не удалось синхронизировать пост chat_id=%s message_id=%s: %s", job.chat_id, job.message_id, e)
+
+
+def start() -> None:
+    """Запускает фоновый цикл в текущем event loop (вызывается на старте приложения)."""
+    global _loop, _wakeup, _task
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    _task = _loop.create_task(_run())
+    with _lock:
+        if _pending:
+            _wakeup.set()
+
+
+async def stop() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
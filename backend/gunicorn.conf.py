@@ -0,0 +1,50 @@
+"""
+Запуск backend в несколько процессов: gunicorn с воркерами uvicorn.
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+Число процессов — WEB_CONCURRENCY (по умолчанию по числу ядер, не больше MAX_WORKERS: у каждого
+процесса свой пул соединений БД). Метрики Prometheus процессы пишут в общий каталог
+PROMETHEUS_MULTIPROC_DIR, /metrics любого воркера отдаёт их сумму по всем процессам.
+"""
+import os
+import shutil
+
+# Каталог метрик должен быть задан до первого импорта prometheus_client (здесь и в воркерах)
+MULTIPROC_DIR = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/backend-metrics")
+
+from prometheus_client import multiprocess  # noqa: E402
+
+# Каждый процесс держит пул до 15 соединений (и столько же слотов допуска) — больше 4 упрётся в max_connections PostgreSQL
+MAX_WORKERS = 4
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.getenv("WEB_CONCURRENCY") or min(os.cpu_count() or 1, MAX_WORKERS))
+# Воркеры (changes.py) по этой переменной понимают, что процессов несколько
+os.environ["WEB_CONCURRENCY"] = str(workers)
+# SSE /events/stream держит соединение дольше стандартных 30 с тишины воркера
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+accesslog = None
+
+
+def on_starting(server):
+    """
+    В мастере до запуска воркеров: чистит метрики прошлого запуска и один раз готовит схему БД,
+    чтобы воркеры не создавали таблицы и не досоздавали напоминания наперегонки.
+    """
+    shutil.rmtree(MULTIPROC_DIR, ignore_errors=True)
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+    from app import database
+    from app.crud import backfill_reminders
+    database.init_db()
+    backfill_reminders()
+    # Соединения пула мастера не должны достаться воркерам через fork
+    database.engine.dispose()
+
+
+def child_exit(server, worker):
+    """Воркер завершился (или упал): его gauge-значения больше не входят в сумму."""
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,56 @@
+"""
+Общие фикстуры тестов backend: временная SQLite-база и TestClient приложения.
+
+Окружение задаётся до импорта app: модули читают настройки при импорте.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path[:0] = [str(ROOT / "backend"), str(ROOT)]
+
+_tmp = tempfile.mkdtemp(prefix="backend-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/test.db"
+os.environ["ADMIN_TOKEN"] = "test-token"
+os.environ["BOT_SERVICE_URL"] = "http://127.0.0.1:9"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+for name in ("REDIS_URL", "PROMETHEUS_MULTIPROC_DIR", "WEB_CONCURRENCY"):
+    os.environ.pop(name, None)
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import delete, update  # noqa: E402
+from sqlmodel import Session  # noqa: E402
+
+from app import changes  # noqa: E402
+from app.database import engine, init_db  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import DataVersion, Event, Reminder  # noqa: E402
+
+init_db()
+
+
+@pytest.fixture(autouse=True)
+def clean_db():
+    """Каждый тест начинает с пустых таблиц и версии 0."""
+    with Session(engine) as session:
+        session.exec(delete(Reminder))
+        session.exec(delete(Event))
+        session.exec(update(DataVersion).values(version=0))
+        session.commit()
+    changes.note_version(None)
+    yield
+
+
+@pytest.fixture
+def admin() -> dict:
+    """Заголовки админского запроса."""
+    return {"X-ADMIN-TOKEN": os.environ["ADMIN_TOKEN"]}
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as c:
+        yield c
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from app import admission
+from app.admission import ClassLimits, Limiter, Rejected, classify
+
+
+def test_classify_by_path_and_token():
+    assert classify("GET", "/metrics", {}) is None
+    assert classify("OPTIONS", "/events", {}) is None
+    assert classify("POST", "/events/reminders/claim", {}) == "worker"
+    assert classify("GET", "/events", {"x-admin-token": "test-token"}) == "admin"
+    assert classify("GET", "/events", {"x-admin-token": "wrong"}) == "public"
+    assert classify("GET", "/events", {}) == "public"
+
+
+def test_non_ascii_admin_token_is_public():
+    # Заголовок декодирован как latin-1: байт >= 0x80 не должен ронять сравнение токена
+    assert classify("GET", "/events", {"x-admin-token": "\xe9"}) == "public"
+
+
+def test_non_ascii_admin_token_request(client, admin):
+    r = client.get("/events", headers={"X-ADMIN-TOKEN": b"\xe9"})
+    assert r.status_code == 200
+    assert client.get("/events", headers=admin).status_code == 200
+
+
+def _busy(monkeypatch, queue: int, deadline: float = 0.05, retry_after: int = 7):
+    """Все слоты класса public заняты, очередь — queue мест."""
+    limiter = admission._limiters["public"]
+    monkeypatch.setattr(limiter, "limits", ClassLimits(concurrency=1, queue=queue, deadline=deadline, retry_after=retry_after))
+    monkeypatch.setattr(limiter, "active", 1)
+
+
+def test_queue_full_returns_503(client, admin, monkeypatch):
+    _busy(monkeypatch, queue=0)
+    r = client.get("/events")
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == "7"
+    # Контроль допуска не трогает /metrics и другие классы
+    assert client.get("/metrics").status_code == 200
+    assert client.get("/events", headers=admin).status_code == 200
+
+
+def test_deadline_returns_503(client, monkeypatch):
+    _busy(monkeypatch, queue=1, deadline=0.05, retry_after=3)
+    r = client.get("/events")
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == "3"
+    assert admission._limiters["public"].queued == 0
+
+
+def test_limiter_hands_slot_to_first_waiter():
+    async def scenario():
+        limiter = Limiter("t", ClassLimits(concurrency=1, queue=1, deadline=1.0, retry_after=1))
+        assert await limiter.acquire() == 0.0
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(Rejected) as e:
+            await limiter.acquire()
+        assert e.value.reason == "queue_full"
+        limiter.release()
+        assert await waiter >= 0.0
+        assert limiter.active == 1
+        limiter.release()
+        assert limiter.active == 0
+
+    asyncio.run(scenario())
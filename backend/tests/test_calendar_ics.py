@@ -0,0 +1,97 @@
+from datetime import date, time
+
+import pytest
+
+from app import changes, crud, ics, main
+from app.crud import add_event
+from app.models import Event
+
+
+@pytest.fixture(autouse=True)
+def fresh_feed_cache(monkeypatch):
+    """Версия данных обнуляется перед каждым тестом — ленты прошлых тестов не должны попасть в ответ."""
+    monkeypatch.setattr(main, "_ics_cache", ics.FeedCache())
+
+
+def _event(title: str, type: str = "schedule", day: int = 5) -> Event:
+    return add_event(Event(type=type, title=title, body="", date=date(2026, 10, day), time=time(10, 0), reminder_sent=True))
+
+
+def test_feed_filters_and_validation(client):
+    _event("лекция")
+    _event("дз", type="homework")
+    add_event(Event(type="announcement", title="без даты", body=""))
+
+    r = client.get("/calendar.ics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/calendar")
+    assert r.text.startswith("BEGIN:VCALENDAR") and r.text.rstrip().endswith("END:VCALENDAR")
+    assert r.text.count("BEGIN:VEVENT") == 2
+    assert "без даты" not in r.text
+
+    only_homework = client.get("/calendar.ics", params={"type": "homework"}).text
+    assert only_homework.count("BEGIN:VEVENT") == 1 and "дз" in only_homework
+    assert client.get("/calendar.ics", params={"start": "2026-10-06"}).text.count("BEGIN:VEVENT") == 0
+    assert client.get("/calendar.ics", params={"start": "05.10.2026"}).status_code == 400
+
+
+def test_conditional_requests(client):
+    _event("лекция")
+    r = client.get("/calendar.ics")
+    etag, last_modified = r.headers["ETag"], r.headers["Last-Modified"]
+
+    not_modified = client.get("/calendar.ics", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.headers["ETag"] == etag
+    assert client.get("/calendar.ics", headers={"If-Modified-Since": last_modified}).status_code == 304
+    # If-None-Match важнее If-Modified-Since
+    assert client.get("/calendar.ics", headers={"If-None-Match": '"ics-0"', "If-Modified-Since": last_modified}).status_code == 200
+
+
+def test_feed_is_served_from_cache_until_next_write(client, admin, monkeypatch):
+    _event("лекция")
+    first = client.get("/calendar.ics")
+    assert first.status_code == 200
+
+    iter_dated_events = crud.iter_dated_events
+
+    def no_db(*args, **kwargs):
+        raise AssertionError("лента должна браться из кэша")
+
+    monkeypatch.setattr(crud, "iter_dated_events", no_db)
+    cached = client.get("/calendar.ics")
+    assert cached.content == first.content
+    assert cached.headers["ETag"] == first.headers["ETag"]
+    monkeypatch.setattr(crud, "iter_dated_events", iter_dated_events)
+
+    r = client.post("/events", json={"type": "schedule", "title": "новая пара", "body": "", "date": "2026-10-06"}, headers=admin)
+    assert r.status_code == 200
+    fresh = client.get("/calendar.ics", headers={"If-None-Match": first.headers["ETag"]})
+    assert fresh.status_code == 200
+    assert fresh.headers["ETag"] != first.headers["ETag"]
+    assert "новая пара" in fresh.text
+
+
+class LaggingRedis:
+    """Redis, чьё эхо до слушателя этого процесса ещё не дошло: сообщения только копятся."""
+
+    def __init__(self):
+        self.published = []
+
+    def publish(self, channel: str, data: str) -> None:
+        self.published.append(data)
+
+
+def test_own_write_is_visible_before_redis_echo(client, admin, monkeypatch):
+    redis_pub = LaggingRedis()
+    monkeypatch.setattr(changes, "_redis_pub", redis_pub)
+    _event("лекция")
+    first = client.get("/calendar.ics")
+    assert first.status_code == 200
+
+    r = client.post("/events", json={"type": "schedule", "title": "новая пара", "body": "", "date": "2026-10-06"}, headers=admin)
+    assert r.status_code == 200
+    assert len(redis_pub.published) == 2
+    fresh = client.get("/calendar.ics", headers={"If-None-Match": first.headers["ETag"]})
+    assert fresh.status_code == 200
+    assert "новая пара" in fresh.text
@@ -0,0 +1,110 @@
+from datetime import date, time
+
+import pytest
+from sqlalchemy import event
+
+from app.crud import add_event
+from app.database import engine
+from app.models import Event
+
+OCTOBER = {"start": "2026-10-01", "end": "2026-10-31"}
+
+
+def _event(day: int, type: str = "schedule", title: str = "пара", at: time | None = None) -> Event:
+    return add_event(Event(type=type, title=title, body="", date=date(2026, 10, day), time=at, reminder_sent=True))
+
+
+def test_empty_dates_are_rejected(client):
+    assert client.get("/calendar/summary", params={"start": "", "end": ""}).status_code == 400
+    assert client.get("/calendar/summary", params={"start": "2026-10-01", "end": ""}).status_code == 400
+    assert client.get("/calendar/summary", params={"start": "01.10.2026", "end": "2026-10-31"}).status_code == 400
+    assert client.get("/calendar/summary", params={"start": "2026-10-31", "end": "2026-10-01"}).status_code == 400
+
+
+def test_day_buckets(client):
+    _event(5, "schedule", "лекция", time(10, 0))
+    _event(5, "schedule", "практика", time(8, 30))
+    _event(5, "homework", "дз")
+    _event(6, "announcement", "объявление")
+    add_event(Event(type="announcement", title="без даты", body=""))
+
+    body = client.get("/calendar/summary", params=OCTOBER).json()
+    buckets = {b["date"]: b for b in body["buckets"]}
+    assert set(buckets) == {"2026-10-05", "2026-10-06"}
+    day = buckets["2026-10-05"]
+    assert day["total"] == 3
+    assert day["counts"] == {"schedule": 2, "homework": 1}
+    # Домашка раньше пар, пары по времени
+    assert [item["title"] for item in day["items"]] == ["дз", "практика", "лекция"]
+    assert [ev["title"] for ev in body["undated"]] == ["без даты"]
+
+
+def test_titles_limit_and_week_buckets(client):
+    for day in (5, 6, 7, 11):
+        _event(day)
+    _event(5, title="вторая")
+
+    body = client.get("/calendar/summary", params={**OCTOBER, "titles": 1}).json()
+    assert all(len(b["items"]) == 1 for b in body["buckets"])
+
+    weeks = client.get("/calendar/summary", params={**OCTOBER, "granularity": "week"}).json()["buckets"]
+    # Неделя начинается с понедельника: 5–7 октября в неделе 2026-10-05, 11-е — воскресенье той же недели
+    assert [(w["date"], w["end"], w["total"]) for w in weeks] == [("2026-10-05", "2026-10-11", 5)]
+
+
+def test_etag_changes_with_data(client, admin):
+    _event(5)
+    first = client.get("/calendar/summary", params=OCTOBER)
+    etag = first.headers["ETag"]
+    assert client.get("/calendar/summary", params=OCTOBER, headers={"If-None-Match": etag}).status_code == 304
+
+    r = client.post("/events", json={"type": "schedule", "title": "новая", "body": "", "date": "2026-10-06"}, headers=admin)
+    assert r.status_code == 200
+    again = client.get("/calendar/summary", params=OCTOBER, headers={"If-None-Match": etag})
+    assert again.status_code == 200
+    assert again.headers["ETag"] != etag
+    assert sum(b["total"] for b in again.json()["buckets"]) == 2
+
+
+def test_exclude_types_frees_title_slots(client):
+    for i in range(5):
+        _event(5, "homework" if i % 2 else "Домашнее задание", f"дз {i}")
+    for i in range(5):
+        _event(5, "schedule", f"пара {i}", time(9 + i, 0))
+    _event(5, "перенос домашки", "перенос")
+    add_event(Event(type="homework", title="дз без даты", body=""))
+
+    full = client.get("/calendar/summary", params=OCTOBER).json()
+    assert [item["type"] for item in full["buckets"][0]["items"]] == ["homework"] * 5
+
+    body = client.get("/calendar/summary", params={**OCTOBER, "exclude_types": "homework"}).json()
+    day = body["buckets"][0]
+    # Перенос — не домашка, хоть в типе и есть «домаш»
+    assert day["counts"] == {"schedule": 5, "transfer": 1}
+    assert [item["title"] for item in day["items"]] == ["пара 0", "пара 1", "пара 2", "пара 3", "пара 4"]
+    assert body["undated"] == []
+
+
+@pytest.fixture
+def case_sensitive_like():
+    """LIKE с учётом регистра, как в PostgreSQL (в SQLite по умолчанию регистр ASCII не важен)."""
+    def pragma(dbapi_connection, _record):
+        dbapi_connection.execute("PRAGMA case_sensitive_like = ON")
+
+    event.listen(engine, "connect", pragma)
+    engine.dispose()
+    yield
+    event.remove(engine, "connect", pragma)
+    engine.dispose()
+
+
+def test_cell_order_matches_type_case_insensitively(client, case_sensitive_like):
+    _event(5, "schedule", "пара", time(8, 0))
+    _event(5, "Homework", "дз")
+    _event(5, "EXAM_CONTROL", "контрольная")
+    _event(5, "Перенос домашки", "перенос")
+
+    day = client.get("/calendar/summary", params=OCTOBER).json()["buckets"][0]
+    assert day["counts"] == {"schedule": 1, "homework": 1, "exam_control": 1, "transfer": 1}
+    # Контрольная, домашка, затем остальное по времени (перенос без времени — последним)
+    assert [item["title"] for item in day["items"]] == ["контрольная", "дз", "пара", "перенос"]
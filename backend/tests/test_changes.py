@@ -0,0 +1,42 @@
+import asyncio
+from datetime import date
+
+from app import changes
+from app.crud import add_event, delete_event
+from app.models import Event
+
+
+def test_writes_reach_subscribers():
+    async def scenario():
+        sub = changes.subscribe()
+        try:
+            # Запись идёт из потока пула, как в синхронных эндпоинтах
+            ev = await asyncio.to_thread(add_event, Event(type="schedule", title="пара", body="", date=date(2026, 10, 5)))
+            inserted = await sub.get(timeout=1.0)
+            await asyncio.to_thread(delete_event, ev.id)
+            deleted = await sub.get(timeout=1.0)
+            return ev, inserted, deleted
+        finally:
+            changes.unsubscribe(sub)
+
+    ev, inserted, deleted = asyncio.run(scenario())
+    assert inserted == {"op": "insert", "ids": [ev.id], "dates": ["2026-10-05"], "version": 1}
+    assert deleted == {"op": "delete", "ids": [ev.id], "dates": ["2026-10-05"], "version": 2}
+    assert changes.known_version() == 2
+
+
+def test_slow_subscriber_gets_resync(monkeypatch):
+    monkeypatch.setattr(changes, "SUBSCRIBER_QUEUE_SIZE", 2)
+
+    async def scenario():
+        sub = changes.subscribe()
+        try:
+            for version in (1, 2, 3):
+                changes.publish("update", [version], [], version)
+            await asyncio.sleep(0)
+            return [await sub.get(timeout=0.1) for _ in range(2)]
+        finally:
+            changes.unsubscribe(sub)
+
+    # Очередь переполнилась: накопленное выброшено, вместо него — просьба перечитать всё
+    assert asyncio.run(scenario()) == [{"op": "resync", "version": 3}, None]
@@ -0,0 +1,60 @@
+"""
+Структурные логи: id корреляции из X-Request-ID, строка JSON на запись, DEBUG-выборка по запросу.
+"""
+import json
+import logging
+
+from common import jsonlog
+
+
+def _record(msg: str, level: int = logging.INFO, **extra) -> logging.LogRecord:
+    record = logging.LogRecord("app.test", level, __file__, 1, msg, (), None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_request_id_is_kept_or_generated(client):
+    echoed = client.get("/events", headers={"X-Request-ID": "req-1"})
+    assert echoed.headers["X-Request-ID"] == "req-1"
+    # Чужой заголовок чистится и обрезается, а не пишется в лог как есть
+    dirty = client.get("/events", headers={"X-Request-ID": "a b\"<x>" + "z" * 100})
+    assert dirty.headers["X-Request-ID"] == "abx" + "z" * (jsonlog.MAX_REQUEST_ID_LENGTH - 3)
+    generated = client.get("/events").headers["X-Request-ID"]
+    assert len(generated) == 32 and generated != client.get("/events").headers["X-Request-ID"]
+
+
+def test_record_carries_bound_id_and_extra_fields():
+    token = jsonlog.bind("cid-1")
+    try:
+        assert jsonlog.propagation_headers() == {"X-Request-ID": "cid-1"}
+        record = _record("отправлено", event_id=7)
+        assert jsonlog.ContextFilter().filter(record)
+    finally:
+        jsonlog.correlation_id.reset(token)
+    assert jsonlog.propagation_headers() == {}
+
+    entry = json.loads(jsonlog.JsonFormatter().format(record))
+    assert entry["msg"] == "отправлено" and entry["level"] == "INFO" and entry["logger"] == "app.test"
+    assert entry["correlation_id"] == "cid-1"
+    assert entry["event_id"] == 7
+    assert entry["ts"].endswith("Z")
+
+
+def test_debug_sampling_is_decided_per_request():
+    ids = [jsonlog.new_id() for _ in range(200)]
+    kept = [cid for cid in ids if jsonlog._sampled(cid, 0.5)]
+    assert 0 < len(kept) < len(ids)
+    # Для одного запроса решение одно и то же: его DEBUG-строки попадают в лог все или ни одна
+    assert kept == [cid for cid in ids if jsonlog._sampled(cid, 0.5)]
+
+    token = jsonlog.bind("cid-1")
+    try:
+        assert jsonlog.ContextFilter().filter(_record("всегда", logging.DEBUG, sample=1))
+        assert not jsonlog.ContextFilter().filter(_record("никогда", logging.DEBUG, sample=0))
+        assert jsonlog.ContextFilter().filter(_record("не DEBUG", logging.WARNING, sample=0))
+    finally:
+        jsonlog.correlation_id.reset(token)
+
+
+def test_log_levels_spec():
+    assert jsonlog._parse_levels("app.main=DEBUG, httpx=warning,bad,x=LOUD") == {"app.main": "DEBUG", "httpx": "WARNING"}
@@ -0,0 +1,48 @@
+"""
+Работа под gunicorn в несколько процессов: /metrics суммирует счётчики всех воркеров,
+а без Redis версия данных не берётся из памяти процесса.
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from app import changes
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+# Воркер: один запрос к /events и текст /metrics. Каталог метрик задаётся до импорта prometheus_client
+WORKER = """
+import sys
+sys.path[:0] = [sys.argv[1], sys.argv[2]]
+from fastapi.testclient import TestClient
+from app.main import app
+with TestClient(app) as c:
+    assert c.get("/events").status_code == 200
+    print(c.get("/metrics").text)
+"""
+
+
+def _run_worker(metrics_dir: Path) -> str:
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(metrics_dir), "WEB_CONCURRENCY": "2"}
+    proc = subprocess.run(
+        [sys.executable, "-c", WORKER, str(BACKEND_DIR), str(BACKEND_DIR.parent)],
+        env=env, capture_output=True, text=True, timeout=120,
+    )
+    assert proc.returncode == 0, proc.stderr
+    return proc.stdout
+
+
+def test_metrics_are_summed_across_processes(tmp_path):
+    line = 'http_requests_total{method="GET",path="/events",status_code="200"}'
+    assert f"{line} 1.0" in _run_worker(tmp_path)
+    # Второй процесс видит и свой запрос, и запрос уже завершившегося
+    assert f"{line} 2.0" in _run_worker(tmp_path)
+
+
+def test_known_version_needs_redis_with_several_workers(monkeypatch):
+    changes.note_version(5)
+    assert changes.known_version() == 5
+    # Записи соседних процессов сюда не доходят — версию надо читать из БД
+    monkeypatch.setattr(changes, "WEB_CONCURRENCY", 2)
+    assert changes.known_version() is None
@@ -0,0 +1,261 @@
+from datetime import datetime, timedelta
+
+from sqlmodel import Session, select
+
+from app import changes, crud
+from app.crud import (
+    ack_reminders, add_event, claim_due_reminders, delete_event, fail_reminders, get_data_version,
+    get_reminder_version, mark_reminder_sent, release_reminders, retry_reminder, update_event,
+)
+from app.database import engine
+from app.models import Event, Reminder
+
+# Событие далеко в будущем: при создании его напоминания не просрочены, время цикла задаётся явно
+START = datetime(2030, 3, 10, 12, 0)
+DUE = START - timedelta(hours=23)
+
+
+def _event(title: str = "пара", offsets: str | None = None) -> Event:
+    return add_event(Event(type="schedule", title=title, body="", date=START.date(), time=START.time(), reminder_offsets=offsets))
+
+
+def _reminder(reminder_id: int) -> Reminder:
+    with Session(engine) as session:
+        return session.get(Reminder, reminder_id)
+
+
+def _reminders(event_id: int) -> dict:
+    """{смещение в часах: (fire_at, status)} напоминаний события."""
+    with Session(engine) as session:
+        rows = session.exec(select(Reminder).where(Reminder.event_id == event_id)).all()
+        return {r.offset_hours: (r.fire_at, r.status) for r in rows}
+
+
+def test_one_reminder_per_offset():
+    ev = _event(offsets="168,24,1")
+    assert _reminders(ev.id) == {
+        168: (START - timedelta(hours=168), "pending"),
+        24: (START - timedelta(hours=24), "pending"),
+        1: (START - timedelta(hours=1), "pending"),
+    }
+
+
+def test_overdue_reminders_keep_only_nearest():
+    start = (datetime.utcnow() + timedelta(hours=2)).replace(second=0, microsecond=0)
+    ev = add_event(Event(type="homework", title="дз", body="", date=start.date(), time=start.time(), reminder_offsets="48,24,1"))
+    # За 48 и 24 часа уже просрочены: уйдёт только ближайшее к событию, за час — в своё время
+    assert {off: status for off, (_, status) in _reminders(ev.id).items()} == {48: "skipped", 24: "pending", 1: "pending"}
+
+
+def test_reschedule_and_delete_sync_reminders():
+    ev = _event(offsets="48,24")
+    lease_id, _, claimed = claim_due_reminders(now=DUE)
+    ack_reminders([{"id": r.id} for r, _ in claimed], lease_id=lease_id)
+    assert {status for _, status in _reminders(ev.id).values()} == {"sent"}
+
+    # Перенос на день: отправленные напоминания снова ждут; убранное смещение удаляется
+    update_event(ev.id, date="2030-03-11", reminder_offsets="24")
+    assert _reminders(ev.id) == {24: (START, "pending")}
+    with Session(engine) as session:
+        assert session.get(Event, ev.id).reminder_sent is False
+
+    assert delete_event(ev.id)
+    assert _reminders(ev.id) == {}
+
+
+def test_claim_skips_reminders_not_due_yet():
+    _event()
+    assert claim_due_reminders(now=START - timedelta(hours=25))[2] == []
+
+
+def test_claim_is_exclusive_until_lease_expires():
+    ev = _event()
+    lease_id, lease_until, claimed = claim_due_reminders(lease_seconds=60, now=DUE)
+    assert [e.id for _, e in claimed] == [ev.id]
+    assert lease_until == DUE + timedelta(seconds=60)
+    assert _reminder(claimed[0][0].id).lease_id == lease_id
+
+    # Второй worker ничего не получает, пока аренда действует
+    assert claim_due_reminders(now=DUE + timedelta(seconds=30))[2] == []
+
+    # Worker упал: после истечения аренды напоминание снова доступно под новой арендой
+    second_id, _, again = claim_due_reminders(now=DUE + timedelta(seconds=61))
+    assert second_id != lease_id
+    assert [r.id for r, _ in again] == [claimed[0][0].id]
+
+
+def test_release_returns_reminders_to_queue():
+    _event("первая")
+    _event("вторая")
+    lease_id, _, claimed = claim_due_reminders(now=DUE)
+    ids = [r.id for r, _ in claimed]
+    assert len(ids) == 2
+
+    assert release_reminders(lease_id, ids[:1]) == 1
+    assert [r.id for r, _ in claim_due_reminders(now=DUE)[2]] == ids[:1]
+    assert release_reminders(lease_id) == 1
+    assert release_reminders("чужая") == 0
+
+
+def test_claim_and_release_endpoints(client):
+    start = (datetime.utcnow() + timedelta(hours=1)).replace(second=0, microsecond=0)
+    ev = add_event(Event(type="schedule", title="скоро", body="", date=start.date(), time=start.time()))
+
+    body = client.post("/events/reminders/claim", json={"limit": 10, "lease_seconds": 60}).json()
+    assert [item["id"] for item in body["events"]] == [ev.id]
+    assert client.post("/events/reminders/claim", json={}).json()["events"] == []
+
+    released = client.post("/events/reminders/release", json={"lease_id": body["lease_id"]}).json()
+    assert released == {"ok": True, "released": 1}
+    assert len(client.post("/events/reminders/claim", json={}).json()["events"]) == 1
+
+
+def test_ack_marks_sent_only_within_lease():
+    ev = _event(offsets="48,24")
+    lease_id, _, claimed = claim_due_reminders(now=DUE)
+    first, second = [r.id for r, _ in claimed]
+
+    assert ack_reminders([{"id": first, "sent_message_id": 77}], lease_id="чужая") == 0
+    assert ack_reminders([{"id": first, "sent_message_id": 77}], lease_id=lease_id) == 1
+    row = _reminder(first)
+    assert (row.status, row.sent_message_id, row.lease_id) == ("sent", 77, None)
+    # Второе напоминание ещё не отправлено — событие продолжает ждать
+    with Session(engine) as session:
+        assert session.get(Event, ev.id).reminder_sent is False
+
+    assert ack_reminders([{"id": second}], lease_id=lease_id) == 1
+    with Session(engine) as session:
+        assert session.get(Event, ev.id).reminder_sent is True
+    # Повторный ack уже отправленного ничего не меняет
+    assert ack_reminders([{"id": first, "sent_message_id": 99}], lease_id=lease_id) == 0
+    assert _reminder(first).sent_message_id == 77
+
+
+def test_ack_endpoint(client):
+    _event()
+    lease_id, _, [(reminder, _)] = claim_due_reminders(now=DUE)
+    body = {"lease_id": lease_id, "items": [{"id": reminder.id, "sent_message_id": 5}]}
+    assert client.post("/events/reminders/ack", json=body).json() == {"ok": True, "acked": 1}
+    assert _reminder(reminder.id).status == "sent"
+    assert claim_due_reminders(now=DUE + timedelta(days=1))[2] == []
+
+
+def _no_jitter(monkeypatch, max_attempts: int = 3):
+    monkeypatch.setattr(crud, "REMINDER_MAX_ATTEMPTS", max_attempts)
+    monkeypatch.setattr(crud, "REMINDER_RETRY_BASE_SECONDS", 60)
+    monkeypatch.setattr(crud, "REMINDER_RETRY_JITTER", 0)
+
+
+def test_fail_backs_off_then_dead_letters(monkeypatch):
+    _no_jitter(monkeypatch, max_attempts=3)
+    _event()
+    now = DUE
+    for attempt, delay in ((1, 60), (2, 120)):
+        lease_id, _, [(reminder, _)] = claim_due_reminders(now=now)
+        assert fail_reminders(lease_id, [{"id": reminder.id, "error": "timeout"}], now=now) == {"retry": 1, "dead": 0}
+        row = _reminder(reminder.id)
+        assert (row.status, row.attempts, row.last_error, row.lease_id) == ("pending", attempt, "timeout", None)
+        assert row.next_attempt_at == now + timedelta(seconds=delay)
+        # До конца паузы напоминание не выдаётся
+        assert claim_due_reminders(now=now + timedelta(seconds=delay - 1))[2] == []
+        now += timedelta(seconds=delay)
+
+    lease_id, _, [(reminder, _)] = claim_due_reminders(now=now)
+    assert fail_reminders(lease_id, [{"id": reminder.id}], now=now) == {"retry": 0, "dead": 1}
+    row = _reminder(reminder.id)
+    assert (row.status, row.attempts, row.next_attempt_at) == ("dead", 3, None)
+    assert claim_due_reminders(now=now + timedelta(days=1))[2] == []
+
+
+def test_fail_permanent_and_retry_after(monkeypatch):
+    _no_jitter(monkeypatch)
+    _event("первая")
+    _event("вторая")
+    lease_id, _, claimed = claim_due_reminders(now=DUE)
+    first, second = [r.id for r, _ in claimed]
+
+    # Без аренды неудачи не засчитываются
+    assert fail_reminders("чужая", [{"id": first}], now=DUE) == {"retry": 0, "dead": 0}
+
+    failures = [{"id": first, "permanent": True, "error": "chat not found"}, {"id": second, "retry_after": 600}]
+    assert fail_reminders(lease_id, failures, now=DUE) == {"retry": 1, "dead": 1}
+    assert _reminder(first).status == "dead"
+    assert _reminder(second).next_attempt_at == DUE + timedelta(seconds=600)
+
+
+def test_dead_letter_admin_retry(client, admin):
+    ev = _event()
+    lease_id, _, [(reminder, _)] = claim_due_reminders(now=DUE)
+    r = client.post("/events/reminders/fail", json={"lease_id": lease_id, "items": [{"id": reminder.id, "error": "forbidden", "permanent": True}]})
+    assert r.json() == {"ok": True, "retry": 0, "dead": 1}
+
+    assert client.get("/admin/reminders/dead").status_code == 401
+    dead = client.get("/admin/reminders/dead", headers=admin).json()
+    assert [(d["reminder_id"], d["id"], d["attempts"], d["last_error"]) for d in dead] == [(reminder.id, ev.id, 1, "forbidden")]
+
+    assert client.post(f"/admin/reminders/{reminder.id}/retry", headers=admin).json() == {"ok": True}
+    row = _reminder(reminder.id)
+    assert (row.status, row.attempts, row.last_error) == ("pending", 0, None)
+    assert client.post(f"/admin/reminders/{reminder.id}/retry", headers=admin).status_code == 404
+    assert client.get("/admin/reminders/dead", headers=admin).json() == []
+    assert [r.id for r, _ in claim_due_reminders(now=DUE)[2]] == [reminder.id]
+
+
+def test_upcoming_reminders_etag(client, admin):
+    ev = _event(offsets="48,24")
+    r = client.get("/events/upcoming_reminders")
+    etag = r.headers["ETag"]
+    assert [(item["event_id"], item["remind_at"]) for item in r.json()["reminders"]] == [
+        (ev.id, "2030-03-08T12:00:00"),
+        (ev.id, "2030-03-09T12:00:00"),
+    ]
+    assert client.get("/events/upcoming_reminders", headers={"If-None-Match": etag}).status_code == 304
+
+    r = client.post("/events", json={"type": "homework", "title": "дз", "body": "", "date": "2030-03-11"}, headers=admin)
+    assert r.status_code == 200
+    again = client.get("/events/upcoming_reminders", headers={"If-None-Match": etag})
+    assert again.status_code == 200
+    assert again.headers["ETag"] != etag
+    # Домашка, созданная через API, получает напоминание (пары — нет)
+    assert len(again.json()["reminders"]) == 3
+
+
+def test_reminder_status_does_not_change_event_version(client, monkeypatch):
+    # Напоминание за час ещё не наступило: событие ждёт его после всех подтверждений ниже
+    ev = _event(offsets="48,24,1")
+    published = []
+    monkeypatch.setattr(changes, "publish", lambda op, ids, dates=None, version=None: published.append(ids))
+    version = get_data_version()
+    upcoming = client.get("/events/upcoming_reminders").headers["ETag"]
+
+    lease_id, _, claimed = claim_due_reminders(now=DUE)
+    first, second = [r.id for r, _ in claimed]
+    fail_reminders(lease_id, [{"id": first, "permanent": True}], now=DUE)
+    ack_reminders([{"id": second}], lease_id=lease_id)
+    assert retry_reminder(first)
+    # Неудача, подтверждение и повтор из dead не трогают события: кэши календаря остаются в силе
+    assert get_data_version() == version
+    assert published == []
+    assert client.get("/events/upcoming_reminders", headers={"If-None-Match": upcoming}).status_code == 200
+
+    lease_id, _, claimed = claim_due_reminders(now=START)
+    reminder_version = get_reminder_version()
+    ack_reminders([{"id": r.id} for r, _ in claimed], lease_id=lease_id)
+    # Последние ожидающие напоминания: reminder_sent становится True — это изменение события
+    assert get_data_version() == version + 1
+    assert get_reminder_version() == reminder_version + 1
+    assert published == [[ev.id]]
+
+
+def test_legacy_mark_sent_keeps_later_offsets(client):
+    ev = _event(offsets="48,24")
+    assert mark_reminder_sent(ev.id, now=DUE)
+    assert {off: status for off, (_, status) in _reminders(ev.id).items()} == {48: "sent", 24: "pending"}
+    with Session(engine) as session:
+        assert session.get(Event, ev.id).reminder_sent is False
+
+    assert mark_reminder_sent(ev.id, now=DUE)
+    assert {status for _, status in _reminders(ev.id).values()} == {"sent"}
+    with Session(engine) as session:
+        assert session.get(Event, ev.id).reminder_sent is True
+    assert client.post("/events/999999/mark_reminder_sent").status_code == 404
@@ -0,0 +1,76 @@
+"""
+Очередь правок и удалений отправленных постов: склейка заданий по посту и проход фонового цикла
+против подменённого bot-service (httpx.MockTransport).
+"""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app import telegram_sync
+from app.telegram_sync import SyncJob
+
+
+@pytest.fixture(autouse=True)
+def empty_queue(monkeypatch):
+    """Очередь пуста и не привязана к event loop прошлых тестов."""
+    monkeypatch.setattr(telegram_sync, "_loop", None)
+    monkeypatch.setattr(telegram_sync, "_wakeup", None)
+    telegram_sync._take_pending()
+    yield
+    telegram_sync._take_pending()
+
+
+def test_jobs_are_merged_per_post():
+    assert telegram_sync.enqueue([
+        SyncJob(chat_id=-100, message_id=10, text="первая правка", event_id=1),
+        SyncJob(chat_id=-100, message_id=10, text="вторая правка", event_id=1),
+        SyncJob(chat_id=-100, message_id=11, text="правка", event_id=2),
+        SyncJob(chat_id=-100, message_id=11),
+        # Без поста синхронизировать нечего
+        SyncJob(chat_id=-100, message_id=0, text="не отправлено", event_id=3),
+    ]) == 4
+    # Удаление уже в очереди — поздняя правка пост не воскрешает
+    assert telegram_sync.enqueue([SyncJob(chat_id=-100, message_id=11, text="после удаления", event_id=2)]) == 0
+
+    jobs = telegram_sync._take_pending()
+    assert [(j.message_id, j.text) for j in jobs] == [(10, "вторая правка"), (11, None)]
+    assert telegram_sync._take_pending() == []
+
+
+def test_loop_sends_current_text_and_deletes(monkeypatch):
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append((request.url.path, json.loads(request.content)))
+        return httpx.Response(200, json={"ok": True})
+
+    client_cls = httpx.AsyncClient
+    monkeypatch.setattr(telegram_sync.httpx, "AsyncClient", lambda: client_cls(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(telegram_sync, "TELEGRAM_EDIT_INTERVAL", 0)
+    # Текст перечитывается из БД: событие 1 успели поправить ещё раз, событие 2 уже удалено
+    monkeypatch.setattr(telegram_sync, "current_text", {1: "текст из БД", 2: None}.get)
+
+    async def scenario():
+        telegram_sync.start()
+        try:
+            telegram_sync.enqueue([
+                SyncJob(chat_id=-100, message_id=10, text="устаревший текст", event_id=1),
+                SyncJob(chat_id=-100, message_id=11, text="правка удалённого", event_id=2),
+                SyncJob(chat_id=-100, message_id=12, text="правка", event_id=3),
+                SyncJob(chat_id=-100, message_id=12),
+            ])
+            for _ in range(100):
+                if len(calls) == 2:
+                    break
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.05)
+        finally:
+            await telegram_sync.stop()
+
+    asyncio.run(scenario())
+    assert calls == [
+        ("/edit", {"chat_id": -100, "message_id": 10, "text": "текст из БД"}),
+        ("/delete", {"chat_id": -100, "message_id": 12}),
+    ]
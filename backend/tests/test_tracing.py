@@ -0,0 +1,90 @@
+"""
+Трассировка: входящий traceparent продолжается серверным спаном, запросы к БД — его дети,
+исходящий запрос в bot-service уносит ту же трассу и id корреляции.
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from app import main
+from common import jsonlog, tracing
+
+PARENT_TRACE = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_SPAN = "00f067aa0ba902b7"
+
+
+class Recorder:
+    """Вместо пачек и потока выгрузки — законченные спаны в список."""
+
+    def __init__(self):
+        self.spans = []
+
+    def submit(self, span: tracing.Span) -> None:
+        self.spans.append(span)
+
+
+@pytest.fixture
+def recorded(monkeypatch) -> list:
+    recorder = Recorder()
+    monkeypatch.setattr(tracing, "_processor", recorder)
+    return recorder.spans
+
+
+def test_traceparent_header():
+    assert tracing.parse_traceparent(f"00-{PARENT_TRACE}-{PARENT_SPAN}-01") == (PARENT_TRACE, PARENT_SPAN, True)
+    assert tracing.parse_traceparent(f"00-{PARENT_TRACE}-{PARENT_SPAN}-00")[2] is False
+    for bad in (None, "", "00-xyz-00f067aa0ba902b7-01", f"00-{'0' * 32}-{PARENT_SPAN}-01"):
+        assert tracing.parse_traceparent(bad) is None
+
+
+def test_server_span_continues_caller_trace(client, recorded):
+    r = client.get("/events", headers={"traceparent": f"00-{PARENT_TRACE}-{PARENT_SPAN}-01"})
+    assert r.status_code == 200
+
+    [server] = [s for s in recorded if s.kind == "server"]
+    assert server.name == "GET /events"
+    assert (server.trace_id, server.parent_id) == (PARENT_TRACE, PARENT_SPAN)
+    assert server.attributes["http.status_code"] == 200
+    queries = [s for s in recorded if s.name == "db.query"]
+    assert queries and all((q.trace_id, q.parent_id) == (PARENT_TRACE, server.span_id) for q in queries)
+
+    # Вызывающий попросил не выгружать трассу — ни одного спана
+    recorded.clear()
+    client.get("/events", headers={"traceparent": f"00-{PARENT_TRACE}-{PARENT_SPAN}-00"})
+    assert recorded == []
+
+
+def test_outgoing_request_carries_trace_and_correlation_id(recorded):
+    sent = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        sent.update(request.headers)
+        return httpx.Response(200, json={"ok": True})
+
+    async def scenario():
+        token = jsonlog.bind("cid-1")
+        try:
+            with tracing.span("test.parent") as parent:
+                async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                    await main._post_bot(client, {"text": "x"}, timeout=1.0, event_id=7)
+                return parent
+        finally:
+            jsonlog.correlation_id.reset(token)
+
+    parent = asyncio.run(scenario())
+    [call] = [s for s in recorded if s.kind == "client"]
+    assert call.parent_id == parent.span_id and call.trace_id == parent.trace_id
+    assert call.attributes == {"event_id": 7, "http.status_code": 200}
+    # bot-service продолжит спан вызова, а не родительский
+    assert sent["traceparent"] == call.traceparent
+    assert sent["x-request-id"] == "cid-1"
+
+
+def test_span_records_error():
+    with pytest.raises(ValueError):
+        with tracing.span("test.fail") as s:
+            raise ValueError("сломалось")
+    assert s.error == "ValueError: сломалось" and s.end_ns is not None
+    # Фоновая работа без родителя трассу не заводит
+    assert tracing.start_span("db.query", require_parent=True) is None
@@ -3,10 +3,15 @@ import json
 import logging
 import os
 import subprocess
+import weakref
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 
-logging.basicConfig(level=logging.INFO)
+from common import jsonlog, tracing
+from dedup_store import DedupStore
+
+jsonlog.setup("bot")
+tracing.setup("bot")
 logger = logging.getLogger("bot-service")
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
@@ -21,6 +26,21 @@ TELEGRAM_IPV6 = os.getenv("TELEGRAM_API_IPV6", "2001:67c:4e8:f004::9")
 TELEGRAM_IPV4 = os.getenv("TELEGRAM_API_IPV4", "149.154.166.110")
 
 app = FastAPI(title="Сервис бота М15")
+# X-Request-ID и traceparent от backend/worker: логи и спаны одной отправки во всех сервисах связаны
+app.add_middleware(tracing.TracingMiddleware)
+app.add_middleware(jsonlog.CorrelationMiddleware)
+
+dedup_store = DedupStore()
+# Один замок на ключ идемпотентности: параллельные повторы ждут первую попытку, а не шлют дубль
+_dedup_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def _dedup_lock(key: str) -> asyncio.Lock:
+    lock = _dedup_locks.get(key)
+    if lock is None:
+        lock = asyncio.Lock()
+        _dedup_locks[key] = lock
+    return lock
 
 
 async def _run_curl(args: list[str]) -> subprocess.CompletedProcess[str]:
@@ -32,6 +52,12 @@ async def _run_curl(args: list[str]) -> subprocess.CompletedProcess[str]:
 
 
 async def _telegram_call(method: str, payload: dict) -> dict:
+    # Спан на весь вызов и вложенный — на каждую попытку маршрута: видно, сколько съели повторы и паузы
+    with tracing.span(f"telegram {method}", kind="client"):
+        return await _telegram_call_routes(method, payload)
+
+
+async def _telegram_call_routes(method: str, payload: dict) -> dict:
     url = f"{API_BASE}/{method}"
     payload_json = json.dumps(payload, ensure_ascii=False)
 
@@ -85,8 +111,12 @@ async def _telegram_call(method: str, payload: dict) -> dict:
             if route["resolve"] is not None:
                 cmd.extend(["--resolve", route["resolve"]])
 
-            logger.info("Telegram curl try round=%s route=%s", round_idx, route["name"])
-            result = await _run_curl(cmd)
+            logger.debug("Telegram curl try round=%s route=%s", round_idx, route["name"])
+            with tracing.span("telegram attempt", kind="client", round=round_idx, route=route["name"]) as attempt:
+                result = await _run_curl(cmd)
+                attempt.set(returncode=result.returncode)
+                if result.returncode != 0:
+                    attempt.set_error(result.stderr.strip() or f"curl rc={result.returncode}")
             if result.returncode != 0:
                 last_error = (
                     f"round={round_idx} route={route['name']} rc={result.returncode} "
@@ -116,6 +146,21 @@ class SendRequest(BaseModel):
     chat_id: int
     thread_id: int | None = None
     text: str
+    # Ключ идемпотентности (например event:<id>:reminder): повтор вернёт исходный message_id
+    idempotency_key: str | None = None
+
+
+class EditRequest(BaseModel):
+    """Запрос на изменение текста уже отправленного сообщения."""
+    chat_id: int
+    message_id: int
+    text: str
+
+
+class DeleteRequest(BaseModel):
+    """Запрос на удаление отправленного сообщения."""
+    chat_id: int
+    message_id: int
 
 
 class CreateTopicRequest(BaseModel):
@@ -128,29 +173,119 @@ class CreateTopicRequest(BaseModel):
 async def send_message(req: SendRequest):
     """Отправляет сообщение в Telegram и возвращает ID сообщения."""
     try:
-        logger.info("POST /send payload: %s", req.dict())
-        payload: dict[str, object] = {"chat_id": req.chat_id, "text": req.text}
-        if req.thread_id is not None:
-            payload["message_thread_id"] = req.thread_id
+        logger.debug("POST /send payload", extra={"payload": req.dict()})
+        if not req.idempotency_key:
+            return await _send_once(req)
+
+        loop = asyncio.get_running_loop()
+        async with _dedup_lock(req.idempotency_key):
+            # SQLite с fsync журнала — в пуле потоков, чтобы не стопорить event loop остальных /send
+            seen = await loop.run_in_executor(None, dedup_store.get, req.idempotency_key)
+            if seen is not None:
+                logger.info(
+                    "Duplicate send suppressed: key=%s message_id=%s",
+                    req.idempotency_key, seen["message_id"],
+                )
+                return {"ok": True, "message_id": seen["message_id"], "duplicate": True}
+            result = await _send_once(req)
+            await loop.run_in_executor(
+                None, dedup_store.put, req.idempotency_key, req.chat_id, result.get("message_id"),
+            )
+            return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        # Не логируем URL (там BOT_TOKEN), поэтому только тип/текст исключения.
+        logger.exception("Unexpected send failure: %s", type(e).__name__)
+        raise HTTPException(status_code=500, detail="Unexpected bot-service error")
+
+
+async def _send_once(req: SendRequest) -> dict:
+    payload: dict[str, object] = {"chat_id": req.chat_id, "text": req.text}
+    if req.thread_id is not None:
+        payload["message_thread_id"] = req.thread_id
+
+    body = await _telegram_call("sendMessage", payload)
+
+    if not body.get("ok"):
+        logger.warning("Telegram API error payload: %s", body)
+        raise _telegram_api_error(body)
 
-        body = await _telegram_call("sendMessage", payload)
+    msg = body.get("result") or {}
+    message_id = msg.get("message_id")
+    logger.info("Telegram send OK: message_id=%s chat_id=%s", message_id, req.chat_id)
+    return {"ok": True, "message_id": message_id}
+
+
+def _telegram_description(body: dict) -> str:
+    return str(body.get("description") or "").lower()
+
+
+def _telegram_api_error(body: dict) -> HTTPException:
+    """
+    Ошибка Telegram API в виде структурированного detail, чтобы вызывающий мог решить, повторять ли запрос.
+    400/403 (чат не найден, бот удалён из чата, нет темы) повтором не исправить — permanent.
+    429 и 5xx временные; для 429 Telegram подсказывает retry_after.
+    """
+    error_code = body.get("error_code")
+    parameters = body.get("parameters") or {}
+    return HTTPException(
+        status_code=502,
+        detail={
+            "error": "telegram_api_error",
+            "error_code": error_code,
+            "description": body.get("description"),
+            "permanent": error_code in (400, 403),
+            "retry_after": parameters.get("retry_after"),
+        },
+    )
+
+
+@app.post("/edit")
+async def edit_message(req: EditRequest):
+    """Меняет текст отправленного сообщения (editMessageText)."""
+    try:
+        logger.info("POST /edit chat_id=%s message_id=%s", req.chat_id, req.message_id)
+        payload = {"chat_id": req.chat_id, "message_id": req.message_id, "text": req.text}
+        body = await _telegram_call("editMessageText", payload)
 
         if not body.get("ok"):
-            logger.warning("Telegram API error payload: %s", body)
-            raise HTTPException(
-                status_code=502,
-                detail=f"Telegram API error: {body}",
-            )
+            # Текст не изменился — для вызывающего это успех, повторять нечего
+            if "message is not modified" in _telegram_description(body):
+                return {"ok": True, "message_id": req.message_id, "modified": False}
+            logger.warning("Telegram API error payload (edit): %s", body)
+            raise _telegram_api_error(body)
+
+        logger.info("Telegram edit OK: message_id=%s chat_id=%s", req.message_id, req.chat_id)
+        return {"ok": True, "message_id": req.message_id, "modified": True}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Unexpected edit failure: %s", type(e).__name__)
+        raise HTTPException(status_code=500, detail="Unexpected bot-service error")
+
+
+@app.post("/delete")
+async def delete_message(req: DeleteRequest):
+    """Удаляет отправленное сообщение (deleteMessage)."""
+    try:
+        logger.info("POST /delete chat_id=%s message_id=%s", req.chat_id, req.message_id)
+        payload = {"chat_id": req.chat_id, "message_id": req.message_id}
+        body = await _telegram_call("deleteMessage", payload)
 
-        msg = body.get("result") or {}
-        message_id = msg.get("message_id")
-        logger.info("Telegram send OK: message_id=%s chat_id=%s", message_id, req.chat_id)
-        return {"ok": True, "message_id": message_id}
+        if not body.get("ok"):
+            # Сообщение уже удалено вручную — цель достигнута
+            if "message to delete not found" in _telegram_description(body):
+                return {"ok": True, "deleted": False}
+            logger.warning("Telegram API error payload (delete): %s", body)
+            raise _telegram_api_error(body)
+
+        logger.info("Telegram delete OK: message_id=%s chat_id=%s", req.message_id, req.chat_id)
+        return {"ok": True, "deleted": True}
     except HTTPException:
         raise
     except Exception as e:
-        # Не логируем URL (там BOT_TOKEN), поэтому только тип/текст исключения.
-        logger.exception("Unexpected send failure: %s", type(e).__name__)
+        logger.exception("Unexpected delete failure: %s", type(e).__name__)
         raise HTTPException(status_code=500, detail="Unexpected bot-service error")
 
 
@@ -161,16 +296,13 @@ async def create_topic(req: CreateTopicRequest):
     Требуется, чтобы бот был админом с правами управления темами.
     """
     try:
-        logger.info("POST /create_topic payload: %s", req.dict())
+        logger.debug("POST /create_topic payload", extra={"payload": req.dict()})
         payload = {"chat_id": req.chat_id, "name": req.name}
         body = await _telegram_call("createForumTopic", payload)
 
         if not body.get("ok"):
             logger.warning("Telegram API error payload (create_topic): %s", body)
-            raise HTTPException(
-                status_code=502,
-                detail=f"Telegram API error: {body}",
-            )
+            raise _telegram_api_error(body)
 
         result_obj = body.get("result") or {}
         thread_id = result_obj.get("message_thread_id")
@@ -183,6 +315,11 @@ async def create_topic(req: CreateTopicRequest):
         raise HTTPException(status_code=500, detail="Unexpected bot-service error")
 
 
+@app.on_event("shutdown")
+def shutdown():
+    dedup_store.close()
+
+
 @app.get("/")
 async def root():
     return {"service": "bot-service", "status": "ok"}
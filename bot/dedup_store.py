@@ -0,0 +1,62 @@
+import os
+import sqlite3
+import threading
+import time
+
+# Файл SQLite с ключами идемпотентности (переживает рестарт контейнера: ./bot смонтирован в /app)
+DEDUP_DB_PATH = os.getenv("BOT_DEDUP_DB", "dedup.sqlite3")
+# Сколько хранить ключ после успешной отправки (по умолчанию неделя)
+DEDUP_TTL_SECONDS = int(os.getenv("BOT_DEDUP_TTL_SECONDS", str(7 * 24 * 3600)))
+# Как часто чистить просроченные ключи
+DEDUP_EVICT_INTERVAL = int(os.getenv("BOT_DEDUP_EVICT_INTERVAL", "600"))
+
+
+class DedupStore:
+    """
+    Постоянное хранилище ключей идемпотентности: key -> message_id.
+    Ключ записывается только после того, как Telegram принял сообщение,
+    поэтому повтор с тем же ключом возвращает исходный message_id без новой отправки.
+    """
+
+    def __init__(self, path: str = DEDUP_DB_PATH, ttl_seconds: int = DEDUP_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._last_evict = 0.0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS dedup ("
+            " key TEXT PRIMARY KEY,"
+            " chat_id INTEGER,"
+            " message_id INTEGER,"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_dedup_created_at ON dedup (created_at)")
+
+    def get(self, key: str) -> dict | None:
+        """Возвращает сохранённый результат по ключу или None (просроченные ключи не считаются)."""
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT chat_id, message_id FROM dedup WHERE key = ? AND created_at >= ?",
+                (key, cutoff),
+            ).fetchone()
+        if not row:
+            return None
+        return {"chat_id": row[0], "message_id": row[1]}
+
+    def put(self, key: str, chat_id: int | None, message_id: int | None) -> None:
+        """Запоминает результат отправки и заодно периодически вычищает просроченные ключи."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO dedup (key, chat_id, message_id, created_at) VALUES (?, ?, ?, ?)",
+                (key, chat_id, message_id, now),
+            )
+            if now - self._last_evict >= DEDUP_EVICT_INTERVAL:
+                self._conn.execute("DELETE FROM dedup WHERE created_at < ?", (now - self.ttl_seconds,))
+                self._last_evict = now
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,17 @@
+"""
+Общие настройки тестов bot-service: модули бота и common в sys.path, временная база ключей идемпотентности.
+
+Окружение задаётся до импорта bot_service: он читает настройки и открывает базу при импорте.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path[:0] = [str(ROOT / "bot"), str(ROOT)]
+
+_tmp = tempfile.mkdtemp(prefix="bot-tests-")
+os.environ["BOT_TOKEN"] = "test-token"
+os.environ["BOT_DEDUP_DB"] = os.path.join(_tmp, "dedup.sqlite3")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
@@ -0,0 +1,96 @@
+"""
+Идемпотентная отправка: повтор с тем же ключом возвращает сохранённый message_id без новой отправки.
+Telegram подменён — _send_once только считает вызовы.
+"""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import bot_service
+import dedup_store
+from dedup_store import DedupStore
+
+
+@pytest.fixture
+def sent(monkeypatch) -> list:
+    """Подменяет отправку в Telegram: каждый вызов записывается и получает следующий message_id."""
+    calls = []
+
+    async def send_once(req):
+        calls.append(req.idempotency_key)
+        await asyncio.sleep(0.01)
+        return {"ok": True, "message_id": 100 + len(calls)}
+
+    monkeypatch.setattr(bot_service, "_send_once", send_once)
+    return calls
+
+
+def _send(key: str | None, text: str = "напоминание") -> bot_service.SendRequest:
+    return bot_service.SendRequest(chat_id=-100, text=text, idempotency_key=key)
+
+
+def test_duplicate_key_returns_stored_message(sent):
+    async def scenario():
+        first = await bot_service.send_message(_send("event:1:reminder"))
+        again = await bot_service.send_message(_send("event:1:reminder"))
+        other = await bot_service.send_message(_send("event:2:reminder"))
+        return first, again, other
+
+    first, again, other = asyncio.run(scenario())
+    assert first == {"ok": True, "message_id": 101}
+    assert again == {"ok": True, "message_id": 101, "duplicate": True}
+    assert other["message_id"] == 102
+    assert sent == ["event:1:reminder", "event:2:reminder"]
+
+
+def test_concurrent_retries_send_once(sent):
+    async def scenario():
+        return await asyncio.gather(*(bot_service.send_message(_send("event:3:reminder")) for _ in range(3)))
+
+    results = asyncio.run(scenario())
+    # Повторы ждали первую попытку на замке ключа и получили её message_id
+    assert {r["message_id"] for r in results} == {101}
+    assert sum(1 for r in results if r.get("duplicate")) == 2
+    assert sent == ["event:3:reminder"]
+
+
+def test_failed_send_is_not_remembered(monkeypatch):
+    calls = []
+
+    async def send_once(req):
+        calls.append(req.idempotency_key)
+        if len(calls) == 1:
+            raise HTTPException(status_code=502, detail="Telegram unreachable")
+        return {"ok": True, "message_id": 7}
+
+    monkeypatch.setattr(bot_service, "_send_once", send_once)
+
+    async def scenario():
+        with pytest.raises(HTTPException):
+            await bot_service.send_message(_send("event:4:reminder"))
+        return await bot_service.send_message(_send("event:4:reminder"))
+
+    assert asyncio.run(scenario()) == {"ok": True, "message_id": 7}
+    assert len(calls) == 2
+
+
+def test_store_survives_reopen_and_expires(tmp_path, monkeypatch):
+    path = str(tmp_path / "dedup.sqlite3")
+    store = DedupStore(path, ttl_seconds=60)
+    store.put("event:5:reminder", -100, 55)
+    store.close()
+
+    # После рестарта ключ на месте
+    reopened = DedupStore(path, ttl_seconds=60)
+    assert reopened.get("event:5:reminder") == {"chat_id": -100, "message_id": 55}
+    assert reopened.get("event:6:reminder") is None
+
+    now = dedup_store.time.time()
+    monkeypatch.setattr(dedup_store.time, "time", lambda: now + 61)
+    assert reopened.get("event:5:reminder") is None
+    # Просроченные ключи вычищаются при очередной записи
+    monkeypatch.setattr(dedup_store, "DEDUP_EVICT_INTERVAL", 0)
+    reopened.put("event:6:reminder", -100, 66)
+    assert reopened._conn.execute("SELECT key FROM dedup").fetchall() == [("event:6:reminder",)]
+    reopened.close()
@@ -0,0 +1 @@
+"""Общий код сервисов М15 (backend, worker, bot-service, parser)."""
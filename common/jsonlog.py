@@ -0,0 +1,253 @@
+"""
+Структурные логи в JSON для backend, worker, bot-service и парсера.
+
+Вызов logger.* на пути запроса только кладёт запись в очередь (без замка обработчика и без
+записи в stdout); форматирует и пишет отдельный поток QueueListener. Если очередь переполнена,
+запись отбрасывается, а не блокирует запрос; число отброшенных уходит полем dropped со следующей.
+
+Настройка через окружение:
+  LOG_LEVEL         — уровень по умолчанию (INFO)
+  LOG_LEVELS        — уровни по модулям: "app.main=DEBUG,httpx=WARNING"
+  LOG_DEBUG_SAMPLE  — доля запросов, для которых пишутся DEBUG-строки (1 — все, 0.01 — каждый сотый)
+  LOG_FORMAT        — json или text (читаемый вид для локальной отладки)
+  LOG_QUEUE_SIZE    — сколько записей может ждать потока записи
+
+Id корреляции (заголовок X-Request-ID) живёт в contextvar: его выставляет CorrelationMiddleware
+или bind(), он попадает в каждую запись и уходит в исходящие запросы через propagation_headers().
+"""
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import uuid
+import zlib
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_DEBUG_SAMPLE = float(os.getenv("LOG_DEBUG_SAMPLE", "1"))
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+REQUEST_ID_HEADER = "X-Request-ID"
+# Чужой заголовок не должен раздувать каждую строку лога
+MAX_REQUEST_ID_LENGTH = 64
+_REQUEST_ID_UNSAFE_RE = re.compile(r"[^\w.:-]")
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(correlation_id)s] %(message)s"
+
+correlation_id: contextvars.ContextVar = contextvars.ContextVar("correlation_id", default=None)
+
+# Стандартные атрибуты LogRecord; остальные (extra=...) становятся полями JSON
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "correlation_id", "sample"}
+
+_service: str | None = None
+# Функции, дополняющие запись полями текущего контекста (например, trace_id из tracing)
+_context_providers: list = []
+_handler: "NonBlockingQueueHandler | None" = None
+_listener: logging.handlers.QueueListener | None = None
+
+
+def new_id() -> str:
+    return uuid.uuid4().hex
+
+
+def bind(value: str | None = None) -> contextvars.Token:
+    """Выставляет id корреляции текущего контекста (новый, если не задан); вернуть прежний — correlation_id.reset(token)."""
+    return correlation_id.set(value or new_id())
+
+
+def propagation_headers() -> dict:
+    """Заголовки исходящего запроса: следующий сервис продолжит тот же id."""
+    cid = correlation_id.get()
+    return {REQUEST_ID_HEADER: cid} if cid else {}
+
+
+def add_context(provider) -> None:
+    """provider() -> dict полей для каждой записи; вызывается в потоке вызывающего, должен быть дешёвым."""
+    _context_providers.append(provider)
+
+
+def _sampled(cid: str | None, rate: float) -> bool:
+    if rate >= 1:
+        return True
+    if rate <= 0:
+        return False
+    if cid is None:
+        return random.random() < rate
+    # Решение по id: DEBUG-строки одного запроса либо попадают в лог все, либо ни одна
+    return zlib.crc32(cid.encode()) % 10000 < rate * 10000
+
+
+class ContextFilter(logging.Filter):
+    """
+    Выполняется в потоке вызывающего: запоминает id корреляции и отбрасывает DEBUG-строки
+    невыбранных запросов. Долю можно задать для отдельной строки: extra={"sample": 0.01}.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        cid = correlation_id.get()
+        record.correlation_id = cid
+        for provider in _context_providers:
+            record.__dict__.update(provider())
+        if record.levelno <= logging.DEBUG:
+            return _sampled(cid, getattr(record, "sample", LOG_DEBUG_SAMPLE))
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler без общего замка и без блокировки на полной очереди."""
+
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.dropped = 0
+        self.addFilter(ContextFilter())
+
+    def handle(self, record: logging.LogRecord):
+        # queue.Queue потокобезопасна — замок обработчика только добавил бы конкуренцию потоков
+        rv = self.filter(record)
+        if isinstance(rv, logging.LogRecord):
+            record = rv
+        if rv:
+            self.emit(record)
+        return rv
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Аргументы подставляем сразу (объекты могут измениться), форматирование и трассировка — в потоке записи
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.dropped:
+            record.dropped = self.dropped
+        try:
+            self.queue.put_nowait(record)
+            self.dropped = 0
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна строка JSON: ts, level, service, logger, msg, correlation_id, поля extra, exc."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z",
+            "level": record.levelname,
+            "service": _service,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        cid = getattr(record, "correlation_id", None)
+        if cid:
+            entry["correlation_id"] = cid
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def _parse_levels(spec: str) -> dict[str, str]:
+    """"app.main=DEBUG, httpx=warning" -> {"app.main": "DEBUG", "httpx": "WARNING"}; кривые пары пропускаются."""
+    levels = {}
+    for item in spec.split(","):
+        name, sep, level = item.partition("=")
+        level = level.strip().upper()
+        if sep and name.strip() and isinstance(logging.getLevelName(level), int):
+            levels[name.strip()] = level
+    return levels
+
+
+def _start_listener(stream_handler: logging.Handler) -> None:
+    global _listener
+    q: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+    _handler.queue = q
+    _listener = logging.handlers.QueueListener(q, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def _after_fork() -> None:
+    # Поток записи не переживает fork (пул парсера, воркеры gunicorn) — в дочернем процессе поднимаем свой
+    if _listener is not None:
+        _start_listener(_listener.handlers[0])
+
+
+def shutdown() -> None:
+    """Дописывает очередь в stdout; вызывается при выходе автоматически."""
+    global _listener
+    if _listener is None:
+        return
+    try:
+        _listener.stop()
+    except queue.Full:
+        pass
+    _listener = None
+
+
+def setup(service: str) -> None:
+    """
+    Направляет все логи процесса (включая uvicorn) через очередь в stdout.
+    Вызывается один раз при импорте приложения сервиса; повторный вызов ничего не делает.
+    """
+    global _service, _handler
+    if _handler is not None:
+        return
+    _service = service
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+    _handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    _start_listener(stream)
+
+    root = logging.getLogger()
+    root.handlers = [_handler]
+    root.setLevel(LOG_LEVEL)
+    # uvicorn пишет в поток своими обработчиками — переводим его логгеры на общую очередь
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uv = logging.getLogger(name)
+        uv.handlers = []
+        uv.propagate = True
+    for name, level in _parse_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    atexit.register(shutdown)
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+class CorrelationMiddleware:
+    """ASGI-middleware: id корреляции из X-Request-ID (или новый) на время запроса и в заголовке ответа."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        incoming = None
+        for key, value in scope.get("headers", []):
+            if key == b"x-request-id":
+                incoming = _REQUEST_ID_UNSAFE_RE.sub("", value.decode("latin-1"))[:MAX_REQUEST_ID_LENGTH]
+                break
+        token = bind(incoming)
+        header = (b"x-request-id", correlation_id.get().encode("latin-1"))
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), header]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            correlation_id.reset(token)
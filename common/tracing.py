@@ -0,0 +1,402 @@
+"""
+Распределённая трассировка для backend, worker, bot-service и парсера.
+
+Контекст передаётся между сервисами заголовком W3C traceparent: входящий запрос
+(TracingMiddleware) продолжает трассу вызывающего, исходящий запрос получает заголовок из inject().
+Спаны пишутся в очередь и выгружаются пачками отдельным потоком, поэтому экспорт не задерживает запрос.
+
+Настройка через окружение:
+  TRACE_EXPORTER  — none (по умолчанию), console (JSON в stdout), file (JSON Lines в TRACE_FILE)
+                    или свой экспортёр "пакет.модуль:фабрика" (объект с методом export(spans))
+  TRACE_FILE      — файл для экспортёра file (traces.jsonl)
+  TRACE_SAMPLE    — доля новых трасс, которые выгружаются (1 — все); продолжение чужой трассы
+                    следует решению вызывающего (флаг sampled в traceparent)
+
+Разбор трасс из файла: python -m common.tracing traces.jsonl [trace_id] — дерево спанов с длительностями.
+"""
+import atexit
+import contextvars
+import importlib
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from multiprocessing import util as mp_util
+
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none").strip()
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_SAMPLE = float(os.getenv("TRACE_SAMPLE", "1"))
+# Очередь и пачки выгрузки
+TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", "4096"))
+TRACE_BATCH_SIZE = 256
+TRACE_EXPORT_INTERVAL = 1.0
+# Текст SQL в атрибуте спана обрезается
+MAX_STATEMENT_LENGTH = 500
+
+TRACEPARENT_HEADER = "traceparent"
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+logger = logging.getLogger(__name__)
+
+_current: contextvars.ContextVar = contextvars.ContextVar("trace_span", default=None)
+_service: str | None = None
+_processor: "BatchProcessor | None" = None
+
+
+class Span:
+    """Один замер: имя, id трассы/спана/родителя, время начала и конца, атрибуты и статус."""
+
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "sampled", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, kind: str, trace_id: str, parent_id: str | None, sampled: bool, attributes: dict):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.start_ns = time.time_ns()
+        self.end_ns: int | None = None
+        self.attributes = attributes
+        self.error: str | None = None
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def set_error(self, error) -> None:
+        self.error = f"{type(error).__name__}: {error}"[:500] if isinstance(error, BaseException) else str(error)[:500]
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_dict(self) -> dict:
+        entry = {
+            "type": "span",
+            "service": _service,
+            "name": self.name,
+            "kind": self.kind,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": datetime.fromtimestamp(self.start_ns / 1e9, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f") + "Z",
+            "duration_ms": round(((self.end_ns or self.start_ns) - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+        }
+        if self.error:
+            entry["error"] = self.error
+        return entry
+
+
+def parse_traceparent(value: str | None) -> tuple[str, str, bool] | None:
+    """"00-<trace_id>-<span_id>-<flags>" -> (trace_id, span_id, sampled); None, если заголовок не разобрать."""
+    m = _TRACEPARENT_RE.match((value or "").strip().lower())
+    if not m or m.group(1) == "0" * 32 or m.group(2) == "0" * 16:
+        return None
+    return m.group(1), m.group(2), bool(int(m.group(3), 16) & 1)
+
+
+def current_span() -> Span | None:
+    return _current.get()
+
+
+def start_span(name: str, kind: str = "internal", parent: str | None = None, require_parent: bool = False, **attributes) -> Span | None:
+    """
+    Начинает спан, не делая его текущим (для листовых замеров вроде запросов к БД); завершать — finish().
+    parent — traceparent удалённого вызывающего; без него родитель — текущий спан контекста.
+    require_parent: без родителя спан не создаётся (None), чтобы фоновые запросы не плодили трассы.
+    """
+    remote = parse_traceparent(parent) if parent else None
+    if remote is not None:
+        trace_id, parent_id, sampled = remote
+    else:
+        current = _current.get()
+        if current is not None:
+            trace_id, parent_id, sampled = current.trace_id, current.span_id, current.sampled
+        elif require_parent:
+            return None
+        else:
+            trace_id, parent_id, sampled = f"{random.getrandbits(128):032x}", None, random.random() < TRACE_SAMPLE
+    return Span(name, kind, trace_id, parent_id, sampled, attributes)
+
+
+def finish(span: Span | None, error=None) -> None:
+    if span is None:
+        return
+    span.end_ns = time.time_ns()
+    if error is not None:
+        span.set_error(error)
+    if span.sampled and _processor is not None:
+        _processor.submit(span)
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", parent: str | None = None, require_parent: bool = False, **attributes):
+    """with span("db.query", table="event") as s: ... — спан текущего контекста; исключение отмечается в нём."""
+    s = start_span(name, kind, parent, require_parent, **attributes)
+    if s is None:
+        yield None
+        return
+    token = _current.set(s)
+    error = None
+    try:
+        yield s
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current.reset(token)
+        finish(s, error)
+
+
+def current_traceparent() -> str | None:
+    s = _current.get()
+    return s.traceparent if s is not None else None
+
+
+def inject(headers: dict | None = None) -> dict:
+    """Добавляет traceparent текущего спана в заголовки исходящего запроса."""
+    headers = dict(headers or {})
+    tp = current_traceparent()
+    if tp:
+        headers[TRACEPARENT_HEADER] = tp
+    return headers
+
+
+class ConsoleExporter:
+    """Спаны строками JSON в stdout (рядом с логами сервиса)."""
+
+    def export(self, spans: list[dict]) -> None:
+        sys.stdout.write("".join(json.dumps(s, ensure_ascii=False, default=str) + "\n" for s in spans))
+        sys.stdout.flush()
+
+
+class FileExporter:
+    """Спаны в файл JSON Lines; пачка дописывается одной записью, так что процессы не перемешивают строки."""
+
+    def __init__(self, path: str = TRACE_FILE):
+        self.path = path
+
+    def export(self, spans: list[dict]) -> None:
+        data = "".join(json.dumps(s, ensure_ascii=False, default=str) + "\n" for s in spans).encode("utf-8")
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+
+def make_exporter(spec: str):
+    """none / console / file / "пакет.модуль:фабрика" -> экспортёр (или None — трассы не выгружаются)."""
+    if spec in ("", "none"):
+        return None
+    if spec == "console":
+        return ConsoleExporter()
+    if spec == "file":
+        return FileExporter()
+    module, sep, attr = spec.partition(":")
+    if not sep:
+        raise ValueError(f"TRACE_EXPORTER: неизвестный экспортёр {spec!r}")
+    return getattr(importlib.import_module(module), attr)()
+
+
+class BatchProcessor:
+    """Очередь законченных спанов и поток, выгружающий их пачками; при переполнении спаны отбрасываются."""
+
+    def __init__(self, exporter):
+        self.exporter = exporter
+        self.dropped = 0
+        self._start()
+
+    def _start(self) -> None:
+        self._queue: queue.Queue = queue.Queue(TRACE_QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._run, name="trace-export", daemon=True)
+        self._thread.start()
+
+    def submit(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _export(self, batch: list) -> None:
+        try:
+            self.exporter.export([s.to_dict() for s in batch])
+        except Exception as e:
+            logger.warning("не удалось выгрузить %s спанов: %s", len(batch), e)
+
+    def _run(self) -> None:
+        while True:
+            batch = []
+            deadline = time.monotonic() + TRACE_EXPORT_INTERVAL
+            while len(batch) < TRACE_BATCH_SIZE:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._export(batch)
+                    return
+                batch.append(item)
+            if batch:
+                self._export(batch)
+
+    def shutdown(self) -> None:
+        try:
+            self._queue.put(None, timeout=1.0)
+        except queue.Full:
+            return
+        self._thread.join(timeout=5.0)
+        if hasattr(self.exporter, "shutdown"):
+            self.exporter.shutdown()
+
+
+def _after_fork() -> None:
+    # Поток выгрузки не переживает fork (пул парсера, воркеры gunicorn) — в дочернем процессе поднимаем свой
+    if _processor is not None:
+        _processor._start()
+
+
+def _log_context() -> dict:
+    s = _current.get()
+    return {"trace_id": s.trace_id, "span_id": s.span_id} if s is not None else {}
+
+
+def shutdown() -> None:
+    """Выгружает оставшиеся спаны; вызывается при выходе автоматически."""
+    global _processor
+    if _processor is not None:
+        _processor.shutdown()
+        _processor = None
+
+
+def setup(service: str, exporter=None) -> None:
+    """
+    Включает выгрузку спанов сервиса (экспортёр из TRACE_EXPORTER, если не передан явно)
+    и добавляет trace_id/span_id в записи логов. Повторный вызов ничего не делает.
+    """
+    global _service, _processor
+    if _service is not None:
+        return
+    _service = service
+    from common import jsonlog
+    jsonlog.add_context(_log_context)
+    exporter = exporter if exporter is not None else make_exporter(TRACE_EXPORTER)
+    if exporter is None:
+        return
+    _processor = BatchProcessor(exporter)
+    atexit.register(shutdown)
+    os.register_at_fork(after_in_child=_after_fork)
+    # Процессы multiprocessing (пул парсера) завершаются через os._exit, минуя atexit, — дописываем финализатором
+    mp_util.register_after_fork(_processor, lambda _: mp_util.Finalize(None, shutdown, exitpriority=0))
+
+
+class TracingMiddleware:
+    """ASGI-middleware: серверный спан на запрос, продолжающий трассу из traceparent вызывающего."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        parent = None
+        for key, value in scope.get("headers", []):
+            if key == b"traceparent":
+                parent = value.decode("latin-1")
+                break
+        status = {}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        with span(f"{scope['method']} {scope['path']}", kind="server", parent=parent, **{"http.method": scope["method"]}) as s:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                code = status.get("code", 500)
+                s.set(**{"http.status_code": code})
+                if code >= 500 and s.error is None:
+                    s.set_error(f"HTTP {code}")
+
+
+def instrument_sqlalchemy(engine) -> None:
+    """Спан на каждый SQL-запрос движка, выполненный внутри трассы (запросы вне запросов не трассируются)."""
+    from sqlalchemy import event
+
+    system = engine.dialect.name
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._trace_span = start_span(
+                "db.query", kind="client", require_parent=True,
+                **{"db.system": system, "db.statement": statement[:MAX_STATEMENT_LENGTH]},
+            )
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        s = getattr(context, "_trace_span", None)
+        if s is not None:
+            if cursor.rowcount is not None and cursor.rowcount >= 0:
+                s.set(**{"db.rowcount": cursor.rowcount})
+            finish(s)
+            context._trace_span = None
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        context = exception_context.execution_context
+        s = getattr(context, "_trace_span", None)
+        if s is not None:
+            finish(s, exception_context.original_exception)
+            context._trace_span = None
+
+
+def _print_tree(spans: list[dict], out=sys.stdout) -> None:
+    children: dict = {}
+    ids = {s["span_id"] for s in spans}
+    for s in sorted(spans, key=lambda s: s["start"]):
+        children.setdefault(s["parent_id"] if s["parent_id"] in ids else None, []).append(s)
+
+    def walk(parent, depth):
+        for s in children.get(parent, []):
+            mark = f"  ! {s['error']}" if s.get("error") else ""
+            out.write(f"{s['duration_ms']:>10.1f} ms  {'  ' * depth}{s['service']}: {s['name']}{mark}\n")
+            walk(s["span_id"], depth + 1)
+
+    walk(None, 0)
+
+
+def main(argv: list[str]) -> int:
+    if not argv:
+        print("usage: python -m common.tracing traces.jsonl [trace_id]", file=sys.stderr)
+        return 2
+    traces: dict = {}
+    with open(argv[0], encoding="utf-8") as f:
+        for line in f:
+            try:
+                s = json.loads(line)
+            except ValueError:
+                continue
+            if s.get("type") == "span":
+                traces.setdefault(s["trace_id"], []).append(s)
+    wanted = argv[1:] or list(traces)
+    for trace_id in wanted:
+        spans = traces.get(trace_id, [])
+        print(f"trace {trace_id} ({len(spans)} spans)")
+        _print_tree(spans)
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from 'react'
+import React, { useEffect, useRef, useState } from 'react'
 import axios from 'axios'
 import EditEventModal from './EditEventModal'
 import ErrorBoundary from './ErrorBoundary'
@@ -83,7 +83,10 @@ export default function Calendar() {
   const today = new Date()
   const [year, setYear] = useState(today.getFullYear())
   const [month, setMonth] = useState(today.getMonth())
-  const [events, setEvents] = useState({})
+  // Сводка по дням для сетки: {date: {total, counts: {type: n}, items: [мини-карточки]}}
+  const [cells, setCells] = useState({})
+  // Полные события открытого дня (грузятся только при открытии)
+  const [dayEvents, setDayEvents] = useState([])
 
   function formatTimeRange(t, end) {
     if (!t && !end) return ''
@@ -115,8 +118,40 @@ export default function Calendar() {
   const [editEvent, setEditEvent] = useState(null)
   const [adminToken, setAdminToken] = useState(localStorage.getItem('admin_token'))
   const [showHomework, setShowHomework] = useState(true)
+  // load() вызывается и из подписки SSE — актуальное значение переключателя берём из ref
+  const showHomeworkRef = useRef(showHomework)
+  showHomeworkRef.current = showHomework
 
-  useEffect(() => { load() }, [year, month])
+  useEffect(() => { load() }, [year, month, showHomework])
+  // load() вызывается и из подписки SSE, созданной при смене месяца, — открытый день берём из ref
+  const openDayRef = useRef(null)
+  useEffect(() => {
+    openDayRef.current = openDay
+    if (openDay) loadDay(openDay); else setDayEvents([])
+  }, [openDay])
+
+  // Живые обновления: backend присылает короткие сообщения об изменениях (SSE),
+  // месяц перечитываем, только если изменение его затронуло (в т.ч. правки других админов)
+  useEffect(() => {
+    if (typeof EventSource === 'undefined') return
+    const { first, last } = monthBounds(year, month)
+    const start = first.toISOString().slice(0,10)
+    const end = last.toISOString().slice(0,10)
+    const es = new EventSource(`${backendBase()}/events/stream`)
+    let timer = null
+    es.addEventListener('change', (e) => {
+      let msg = {}
+      try { msg = JSON.parse(e.data) } catch (err) { return }
+      const dates = msg.dates || []
+      const touched = msg.op === 'resync'
+        || dates.some(d => d >= start && d <= end)
+        || (msg.op !== 'update' && dates.length === 0)  // события без даты
+      if (!touched) return
+      clearTimeout(timer)
+      timer = setTimeout(() => load(), 300)
+    })
+    return () => { clearTimeout(timer); es.close() }
+  }, [year, month])
 
   useEffect(() => {
     function syncAdminToken() {
@@ -141,39 +176,22 @@ export default function Calendar() {
 
   // PDF parser removed — no external parser service used
 
-  async function load() {
+  async function load(refreshDay = true) {
     setLoading(true)
     setLoadError(null)
     try {
       const { first, last } = monthBounds(year, month)
       const start = first.toISOString().slice(0,10)
       const end = last.toISOString().slice(0,10)
-  const base = backendBase()
-  const url = (base || '') + `/calendar?start=${start}&end=${end}`
-  const res = await axios.get(url)
+      // Для сетки хватает сводки: число событий по типам и первые карточки дня (уже в порядке ячейки).
+      // Д/З отфильтровывает сервер, иначе скрытая домашка занимала бы места из 5 карточек дня
+      const exclude = showHomeworkRef.current ? '' : '&exclude_types=homework'
+      const res = await axios.get(`${backendBase()}/calendar/summary?start=${start}&end=${end}&granularity=day&titles=5${exclude}`)
       const map = {}
-      const und = []
-      for (const ev of res.data) {
-        if (!ev.date) { und.push(ev); continue }
-        if (!map[ev.date]) map[ev.date] = []
-        map[ev.date].push(ev)
-      }
-      // sort: контрольная/экзамен → домашка → остальное; внутри группы — по времени
-      for (const k of Object.keys(map)) {
-        map[k].sort((a,b) => {
-          const oa = calendarTypeOrder(a.type)
-          const ob = calendarTypeOrder(b.type)
-          if (oa !== ob) return oa - ob
-          const ta = a.time || ''
-          const tb = b.time || ''
-          if (!ta && !tb) return 0
-          if (!ta) return 1
-          if (!tb) return -1
-          return ta.localeCompare(tb)
-        })
-      }
-      setEvents(map)
-      setUndated(und)
+      for (const cell of res.data.buckets) map[cell.date] = cell
+      setCells(map)
+      setUndated(res.data.undated || [])
+      if (refreshDay && openDayRef.current) loadDay(openDayRef.current)
     } catch (e) {
       console.error(e)
       const msg = e.response?.data?.detail || e.message || String(e)
@@ -183,6 +201,30 @@ export default function Calendar() {
     }
   }
 
+  // Полные события одного дня — для панели дня
+  async function loadDay(day) {
+    try {
+      const res = await axios.get(`${backendBase()}/calendar?start=${day}&end=${day}`)
+      // sort: контрольная/экзамен → домашка → остальное; внутри группы — по времени
+      const list = res.data.filter(ev => ev.date === day).sort((a,b) => {
+        const oa = calendarTypeOrder(a.type)
+        const ob = calendarTypeOrder(b.type)
+        if (oa !== ob) return oa - ob
+        const ta = a.time || ''
+        const tb = b.time || ''
+        if (!ta && !tb) return 0
+        if (!ta) return 1
+        if (!tb) return -1
+        return ta.localeCompare(tb)
+      })
+      setDayEvents(list)
+      return list
+    } catch (e) {
+      console.error(e)
+      return null
+    }
+  }
+
   // Обработки PDF импорта удалены
 
   function prev() {
@@ -319,7 +361,9 @@ export default function Calendar() {
         {days.map((dt, idx) => {
           if (!dt) return <div key={idx} className="day empty"></div>
           const ds = dt.toISOString().slice(0,10)
-          const evs = (events[ds] || []).filter(ev => showHomework || ev.type !== 'homework')
+          const cell = cells[ds]
+          const evs = (cell?.items || []).filter(ev => showHomework || ev.type !== 'homework')
+          const total = cell ? cell.total - (showHomework ? 0 : (cell.counts.homework || 0)) : 0
           const todayIso = new Date().toISOString().slice(0,10)
           return (
             <div key={idx} className={"day" + (ds === todayIso ? ' today' : '')} onClick={() => { if (editing) setAddDate(ds); else setOpenDay(ds) }} style={{cursor:'pointer'}}>
@@ -353,7 +397,7 @@ export default function Calendar() {
                   )}
                 </div>
               ))}
-              {evs.length > 5 && <div style={{fontSize:12,color:'#6b7280'}}>+{evs.length-5} ещё</div>}
+              {total > Math.min(evs.length, 5) && <div style={{fontSize:12,color:'#6b7280'}}>+{total - Math.min(evs.length, 5)} ещё</div>}
             </div>
           )
         })}
@@ -373,8 +417,8 @@ export default function Calendar() {
                 </div>
             </div>
             <div style={{marginTop:8}}>
-              {(events[openDay] || []).length === 0 && <div>Событий нет.</div>}
-              {(events[openDay] || []).filter(ev => showHomework || ev.type !== 'homework').map(ev => (
+              {dayEvents.length === 0 && <div>Событий нет.</div>}
+              {dayEvents.filter(ev => showHomework || ev.type !== 'homework').map(ev => (
                 <div key={ev.id} style={{padding:8,borderBottom:'1px solid #eef2ff'}}>
                   <div style={{display:'flex',justifyContent:'space-between',alignItems:'center',gap:8}}>
                     <div style={{display:'flex',alignItems:'center',gap:8}}>
@@ -407,9 +451,9 @@ export default function Calendar() {
                         await axios.delete(`/events/${ev.id}`, { headers: { 'x-admin-token': adminToken } })
                         alert('Событие удалено')
                         // refresh calendar and close day view if no events remain
-                        await load()
-                        // if the day has no events afterwards, close the panel
-                        if (!((events[openDay] || []).length)) setOpenDay(null)
+                        load(false)
+                        const left = await loadDay(openDay)
+                        if (left && !left.length) setOpenDay(null)
                       } catch (e) {
                         console.error(e)
                         alert('Ошибка удаления: ' + (e.response?.data?.detail || e.message))
@@ -475,6 +519,8 @@ export default function Calendar() {
       if (!ev) return typeColor(ev?.type)
       const body = (ev.body || '').toString().toLowerCase()
       const title = (ev.title || '').toString().toLowerCase()
+      // карточки из сводки приходят без текста, признак переноса посчитан на backend
+      if (ev.transfer) return '#ef4444'
       // if body/title mention перенос — force transfer color
       if (body.includes('перенос') || title.includes('перенос') || body.includes('перенес')) return '#ef4444'
       return typeColor(ev.type)
@@ -1,15 +1,25 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, FileResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-import pdfplumber
-from io import BytesIO
-from utils import extract_images_from_page, simple_normalize_text, guess_type_from_text, extract_times, extract_date, ICON_DIR
-from typing import List, Dict, Any
+from icons import ICON_DIR, THUMB_SIZES, image_path, thumbnail_path
+from pipeline import ParseLimitError, parse_pdf, shutdown_pool
+from cache import ParseCache
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from common import jsonlog, tracing
+import jobs
+import metrics
+import logging
 import os
-import tempfile
+import asyncio
+import hashlib
+import json
+import weakref
+import time
 import uuid
-import shutil
 
+jsonlog.setup("parser")
+tracing.setup("parser")
+logger = logging.getLogger("parser")
 app = FastAPI(title="Парсер PDF М15")
 
 # Разрешаем CORS с фронтенда локальной разработки (и других) для загрузки из браузера
@@ -23,44 +33,259 @@ app.add_middleware(
 
 UPLOAD_DIR = os.getenv("PARSER_UPLOAD_DIR", "/tmp/parser_uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Максимальный размер PDF (по умолчанию 50 МБ) и размер блока при записи на диск
+MAX_UPLOAD_BYTES = int(os.getenv("PARSER_MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = int(os.getenv("PARSER_UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+# Запас на заголовки multipart при проверке Content-Length
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+# По спецификации заголовок %PDF должен встретиться в первых 1024 байтах
+PDF_MAGIC = b"%PDF-"
+# Пути, принимающие PDF: размер тела проверяется до разбора multipart
+UPLOAD_PATHS = {"/upload_pdf", "/jobs"}
 
-@app.post("/upload_pdf")
-async def upload_pdf(file: UploadFile = File(...)):
-    """Загружает и парсит PDF файл, возвращает предпросмотр событий."""
-    if not file.filename.lower().endswith(".pdf"):
-        raise HTTPException(status_code=400, detail="Допускаются только PDF файлы")
 
-    tmp_name = os.path.join(UPLOAD_DIR, f"{uuid.uuid4()}.pdf")
-    with open(tmp_name, "wb") as f:
-        content = await file.read()
-        f.write(content)
+class UploadTooLarge(HTTPException):
+    def __init__(self):
+        super().__init__(status_code=413, detail=f"PDF больше {MAX_UPLOAD_BYTES} байт")
+
+
+class UploadSizeGuard:
+    """
+    ASGI-middleware: отвечает 413 на слишком большую загрузку до того, как Starlette разберёт multipart
+    и сложит тело во временный файл. С Content-Length — сразу, не читая тела; без него (chunked) —
+    как только прочитанное тело превысит лимит (FastAPI отдаёт HTTPException из разбора формы как есть).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in UPLOAD_PATHS:
+            return await self.app(scope, receive, send)
+        limit = MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES
+        for key, value in scope.get("headers", []):
+            if key == b"content-length":
+                if value.isdigit() and int(value) > limit:
+                    exc = UploadTooLarge()
+                    metrics.observe_failure("upload", exc)
+                    response = JSONResponse({"detail": exc.detail}, status_code=exc.status_code)
+                    return await response(scope, receive, send)
+                break
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    exc = UploadTooLarge()
+                    metrics.observe_failure("upload", exc)
+                    raise exc
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+app.add_middleware(UploadSizeGuard)
+app.add_middleware(tracing.TracingMiddleware)
+app.add_middleware(jsonlog.CorrelationMiddleware)
+
+parse_cache = ParseCache()
+# Одновременные загрузки одного и того же файла разбираются один раз
+_parse_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
 
-    previews = []
+
+def _parse_lock(sha256: str) -> asyncio.Lock:
+    lock = _parse_locks.get(sha256)
+    if lock is None:
+        lock = asyncio.Lock()
+        _parse_locks[sha256] = lock
+    return lock
+
+
+async def save_upload(file: UploadFile, dest: str) -> tuple[int, str]:
+    """
+    Пишет загрузку на диск блоками по UPLOAD_CHUNK_BYTES, по пути считая sha256.
+    Проверяет сигнатуру %PDF по первому блоку и обрывает запись при превышении MAX_UPLOAD_BYTES.
+    Возвращает (размер, sha256); при ошибке частично записанный файл удаляется.
+    """
+    digest = hashlib.sha256()
+    size = 0
     try:
-        with pdfplumber.open(tmp_name) as pdf:
-            for pnum, page in enumerate(pdf.pages, start=1):
-                page_text = page.extract_text() or ""
-                norm_text = simple_normalize_text(page_text)
-                images = extract_images_from_page(page)
-
-                parts = [p.strip() for p in page_text.split('\n\n') if p.strip()]
-                for part in parts:
-                    txt = simple_normalize_text(part)
-                    if not txt:
-                        continue
-                    typ = guess_type_from_text(txt)
-                    start, end = extract_times(txt)
-                    date = extract_date(txt)
-                    previews.append({
-                        "page": pnum,
-                        "raw": txt,
-                        "type": typ,
-                        "start": start,
-                        "end": end,
-                        "date": date,
-                        "images": images
-                    })
+        with open(dest, "wb") as f:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                if size == 0 and PDF_MAGIC not in chunk[:1024]:
+                    raise HTTPException(status_code=400, detail="Файл не похож на PDF")
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=413, detail=f"PDF больше {MAX_UPLOAD_BYTES} байт")
+                digest.update(chunk)
+                f.write(chunk)
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Пустой файл")
+    except BaseException:
+        if os.path.exists(dest):
+            os.remove(dest)
+        raise
+    return size, digest.hexdigest()
+
+
+@app.on_event("shutdown")
+def shutdown():
+    shutdown_pool()
+
+
+async def receive_upload(file: UploadFile) -> tuple[str, int, str, float]:
+    """
+    Проверяет загрузку и пишет её во временный файл; возвращает (путь, размер, sha256, секунд на запись).
+    Слишком большое тело целиком отсекает ещё UploadSizeGuard, здесь — лимит на сам файл.
+    """
+    started = time.perf_counter()
+    try:
+        if not file.filename.lower().endswith(".pdf"):
+            raise HTTPException(status_code=400, detail="Допускаются только PDF файлы")
+
+        tmp_name = os.path.join(UPLOAD_DIR, f"{uuid.uuid4()}.pdf")
+        with tracing.span("parser.upload") as s:
+            size, sha256 = await save_upload(file, tmp_name)
+            s.set(size=size)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"ошибка при парсинге pdf: {e}")
+        metrics.observe_failure("upload", e)
+        raise
+    elapsed = time.perf_counter() - started
+    metrics.STAGE_SECONDS.labels(stage="upload").observe(elapsed)
+    metrics.PROCESSED_BYTES_TOTAL.inc(size)
+    return tmp_name, size, sha256, elapsed
+
+
+@app.get("/metrics")
+def get_metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.post("/upload_pdf")
+async def upload_pdf(file: UploadFile = File(...), profile: bool = False):
+    """
+    Загружает и парсит PDF файл, возвращает предпросмотр событий.
+    С ?profile=1 в ответе есть profile: время по стадиям (всего и по страницам) и общее время запроса.
+    """
+    accepted = time.perf_counter()
+    tmp_name, size, sha256, upload_seconds = await receive_upload(file)
+    stages, timings = {"upload": upload_seconds}, []
+
+    loop = asyncio.get_running_loop()
+    async with _parse_lock(sha256):
+        # Чтение превью и перенос загрузки в кэш — файловый ввод-вывод, не на event loop
+        cached = await loop.run_in_executor(None, parse_cache.get, sha256)
+        if cached is not None:
+            await loop.run_in_executor(None, os.remove, tmp_name)
+            metrics.UPLOADS_TOTAL.labels(result="cached").inc()
+            body = {**cached, "icons_dir": ICON_DIR, "sha256": sha256, "size": size, "cached": True}
+            if profile:
+                body["profile"] = metrics.profile(stages, timings, time.perf_counter() - accepted)
+            return JSONResponse(body)
+
+        # Пока файл разбирают процессы пула, вытеснение кэша (в т.ч. из put соседнего запроса) его не тронет
+        with parse_cache.pinned(sha256):
+            pdf_path = await loop.run_in_executor(None, parse_cache.adopt_upload, tmp_name, sha256)
+            try:
+                # Страницы разбираются в пуле процессов, event loop остаётся свободным
+                with metrics.IN_FLIGHT.track_inprogress():
+                    previews, images, timings = await parse_pdf(pdf_path)
+            except ParseLimitError as e:
+                metrics.observe_failure("parse", e)
+                raise HTTPException(status_code=413, detail=str(e))
+            except Exception as e:
+                metrics.observe_failure("parse", e)
+                logger.exception("ошибка при парсинге pdf", extra={"sha256": sha256})
+                raise HTTPException(status_code=500, detail=f"ошибка при парсинге pdf: {e}")
+            parse_stages = metrics.sum_stages(timings)
+            started = time.perf_counter()
+            with tracing.span("parser.cache"):
+                await loop.run_in_executor(None, parse_cache.put, sha256, previews, images)
+            parse_stages["cache"] = time.perf_counter() - started
+        stages.update(parse_stages)
+
+    wall_seconds = time.perf_counter() - accepted
+    metrics.observe_parse("sync", parse_stages, wall_seconds, len(timings), len(previews))
+    metrics.UPLOADS_TOTAL.labels(result="parsed").inc()
+    body = {
+        "preview": previews, "images": images, "icons_dir": ICON_DIR, "sha256": sha256, "size": size, "cached": False,
+    }
+    if profile:
+        body["profile"] = metrics.profile(stages, timings, wall_seconds)
+    return JSONResponse(body)
+
+
+@app.get("/icons/{sha256}")
+async def get_icon(sha256: str):
+    """Картинка из PDF по хэшу (ссылки на неё — в поле images предпросмотра)."""
+    path = image_path(sha256)
+    if path is None:
+        raise HTTPException(status_code=404, detail="изображение не найдено")
+    return FileResponse(path, headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+
+@app.get("/icons/{sha256}/thumb")
+async def get_icon_thumb(sha256: str, size: int = 128):
+    """Миниатюра картинки; создаётся при первом запросе."""
+    if size not in THUMB_SIZES:
+        raise HTTPException(status_code=400, detail=f"размер миниатюры: один из {list(THUMB_SIZES)}")
+    path = await asyncio.get_running_loop().run_in_executor(None, thumbnail_path, sha256, size)
+    if path is None:
+        raise HTTPException(status_code=404, detail="изображение не найдено")
+    return FileResponse(path, media_type="image/png", headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+
+@app.post("/jobs", status_code=202)
+async def create_job(file: UploadFile = File(...)):
+    """Принимает PDF и сразу возвращает id задания; разбор идёт в фоне."""
+    if jobs.queued_count() >= jobs.MAX_QUEUED_JOBS:
+        raise HTTPException(status_code=503, detail="Очередь разбора заполнена, повторите позже", headers={"Retry-After": "5"})
+    tmp_name, size, sha256, _ = await receive_upload(file)
+    with parse_cache.pinned(sha256):
+        pdf_path = await asyncio.get_running_loop().run_in_executor(None, parse_cache.adopt_upload, tmp_name, sha256)
+        job = jobs.submit(pdf_path, sha256, size, parse_cache)
+    return job.progress()
+
+
+def _get_job(job_id: str) -> "jobs.ParseJob":
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="задание не найдено")
+    return job
+
+
+@app.get("/jobs/{job_id}")
+async def job_progress(job_id: str):
+    """Статус и прогресс задания: сколько страниц разобрано из скольких."""
+    return _get_job(job_id).progress()
+
+
+@app.get("/jobs/{job_id}/results")
+async def job_results(job_id: str):
+    """
+    Результаты задания в NDJSON: строка {page, pages_total, preview} на каждую страницу, как только
+    она готова (в порядке страниц), последняя строка — итоговый статус задания.
+    """
+    job = _get_job(job_id)
+
+    async def gen():
+        async for item in job.stream():
+            yield json.dumps(item, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(gen(), media_type="application/x-ndjson")
+
 
-    return JSONResponse({"preview": previews, "icons_dir": ICON_DIR})
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Отменяет задание; уже разобранные страницы остаются доступны в результатах."""
+    job = jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="задание не найдено")
+    return job.progress()
@@ -0,0 +1,118 @@
+"""
+Точность и скорость классификатора фрагментов на образцах из parser/uploads.
+
+    python bench/classifier_bench.py            # сверка с golden.json + замер скорости
+    python bench/classifier_bench.py --update   # пересобрать golden.json из PDF (после осознанной правки)
+
+Корпус хранится в golden.json, поэтому сверка не требует повторного разбора PDF. Два вида записей:
+  label "manual"   — размечены вручную (типы занятий, даты, ловушки вроде «Семенов»); точность
+                     классификатора считается только по ним, при --update сохраняются как есть;
+  label "snapshot" — тексты ячеек/фрагментов уникальных (по sha256) PDF из uploads с тем, что выдал
+                     classify() при --update. Это не эталон, а снимок для ловли регрессий: расхождение
+                     значит, что поведение изменилось, а не что классификатор ошибся.
+Код возврата 1, если хоть одно поле разошлось с разметкой или снимком.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+
+PARSER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PARSER_DIR)
+
+from classifier import classify  # noqa: E402
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden.json")
+UPLOADS_DIR = os.path.join(PARSER_DIR, "uploads")
+
+
+def build_corpus() -> list:
+    """Фрагменты из всех уникальных PDF образцов (битые файлы пропускаются)."""
+    from pipeline import count_pages, parse_page_range
+
+    corpus, seen = [], set()
+    for path in sorted(glob.glob(os.path.join(UPLOADS_DIR, "*.pdf"))):
+        with open(path, "rb") as f:
+            sha256 = hashlib.sha256(f.read()).hexdigest()
+        if sha256 in seen:
+            continue
+        seen.add(sha256)
+        try:
+            pages = parse_page_range(path, 1, count_pages(path))
+        except Exception as e:
+            print(f"пропущен {os.path.basename(path)}: {e}")
+            continue
+        for pnum, previews, _, _ in pages:
+            for preview in previews:
+                corpus.append({"source": sha256[:12], "label": "snapshot", "page": pnum, "text": preview["raw"]})
+    return corpus
+
+
+def update_golden() -> None:
+    manual = []
+    if os.path.exists(GOLDEN_PATH):
+        with open(GOLDEN_PATH, encoding="utf-8") as f:
+            manual = [item for item in json.load(f) if item["label"] == "manual"]
+    corpus = build_corpus()
+    for item in corpus:
+        item["expected"] = classify(item["text"])
+    with open(GOLDEN_PATH, "w", encoding="utf-8") as f:
+        json.dump(manual + corpus, f, ensure_ascii=False, indent=1)
+    print(f"golden.json: {len(manual)} размеченных вручную + {len(corpus)} снимков из PDF")
+
+
+def check_golden(golden: list) -> int:
+    """Печатает точность по ручной разметке и регрессии по снимкам; возвращает число расхождений."""
+    fields = list(golden[0]["expected"]) if golden else []
+    mismatches = 0
+    for label, title in (("manual", "точность (разметка вручную)"), ("snapshot", "совпадение со снимком (регрессии)")):
+        items = [item for item in golden if item["label"] == label]
+        matched = {f: 0 for f in fields}
+        for item in items:
+            got = classify(item["text"])
+            for f in fields:
+                if got.get(f) == item["expected"].get(f):
+                    matched[f] += 1
+                else:
+                    mismatches += 1
+                    print(f"[{label} {item['source']} p{item['page']}] {f}: ожидалось {item['expected'].get(f)!r}, получено {got.get(f)!r}")
+                    print(f"    {item['text'][:120]}")
+        print(f"{title}, {len(items)} записей:")
+        for f in fields:
+            print(f"  {f:12s} {matched[f]}/{len(items)}")
+    return mismatches
+
+
+def throughput(golden: list, repeat: int) -> None:
+    texts = [item["text"] for item in golden]
+    total_chars = sum(len(t) for t in texts)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            classify(text)
+    elapsed = time.perf_counter() - started
+    count = len(texts) * repeat
+    print(f"{count} фрагментов за {elapsed:.3f} с: {count / elapsed:,.0f} фрагм/с, "
+          f"{elapsed / count * 1e6:.1f} мкс/фрагм, {total_chars * repeat / elapsed / 1e6:.1f} млн симв/с")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--update", action="store_true", help="пересобрать golden.json из PDF образцов")
+    ap.add_argument("--repeat", type=int, default=500, help="сколько раз прогнать корпус при замере скорости")
+    args = ap.parse_args()
+    if args.update:
+        update_golden()
+        return 0
+    with open(GOLDEN_PATH, encoding="utf-8") as f:
+        golden = json.load(f)
+    mismatches = check_golden(golden)
+    throughput(golden, args.repeat)
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""
+Память разбора длинного PDF: синтетический документ из N страниц (по умолчанию 500) с таблицей
+расписания и картинкой-«сканом» на каждой странице разбирается в одном процессе, как в процессе пула.
+
+    python bench/memory_bench.py                       # 500 страниц, пик RSS не выше 150 МБ
+    python bench/memory_bench.py --pages 2000 --max-rss-mb 400
+    python bench/memory_bench.py --json                # одна строка JSON с замерами (для tests/test_memory.py)
+
+Код возврата 1, если пиковый RSS превысил порог или какая-то страница разобрана без событий.
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import zlib
+
+PARSER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PARSER_DIR)
+sys.path.insert(1, os.path.dirname(PARSER_DIR))  # common/
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
+SLOTS = ["08:30-10:00", "10:10-11:40", "12:10-13:40", "13:50-15:20"]
+PAGE_W, PAGE_H = 842, 595
+SCAN_SIDE = 256
+
+
+def _page_content(pnum: int) -> bytes:
+    """Таблица 5×5 (столбец времени + 4 группы) с заголовком дня и занятиями, плюс картинка в углу."""
+    ops = ["0.5 w"]
+    left, top, col_w, row_h = 40, 60, 150, 80
+    rows = len(SLOTS) + 1
+    for r in range(rows):
+        for c in range(5):
+            ops.append(f"{left + c * col_w} {PAGE_H - top - (r + 1) * row_h} {col_w} {row_h} re S")
+    text = [(left + col_w + 5, top + row_h / 2, DAYS[pnum % len(DAYS)])]
+    for r, slot in enumerate(SLOTS, start=1):
+        y = top + r * row_h + row_h / 2
+        text.append((left + 5, y, slot))
+        for c in range(1, 5):
+            text.append((left + c * col_w + 5, y, f"Lecture {pnum}-{r}-{c}; aud. {100 + c}"))
+    for x, y, s in text:
+        ops.append(f"BT /F1 9 Tf {x} {PAGE_H - y} Td ({s}) Tj ET")
+    ops.append(f"q 96 0 0 96 {PAGE_W - 120} {PAGE_H - 130} cm /Im1 Do Q")
+    return "\n".join(ops).encode()
+
+
+def _scan(pnum: int) -> bytes:
+    """Серая картинка, своя на каждой странице (как скан), сжатая Flate."""
+    rows = (bytes((x * pnum + y) % 256 for x in range(SCAN_SIDE)) for y in range(SCAN_SIDE))
+    return zlib.compress(b"".join(rows))
+
+
+def write_synthetic_pdf(path: str, pages: int) -> None:
+    objects: list[bytes] = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    def stream(dictionary: str, data: bytes) -> bytes:
+        return f"<< {dictionary} /Length {len(data)} >>\nstream\n".encode() + data + b"\nendstream"
+
+    catalog = add(b"")
+    pages_id = add(b"")
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    kids = []
+    for pnum in range(1, pages + 1):
+        content = add(stream("/Filter /FlateDecode", zlib.compress(_page_content(pnum))))
+        image = add(stream(
+            f"/Type /XObject /Subtype /Image /Width {SCAN_SIDE} /Height {SCAN_SIDE} "
+            "/ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /FlateDecode", _scan(pnum),
+        ))
+        kids.append(add(
+            f"<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 {PAGE_W} {PAGE_H}] /Contents {content} 0 R "
+            f"/Resources << /Font << /F1 {font} 0 R >> /XObject << /Im1 {image} 0 R >> >> >>".encode()
+        ))
+    objects[catalog - 1] = f"<< /Type /Catalog /Pages {pages_id} 0 R >>".encode()
+    objects[pages_id - 1] = f"<< /Type /Pages /Kids [{' '.join(f'{k} 0 R' for k in kids)}] /Count {pages} >>".encode()
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for num, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(f"{num} 0 obj\n".encode() + body + b"\nendobj\n")
+        xref = f.tell()
+        f.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+        for offset in offsets:
+            f.write(f"{offset:010d} 00000 n \n".encode())
+        f.write(f"trailer\n<< /Size {len(objects) + 1} /Root {catalog} 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+
+
+def measure(pages: int) -> dict:
+    """Разбирает синтетический PDF из pages страниц в текущем процессе; пиковый RSS — за весь процесс."""
+    with tempfile.TemporaryDirectory() as tmp:
+        # Картинки пишутся во временное хранилище, а не в рабочее; ограничения разбора здесь не мешают замеру
+        os.environ["PARSER_ICON_DIR"] = os.path.join(tmp, "icons")
+        os.environ["PARSER_MAX_PAGES"] = "0"
+        os.environ["PARSER_MAX_RSS_BYTES"] = "0"
+        from pipeline import count_pages, parse_page_range
+
+        path = os.path.join(tmp, "synthetic.pdf")
+        write_synthetic_pdf(path, pages)
+        pdf_kb = os.path.getsize(path) // 1024
+
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+        started = time.perf_counter()
+        parsed = parse_page_range(path, 1, count_pages(path))
+        elapsed = time.perf_counter() - started
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+
+    return {
+        "pages": len(parsed),
+        "events": sum(len(previews) for _, previews, _, _ in parsed),
+        "empty_pages": [pnum for pnum, previews, _, _ in parsed if not previews],
+        "seconds": round(elapsed, 3),
+        "pdf_kb": pdf_kb,
+        "rss_before_mb": before,
+        "peak_rss_mb": peak,
+    }
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--pages", type=int, default=500)
+    ap.add_argument("--max-rss-mb", type=int, default=150, help="порог пикового RSS процесса, МБ")
+    ap.add_argument("--json", action="store_true", help="вывести замеры одной строкой JSON")
+    args = ap.parse_args()
+
+    result = measure(args.pages)
+    empty = result["empty_pages"]
+    if args.json:
+        print(json.dumps(result))
+    else:
+        print(f"PDF: {args.pages} страниц, {result['pdf_kb']} КБ")
+        print(f"{result['pages']} страниц, {result['events']} событий за {result['seconds']:.1f} с "
+              f"({result['pages'] / result['seconds']:.1f} стр/с)")
+        print(f"пиковый RSS: {result['peak_rss_mb']} МБ (до разбора {result['rss_before_mb']} МБ, порог {args.max_rss_mb} МБ)")
+        if empty:
+            print(f"страницы без событий: {empty[:10]}{'...' if len(empty) > 10 else ''}")
+    return 1 if result["peak_rss_mb"] > args.max_rss_mb or empty or result["pages"] != args.pages else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""
+Кэш загрузок и результатов разбора по содержимому (sha256).
+
+PDF хранится один раз как <sha256>.pdf, предпросмотр — рядом как <sha256>.json.
+Повторная загрузка того же файла сразу отдаёт сохранённый предпросмотр.
+Старые записи вытесняются по TTL, затем по давности использования (LRU, mtime),
+пока общий размер не уложится в лимит. Записи, чей PDF сейчас разбирается (pin), не вытесняются.
+"""
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+CACHE_DIR = os.getenv("PARSER_CACHE_DIR", "/tmp/parser_cache")
+# Сколько хранить запись с последнего использования (по умолчанию неделя) и общий лимит размера
+CACHE_TTL_SECONDS = int(os.getenv("PARSER_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+CACHE_MAX_BYTES = int(os.getenv("PARSER_CACHE_MAX_BYTES", str(500 * 1024 * 1024)))
+# Меняется при изменении логики разбора: записи старой версии считаются промахом
+CACHE_VERSION = 4
+
+
+class ParseCache:
+    def __init__(self, directory: str = CACHE_DIR, ttl_seconds: int = CACHE_TTL_SECONDS,
+                 max_bytes: int = CACHE_MAX_BYTES):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # sha256 -> сколько разборов сейчас читают <sha256>.pdf
+        self._pins: Counter = Counter()
+        os.makedirs(directory, exist_ok=True)
+
+    def pin(self, sha256: str) -> None:
+        """Защищает запись от вытеснения, пока её PDF читают разбор или процессы пула; снять — unpin."""
+        with self._lock:
+            self._pins[sha256] += 1
+
+    def unpin(self, sha256: str) -> None:
+        with self._lock:
+            self._pins[sha256] -= 1
+            if self._pins[sha256] <= 0:
+                del self._pins[sha256]
+
+    @contextmanager
+    def pinned(self, sha256: str):
+        self.pin(sha256)
+        try:
+            yield
+        finally:
+            self.unpin(sha256)
+
+    def pdf_path(self, sha256: str) -> str:
+        return os.path.join(self.directory, f"{sha256}.pdf")
+
+    def _json_path(self, sha256: str) -> str:
+        return os.path.join(self.directory, f"{sha256}.json")
+
+    def get(self, sha256: str) -> dict | None:
+        """Сохранённый результат {preview, images} или None; попадание продлевает жизнь записи (LRU)."""
+        path = self._json_path(sha256)
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != CACHE_VERSION:
+            return None
+        now = time.time()
+        for p in (path, self.pdf_path(sha256)):
+            try:
+                os.utime(p, (now, now))
+            except OSError:
+                pass
+        return {"preview": data.get("preview") or [], "images": data.get("images") or {}}
+
+    def adopt_upload(self, tmp_path: str, sha256: str) -> str:
+        """Переносит загруженный файл под имя по хэшу; дубликат просто удаляется. Возвращает путь."""
+        dest = self.pdf_path(sha256)
+        if os.path.exists(dest):
+            os.remove(tmp_path)
+            os.utime(dest)
+        else:
+            os.replace(tmp_path, dest)
+        return dest
+
+    def put(self, sha256: str, preview: list, images: dict) -> None:
+        """Атомарно сохраняет предпросмотр с картинками и вытесняет лишнее."""
+        path = self._json_path(sha256)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": CACHE_VERSION, "preview": preview, "images": images}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        self.evict()
+
+    def evict(self) -> int:
+        """
+        Удаляет записи старше TTL, затем самые давно использованные сверх лимита. Возвращает число удалённых.
+        Закреплённые (pin) записи пропускаются: их размер учитывается, но удаляются следующие по очереди.
+        """
+        with self._lock:
+            entries: dict[str, dict] = {}
+            for name in os.listdir(self.directory):
+                sha256, ext = os.path.splitext(name)
+                if ext not in (".pdf", ".json"):
+                    continue
+                try:
+                    st = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                entry = entries.setdefault(sha256, {"size": 0, "used": 0.0})
+                entry["size"] += st.st_size
+                entry["used"] = max(entry["used"], st.st_mtime)
+
+            cutoff = time.time() - self.ttl_seconds
+            total = sum(e["size"] for e in entries.values())
+            removed = 0
+            for sha256, entry in sorted(entries.items(), key=lambda kv: kv[1]["used"]):
+                if entry["used"] >= cutoff and total <= self.max_bytes:
+                    break
+                if sha256 in self._pins:
+                    continue
+                for p in (self.pdf_path(sha256), self._json_path(sha256)):
+                    try:
+                        os.remove(p)
+                    except OSError:
+                        pass
+                total -= entry["size"]
+                removed += 1
+            return removed
@@ -0,0 +1,71 @@
+"""
+Классификатор фрагментов текста расписания за один проход.
+
+Одно скомпилированное регулярное выражение с именованными альтернативами проходит фрагмент
+один раз и находит время занятия, дату, аудиторию, преподавателя и ключевые слова типа занятия.
+Поля возвращаются типизированными: дата в ISO (YYYY-MM-DD), время в HH:MM.
+"""
+import re
+from datetime import date
+
+_TOKEN_RE = re.compile(
+    r'(?P<time>\b(?P<h1>\d{1,2})[:.](?P<m1>\d{2})\s*[–—-]\s*(?P<h2>\d{1,2})[:.](?P<m2>\d{2})\b)'
+    r'|(?P<date>\b(?P<d>\d{1,2})[.\-/](?P<mo>\d{1,2})[.\-/](?P<y>\d{4}|\d{2})\b)'
+    r'|(?P<room>\bауд(?:итория)?\.?\s*(?P<room_no>[0-9]+[а-яёa-z]?|[а-яёa-z]?[0-9]+)(?![0-9]))'
+    r'|(?P<teacher>\b[А-ЯЁ]\.\s?[А-ЯЁ]\.\s?[А-ЯЁ][а-яё]+(?:-[А-ЯЁ][а-яё]+)?)'
+    r'|(?P<lecture>\bлек(?:ц[а-яё]*|\.|\b))'
+    r'|(?P<seminar>\bсем(?:инар[а-яё]*|\.|\b))'
+    r'|(?P<practice>\b(?:практи[а-яё]*|лаб(?:оратор[а-яё]*|\.|\b)))',
+    re.IGNORECASE,
+)
+# При нескольких ключевых словах побеждает первое по списку (как и раньше: лекция > семинар > практика)
+_TYPE_PRIORITY = ("lecture", "seminar", "practice")
+
+
+def _iso_date(d: str, mo: str, y: str) -> str | None:
+    year = int(y)
+    if year < 100:
+        year += 2000
+    try:
+        return date(year, int(mo), int(d)).isoformat()
+    except ValueError:
+        return None
+
+
+def _hhmm(h: str, m: str) -> str | None:
+    if int(h) > 23 or int(m) > 59:
+        return None
+    return f"{int(h):02d}:{m}"
+
+
+def classify(text: str) -> dict:
+    """
+    Типизированные поля фрагмента:
+    {lesson_type, start, end, date, room, teacher}; отсутствующие — None (lesson_type — "unknown").
+    Берётся первое время, первая корректная дата, первая аудитория и первый преподаватель.
+    """
+    result = {"lesson_type": "unknown", "start": None, "end": None, "date": None, "room": None, "teacher": None}
+    types = set()
+    for m in _TOKEN_RE.finditer(text):
+        kind = m.lastgroup
+        if kind == "time":
+            if result["start"] is None:
+                start, end = _hhmm(m["h1"], m["m1"]), _hhmm(m["h2"], m["m2"])
+                if start and end:
+                    result["start"], result["end"] = start, end
+        elif kind == "date":
+            if result["date"] is None:
+                result["date"] = _iso_date(m["d"], m["mo"], m["y"])
+        elif kind == "room":
+            if result["room"] is None:
+                result["room"] = m["room_no"]
+        elif kind == "teacher":
+            if result["teacher"] is None:
+                result["teacher"] = m["teacher"]
+        else:
+            types.add(kind)
+    for t in _TYPE_PRIORITY:
+        if t in types:
+            result["lesson_type"] = t
+            break
+    return result
@@ -0,0 +1,114 @@
+"""
+Хранилище картинок из PDF по содержимому (sha256).
+
+Каждая уникальная картинка пишется в ICON_DIR один раз как <sha256>.<ext>: одинаковые логотипы
+с разных страниц и из разных загрузок занимают на диске одно место. Предпросмотр ссылается
+на картинки по хэшу, а миниатюры делаются при первом запросе и тоже кэшируются на диске.
+"""
+import glob
+import hashlib
+import io
+import os
+import re
+
+from pdfminer.pdftypes import resolve1
+from PIL import Image
+
+ICON_DIR = os.getenv("PARSER_ICON_DIR", "/app/icons")
+os.makedirs(ICON_DIR, exist_ok=True)
+
+# Допустимые размеры миниатюр (сторона в px): ограничивают число файлов на одну картинку
+THUMB_SIZES = (64, 128, 256)
+HASH_RE = re.compile(r'^[0-9a-f]{64}$')
+_MODES = {"DeviceRGB": "RGB", "DeviceGray": "L", "DeviceCMYK": "CMYK"}
+
+
+def _name(obj) -> str | None:
+    obj = resolve1(obj)
+    if isinstance(obj, list) and obj:
+        obj = resolve1(obj[0])
+    return getattr(obj, "name", None)
+
+
+def _encode(img: dict) -> tuple[bytes, str] | None:
+    """Картинка в виде файла: (байты, расширение) или None, если формат не поддерживается."""
+    stream = img["stream"]
+    filters = [_name(f) for f, _ in stream.get_filters()]
+    if "DCTDecode" in filters:
+        return stream.get_rawdata(), "jpg"
+    if "JPXDecode" in filters:
+        return stream.get_rawdata(), "jp2"
+    if any(f in ("CCITTFaxDecode", "JBIG2Decode") for f in filters):
+        return None
+    width, height = img["srcsize"]
+    colorspace = _name(img.get("colorspace"))
+    bits = img.get("bits")
+    if bits == 1 and colorspace == "DeviceGray":
+        mode = "1"
+    elif bits == 8 and colorspace in _MODES:
+        mode = _MODES[colorspace]
+    else:
+        return None
+    try:
+        image = Image.frombytes(mode, (int(width), int(height)), stream.get_data())
+    except (ValueError, TypeError):
+        return None
+    if mode == "CMYK":
+        image = image.convert("RGB")
+    buf = io.BytesIO()
+    image.save(buf, format="PNG")
+    return buf.getvalue(), "png"
+
+
+def _write_once(path: str, data: bytes) -> None:
+    """Пишет файл, только если его ещё нет (атомарно: разборщики в разных процессах не мешают друг другу)."""
+    if os.path.exists(path):
+        return
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def store_image(img: dict) -> dict | None:
+    """Сохраняет картинку страницы pdfplumber в хранилище; возвращает {hash, format, width, height}."""
+    raw = img["stream"].get_rawdata()
+    if not raw:
+        return None
+    sha256 = hashlib.sha256(raw).hexdigest()
+    existing = glob.glob(os.path.join(ICON_DIR, f"{sha256}.*"))
+    existing = [p for p in existing if ".thumb" not in p and not p.endswith(".tmp")]
+    if existing:
+        ext = existing[0].rsplit(".", 1)[1]
+    else:
+        encoded = _encode(img)
+        if encoded is None:
+            return None
+        data, ext = encoded
+        _write_once(os.path.join(ICON_DIR, f"{sha256}.{ext}"), data)
+    width, height = img["srcsize"]
+    return {"hash": sha256, "format": ext, "width": int(width), "height": int(height)}
+
+
+def image_path(sha256: str) -> str | None:
+    if not HASH_RE.match(sha256):
+        return None
+    for path in glob.glob(os.path.join(ICON_DIR, f"{sha256}.*")):
+        if ".thumb" not in path and not path.endswith(".tmp"):
+            return path
+    return None
+
+
+def thumbnail_path(sha256: str, size: int) -> str | None:
+    """Миниатюра PNG со стороной не больше size; создаётся при первом запросе."""
+    source = image_path(sha256)
+    if source is None or size not in THUMB_SIZES:
+        return None
+    path = os.path.join(ICON_DIR, f"{sha256}.thumb{size}.png")
+    if not os.path.exists(path):
+        with Image.open(source) as image:
+            image.thumbnail((size, size))
+            buf = io.BytesIO()
+            image.save(buf, format="PNG")
+        _write_once(path, buf.getvalue())
+    return path
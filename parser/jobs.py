@@ -0,0 +1,176 @@
+"""
+Фоновые задания разбора PDF.
+
+POST /jobs сразу возвращает id задания, разбор идёт в фоне (не больше PARSER_MAX_JOBS заданий
+одновременно, остальные ждут в очереди). Готовые страницы копятся в задании по порядку,
+и /jobs/{id}/results отдаёт их построчно (NDJSON), не дожидаясь конца разбора.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+
+import metrics
+from common import tracing
+from pipeline import iter_pages, merge_images
+
+logger = logging.getLogger(__name__)
+
+# Сколько заданий разбирается одновременно и сколько может ждать в очереди
+MAX_JOBS = int(os.getenv("PARSER_MAX_JOBS", "2"))
+MAX_QUEUED_JOBS = int(os.getenv("PARSER_MAX_QUEUED_JOBS", "20"))
+# Сколько хранить завершённое задание (результаты можно перечитать)
+JOB_TTL_SECONDS = int(os.getenv("PARSER_JOB_TTL_SECONDS", "3600"))
+# Задание отдаёт страницы по одной: первая готова, не дожидаясь соседних
+JOB_PAGES_PER_TASK = int(os.getenv("PARSER_JOB_PAGES_PER_TASK", "1"))
+
+FINISHED = ("done", "failed", "cancelled")
+
+
+@dataclass
+class ParseJob:
+    id: str
+    sha256: str
+    path: str
+    size: int
+    status: str = "queued"                          # queued / running / done / failed / cancelled
+    pages_total: int | None = None
+    pages: list = field(default_factory=list)       # [(номер страницы, предпросмотр, картинки)] по порядку
+    error: str | None = None
+    cached: bool = False
+    created_at: float = field(default_factory=time.time)
+    finished_at: float | None = None
+    task: asyncio.Task | None = None
+    _changed: asyncio.Event = field(default_factory=asyncio.Event)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def progress(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "sha256": self.sha256,
+            "pages_done": len(self.pages),
+            "pages_total": self.pages_total,
+            "events": sum(len(p) for _, p, _ in self.pages),
+            "cached": self.cached,
+            "error": self.error,
+        }
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def stream(self):
+        """Строки NDJSON-результата: по одной на страницу, в конце — итоговый статус."""
+        sent = 0
+        while True:
+            changed = self._changed
+            while sent < len(self.pages):
+                pnum, previews, images = self.pages[sent]
+                yield {"page": pnum, "pages_total": self.pages_total, "preview": previews, "images": images}
+                sent += 1
+            if self.finished:
+                yield self.progress()
+                return
+            await changed.wait()
+
+
+_jobs: dict[str, ParseJob] = {}
+_semaphore: asyncio.Semaphore | None = None
+
+
+def _prune() -> None:
+    cutoff = time.time() - JOB_TTL_SECONDS
+    for job_id in [j.id for j in _jobs.values() if j.finished and j.finished_at < cutoff]:
+        del _jobs[job_id]
+
+
+def queued_count() -> int:
+    return sum(1 for j in _jobs.values() if j.status == "queued")
+
+
+def get(job_id: str) -> ParseJob | None:
+    return _jobs.get(job_id)
+
+
+def submit(path: str, sha256: str, size: int, cache) -> ParseJob:
+    """
+    Создаёт задание и запускает его в фоне; повтор уже разобранного файла сразу готов из кэша.
+    Файл закреплён в кэше (cache.pin), пока задание не завершится, в том числе отменой до старта.
+    """
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(MAX_JOBS)
+    _prune()
+    job = ParseJob(id=uuid.uuid4().hex, sha256=sha256, path=path, size=size)
+    _jobs[job.id] = job
+    cache.pin(sha256)
+    job.task = asyncio.get_running_loop().create_task(_run(job, cache))
+    job.task.add_done_callback(lambda _: cache.unpin(sha256))
+    return job
+
+
+def cancel(job_id: str) -> ParseJob | None:
+    job = _jobs.get(job_id)
+    if job is not None and not job.finished and job.task is not None:
+        job.task.cancel()
+    return job
+
+
+def _finish(job: ParseJob, status: str, error: str | None = None) -> None:
+    job.status = status
+    job.error = error
+    job.finished_at = time.time()
+    job._notify()
+
+
+async def _run(job: ParseJob, cache) -> None:
+    try:
+        cached = await asyncio.get_running_loop().run_in_executor(None, cache.get, job.sha256)
+        if cached is not None:
+            by_page: dict[int, tuple] = {}
+            for preview in cached["preview"]:
+                by_page.setdefault(preview.get("page"), ([], {}))[0].append(preview)
+            for sha256, meta in cached["images"].items():
+                for pnum in meta.get("pages", []):
+                    by_page.setdefault(pnum, ([], {}))[1][sha256] = {k: v for k, v in meta.items() if k != "pages"}
+            job.pages = [(pnum, previews, images) for pnum, (previews, images) in sorted(by_page.items())]
+            job.pages_total = max(by_page, default=0)
+            job.cached = True
+            metrics.UPLOADS_TOTAL.labels(result="cached").inc()
+            _finish(job, "done")
+            return
+
+        timings = []
+        async with _semaphore:
+            job.status = "running"
+            job._notify()
+            with metrics.IN_FLIGHT.track_inprogress(), tracing.span("parser.parse", job_id=job.id):
+                async for pnum, previews, images, page_timings, total in iter_pages(job.path, JOB_PAGES_PER_TASK):
+                    job.pages_total = total
+                    job.pages.append((pnum, previews, images))
+                    timings.append(page_timings)
+                    job._notify()
+        all_previews, all_images = [], {}
+        for pnum, previews, images in job.pages:
+            all_previews.extend(previews)
+            merge_images(all_images, images, pnum)
+        stages = metrics.sum_stages(timings)
+        started = time.perf_counter()
+        with tracing.span("parser.cache", job_id=job.id):
+            await asyncio.get_running_loop().run_in_executor(None, cache.put, job.sha256, all_previews, all_images)
+        stages["cache"] = time.perf_counter() - started
+        metrics.observe_parse("job", stages, time.time() - job.created_at, len(job.pages), len(all_previews))
+        metrics.UPLOADS_TOTAL.labels(result="parsed").inc()
+        _finish(job, "done")
+    except asyncio.CancelledError:
+        _finish(job, "cancelled")
+    except Exception as e:
+        metrics.observe_failure("parse", e)
+        logger.exception("задание %s: ошибка при парсинге pdf", job.id, extra={"sha256": job.sha256})
+        _finish(job, "failed", f"ошибка при парсинге pdf: {e}")
@@ -0,0 +1,267 @@
+"""
+Разбор страницы расписания по геометрии.
+
+Слова и символы страницы извлекаются один раз и складываются в пространственный индекс,
+сетка таблицы (дни × пары × группы) берётся из линий и прямоугольников страницы,
+а текст каждой ячейки собирается запросом к индексу по её границам.
+Поля события (предмет, преподаватель, аудитория, время) берутся из ячейки, а не угадываются
+по произвольным кускам текста страницы.
+"""
+import re
+from collections import defaultdict
+
+from utils import simple_normalize_text
+from classifier import classify
+from metrics import timer
+
+WEEKDAYS = ["понедельник", "вторник", "среда", "четверг", "пятница", "суббота", "воскресенье"]
+# Время, набранное повёрнутым текстом с минутами надстрочными цифрами: «1210 – 1345»
+PACKED_TIME_RE = re.compile(r'(\d{1,2})[:.]?(\d{2})\s*[–-]\s*(\d{1,2})[:.]?(\d{2})')
+TEACHER_RE = re.compile(r'^[А-ЯЁ]\.\s?[А-ЯЁ]\.\s?[А-ЯЁ][а-яё-]+')
+ROOM_RE = re.compile(r'^ауд\.?\s*(.+)$', re.IGNORECASE)
+# Перенос слова в ячейке: «хозяй‐ ственной» -> «хозяйственной»
+SOFT_HYPHEN_RE = re.compile(r'[‐­]\s+')
+# Допуск (pt) при сравнении координат границ ячеек и строк текста
+SNAP_TOLERANCE = 3.0
+
+
+class SpatialIndex:
+    """Равномерная сетка корзин: объекты (с x0/top/x1/bottom) ищутся по прямоугольнику без полного перебора."""
+
+    def __init__(self, items: list, bucket: float = 48.0):
+        self.bucket = bucket
+        self._cells: dict[tuple[int, int], list] = defaultdict(list)
+        for item in items:
+            cx, cy = self._center(item)
+            self._cells[(int(cx // bucket), int(cy // bucket))].append(item)
+
+    @staticmethod
+    def _center(item) -> tuple[float, float]:
+        return (item["x0"] + item["x1"]) / 2, (item["top"] + item["bottom"]) / 2
+
+    def query(self, bbox: tuple) -> list:
+        """Объекты, центр которых лежит внутри bbox = (x0, top, x1, bottom)."""
+        x0, top, x1, bottom = bbox
+        found = []
+        for bx in range(int(x0 // self.bucket), int(x1 // self.bucket) + 1):
+            for by in range(int(top // self.bucket), int(bottom // self.bucket) + 1):
+                for item in self._cells.get((bx, by), ()):
+                    cx, cy = self._center(item)
+                    if x0 <= cx <= x1 and top <= cy <= bottom:
+                        found.append(item)
+        return found
+
+
+def _cell_text(words: list) -> str:
+    """Склеивает слова ячейки построчно сверху вниз и убирает переносы."""
+    lines: list[list] = []
+    for w in sorted(words, key=lambda w: (w["top"], w["x0"])):
+        if lines and abs(lines[-1][0]["top"] - w["top"]) <= SNAP_TOLERANCE:
+            lines[-1].append(w)
+        else:
+            lines.append([w])
+    text = " ".join(" ".join(w["text"] for w in sorted(line, key=lambda w: w["x0"])) for line in lines)
+    return simple_normalize_text(SOFT_HYPHEN_RE.sub("", text))
+
+
+def _rotated_text(chars: list) -> str:
+    """Текст, повёрнутый на 90° против часовой стрелки: читается снизу вверх."""
+    return "".join(c["text"] for c in sorted(chars, key=lambda c: -c["bottom"]))
+
+
+def _cell_times(text: str, rotated: str) -> tuple:
+    fields = classify(text)
+    if fields["start"]:
+        return fields["start"], fields["end"]
+    m = PACKED_TIME_RE.search(rotated.replace(" ", ""))
+    if m:
+        return f"{int(m.group(1)):02d}:{m.group(2)}", f"{int(m.group(3)):02d}:{m.group(4)}"
+    return None, None
+
+
+def _weekday(text: str) -> int | None:
+    low = text.strip().lower()
+    return WEEKDAYS.index(low) if low in WEEKDAYS else None
+
+
+def split_lesson(text: str) -> dict:
+    """«Предмет; И. О. Фамилия, должность; ауд. 212» -> {subject, teacher, room}."""
+    parts = [p.strip() for p in text.split(';') if p.strip()]
+    fields = {"subject": parts[0] if parts else None, "teacher": None, "room": None}
+    for part in parts[1:]:
+        room = ROOM_RE.match(part)
+        if room and fields["room"] is None:
+            fields["room"] = room.group(1).strip()
+        elif TEACHER_RE.match(part) and fields["teacher"] is None:
+            fields["teacher"] = part
+    return fields
+
+
+def _boundaries(values: list) -> list[float]:
+    """Сливает близкие координаты границ в одну."""
+    result: list[float] = []
+    for v in sorted(values):
+        if not result or v - result[-1] > SNAP_TOLERANCE:
+            result.append(v)
+    return result
+
+
+def _columns_of(bbox: tuple, xs: list[float]) -> list[int]:
+    """Индексы столбцов сетки (между соседними xs), которые покрывает ячейка."""
+    return [
+        i for i in range(len(xs) - 1)
+        if xs[i] >= bbox[0] - SNAP_TOLERANCE and xs[i + 1] <= bbox[2] + SNAP_TOLERANCE
+    ]
+
+
+def _hashes(images: list) -> list[str]:
+    return sorted({img["hash"] for img in images})
+
+
+def parse_table(table_cells: list, words: SpatialIndex, rotated: SpatialIndex, images: SpatialIndex, pnum: int) -> list:
+    """
+    Превращает ячейки одной таблицы в события.
+    Левый столбец — время пар, строка на всю ширину с названием дня — заголовок дня,
+    ячейки над первым днём вне строк с временем — названия групп, остальное — занятия.
+    """
+    xs = _boundaries([c[0] for c in table_cells] + [c[2] for c in table_cells])
+    if len(xs) < 3:
+        return []
+    time_col_right = xs[1]
+
+    slots = []       # (top, bottom, start, end)
+    days = []        # (top, weekday, name)
+    headers = {}     # столбец -> название группы
+    lessons = []     # (bbox, text, columns)
+    for bbox in sorted(table_cells, key=lambda b: (b[1], b[0])):
+        with timer.stage("normalize"):
+            text = _cell_text(words.query(bbox))
+        cols = _columns_of(bbox, xs)
+        if bbox[2] <= time_col_right + SNAP_TOLERANCE:
+            with timer.stage("classify"):
+                start, end = _cell_times(text, _rotated_text(rotated.query(bbox)))
+            if start:
+                slots.append((bbox[1], bbox[3], start, end))
+            continue
+        weekday = _weekday(text)
+        if weekday is not None:
+            days.append((bbox[1], weekday, text.strip()))
+            continue
+        if not text:
+            continue
+        content = [c - 1 for c in cols if c >= 1]
+        middle = (bbox[1] + bbox[3]) / 2
+        in_slot = any(s[0] - SNAP_TOLERANCE <= middle <= s[1] + SNAP_TOLERANCE for s in slots)
+        if not days and not in_slot:
+            # Шапка таблицы; на следующих страницах её нет, и занятия до первого дня относятся к предыдущей
+            for c in content:
+                headers[c] = text
+            continue
+        lessons.append((bbox, text, content))
+
+    previews = []
+    for bbox, text, content in lessons:
+        middle = (bbox[1] + bbox[3]) / 2
+        day = None
+        for top, weekday, name in days:
+            if top <= middle:
+                day = (weekday, name)
+        slot = next((s for s in slots if s[0] - SNAP_TOLERANCE <= middle <= s[1] + SNAP_TOLERANCE), None)
+        with timer.stage("classify"):
+            fields = split_lesson(text)
+            typed = classify(text)
+        previews.append({
+            "page": pnum,
+            "raw": text,
+            "type": typed["lesson_type"],
+            "start": slot[2] if slot else typed["start"],
+            "end": slot[3] if slot else typed["end"],
+            "date": typed["date"],
+            "weekday": day[0] if day else None,
+            "day": day[1] if day else None,
+            "subject": fields["subject"],
+            "teacher": fields["teacher"] or typed["teacher"],
+            "room": fields["room"] or typed["room"],
+            "columns": content,
+            "groups": [headers[c] for c in content if c in headers] or None,
+            "images": _hashes(images.query(bbox)),
+        })
+    return previews
+
+
+def parse_fragments(page_text: str, pnum: int, images: list) -> list:
+    """Запасной путь для страниц без таблицы: фрагменты текста, разделённые пустыми строками."""
+    previews = []
+    parts = [p.strip() for p in page_text.split('\n\n') if p.strip()]
+    for part in parts:
+        with timer.stage("normalize"):
+            txt = simple_normalize_text(part)
+        if not txt:
+            continue
+        with timer.stage("classify"):
+            typed = classify(txt)
+        previews.append({
+            "page": pnum,
+            "raw": txt,
+            "type": typed["lesson_type"],
+            "start": typed["start"],
+            "end": typed["end"],
+            "date": typed["date"],
+            "room": typed["room"],
+            "teacher": typed["teacher"],
+            "images": _hashes(images),
+        })
+    return previews
+
+
+def parse_page_layout(page, pnum: int, images: list = ()) -> list:
+    """
+    Предпросмотр событий страницы: по сетке таблицы, если она есть, иначе по фрагментам текста.
+    images — картинки страницы (с координатами); занятию достаются хэши картинок из его ячейки.
+    """
+    with timer.stage("extract"):
+        words = page.extract_words(extra_attrs=["upright"])
+        chars = page.chars
+        tables = page.find_tables()
+        page_text = None if tables else page.extract_text() or ""
+    if not tables:
+        return parse_fragments(page_text, pnum, list(images))
+    upright = SpatialIndex([w for w in words if w["upright"]])
+    rotated = SpatialIndex([c for c in chars if not c["upright"]])
+    image_index = SpatialIndex(list(images))
+    previews = []
+    for table in tables:
+        previews.extend(parse_table(table.cells, upright, rotated, image_index, pnum))
+    return previews
+
+
+class ContextCarrier:
+    """
+    Протягивает контекст через границы страниц (страницы разбираются независимо):
+    занятия в начале страницы до заголовка дня относятся к последнему дню предыдущей,
+    а названия групп берутся из последней шапки таблицы по номеру столбца.
+    Страницы подаются в feed() по порядку, можно по одной.
+    """
+
+    def __init__(self):
+        self.day = (None, None)
+        self.groups: dict[int, str] = {}
+
+    def feed(self, previews: list) -> list:
+        for p in previews:
+            if "weekday" not in p:
+                continue
+            if p["weekday"] is None:
+                p["weekday"], p["day"] = self.day
+            else:
+                self.day = (p["weekday"], p["day"])
+            cols = p.get("columns") or []
+            if p.get("groups") and len(p["groups"]) == len(cols):
+                self.groups.update(zip(cols, p["groups"]))
+            elif cols:
+                p["groups"] = [self.groups[c] for c in cols if c in self.groups] or None
+        return previews
+
+
+def carry_context(previews: list) -> list:
+    return ContextCarrier().feed(previews)
@@ -0,0 +1,116 @@
+"""
+Метрики парсера для Prometheus и замер времени по стадиям разбора.
+
+Стадии замеряются в процессах пула (StageTimer) и возвращаются вместе со страницей:
+у каждого процесса свой реестр Prometheus, поэтому в метрики их складывает основной процесс.
+Стадии: upload (запись загрузки на диск), open (pdfplumber.open), extract (слова, символы, таблицы
+страницы), images, normalize (сборка и нормализация текста ячеек), classify, layout (остальная
+сборка событий), release (сброс кэшей страницы), cache (запись результата в кэш).
+"""
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from common import tracing
+
+STAGE_SECONDS = Histogram(
+    "parser_stage_duration_seconds",
+    "Time spent in each parse stage per upload (summed over pages and pool processes)",
+    ["stage"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+PARSE_SECONDS = Histogram(
+    "parser_parse_duration_seconds",
+    "Wall time from accepted upload to finished parse",
+    ["mode"],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+PAGES_PER_UPLOAD = Histogram(
+    "parser_pages_per_upload",
+    "Pages parsed per upload",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+FRAGMENTS_PER_UPLOAD = Histogram(
+    "parser_fragments_per_upload",
+    "Event fragments found per upload",
+    buckets=(0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000),
+)
+PROCESSED_BYTES_TOTAL = Counter(
+    "parser_processed_bytes_total",
+    "Bytes of accepted PDF uploads",
+)
+UPLOADS_TOTAL = Counter(
+    "parser_uploads_total",
+    "Accepted uploads by outcome",
+    ["result"],
+)
+FAILURES_TOTAL = Counter(
+    "parser_failures_total",
+    "Failed uploads and parses by stage and exception type",
+    ["stage", "exception"],
+)
+IN_FLIGHT = Gauge(
+    "parser_in_flight_parses",
+    "Parses currently running",
+)
+
+# Стадии, которые выполняются по разу на страницу, — ещё и спаны трассировки;
+# normalize и classify (на каждую ячейку) остаются суммами в атрибутах спана страницы
+SPAN_STAGES = {"open", "extract", "images", "release"}
+
+
+class StageTimer:
+    """Суммирует время по стадиям: with timer.stage("classify"): ...; take() отдаёт накопленное и обнуляет."""
+
+    def __init__(self):
+        self.seconds: dict[str, float] = defaultdict(float)
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            with tracing.span(f"parser.{name}") if name in SPAN_STAGES else nullcontext():
+                yield
+        finally:
+            self.seconds[name] += time.perf_counter() - started
+
+    def take(self) -> dict[str, float]:
+        result = dict(self.seconds)
+        self.seconds.clear()
+        return result
+
+
+# Таймер текущего процесса: страницы в процессе пула разбираются по одной
+timer = StageTimer()
+
+
+def sum_stages(timings: list[dict]) -> dict[str, float]:
+    total: dict[str, float] = defaultdict(float)
+    for t in timings:
+        for stage, seconds in t.items():
+            if stage != "page":
+                total[stage] += seconds
+    return dict(total)
+
+
+def observe_parse(mode: str, stages: dict[str, float], wall_seconds: float, pages: int, fragments: int) -> None:
+    for stage, seconds in stages.items():
+        STAGE_SECONDS.labels(stage=stage).observe(seconds)
+    PARSE_SECONDS.labels(mode=mode).observe(wall_seconds)
+    PAGES_PER_UPLOAD.observe(pages)
+    FRAGMENTS_PER_UPLOAD.observe(fragments)
+
+
+def observe_failure(stage: str, exc: BaseException) -> None:
+    FAILURES_TOTAL.labels(stage=stage, exception=type(exc).__name__).inc()
+
+
+def profile(stages: dict[str, float], timings: list[dict], wall_seconds: float) -> dict:
+    """Разбивка времени для ответа с ?profile=1 (секунды, округлённые до мкс)."""
+    return {
+        "wall_seconds": round(wall_seconds, 6),
+        "stages": {k: round(v, 6) for k, v in sorted(stages.items())},
+        "pages": [{k: round(v, 6) if isinstance(v, float) else v for k, v in t.items()} for t in timings],
+    }
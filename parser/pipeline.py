@@ -0,0 +1,201 @@
+"""
+Разбор PDF по страницам в пуле процессов.
+
+Файл делится на диапазоны страниц; каждый процесс пула сам открывает PDF и разбирает
+свой диапазон, так что CPU-работа pdfplumber не блокирует event loop и занимает все ядра.
+Результаты склеиваются в порядке страниц.
+После разбора страницы её кэш объектов сбрасывается, поэтому память процесса не растёт
+с числом страниц; длина PDF и память процесса пула ограничены настройками.
+"""
+import asyncio
+import gc
+import logging
+import os
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pdfplumber
+
+from common import tracing
+from utils import extract_images_from_page
+from layout import parse_page_layout, ContextCarrier
+from metrics import timer
+
+logger = logging.getLogger(__name__)
+
+# Число процессов пула (по умолчанию — по числу ядер) и сколько страниц отдавать одному заданию
+PARSER_WORKERS = int(os.getenv("PARSER_WORKERS", str(os.cpu_count() or 1)))
+PAGES_PER_TASK = int(os.getenv("PARSER_PAGES_PER_TASK", "4"))
+# Ограничения разбора: число страниц в PDF и память (RSS, байты) процесса, разбирающего страницы; 0 — без ограничения
+MAX_PAGES = int(os.getenv("PARSER_MAX_PAGES", "1000"))
+MAX_RSS_BYTES = int(os.getenv("PARSER_MAX_RSS_BYTES", str(1024 * 1024 * 1024)))
+
+_pool: ProcessPoolExecutor | None = None
+
+
+class ParseLimitError(Exception):
+    """PDF не укладывается в ограничения разбора (PARSER_MAX_PAGES, PARSER_MAX_RSS_BYTES)."""
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=PARSER_WORKERS)
+    return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+def parse_page(page, pnum: int) -> tuple[list, dict]:
+    """
+    Предпросмотр событий одной страницы (по сетке таблицы, см. layout) и её картинки {hash: описание}.
+    Предпросмотр ссылается на картинки только по хэшу.
+    """
+    with timer.stage("extract"):
+        page.objects  # разбор потока содержимого страницы: символы, линии и картинки кэшируются в page
+    with timer.stage("images"):
+        found = extract_images_from_page(page)
+    previews = parse_page_layout(page, pnum, found)
+    images = {img["hash"]: {"format": img["format"], "width": img["width"], "height": img["height"]} for img in found}
+    return previews, images
+
+
+def count_pages(path: str) -> int:
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+
+def current_rss() -> int:
+    """Текущий RSS процесса в байтах (без /proc — пиковый)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def release_page(pdf, page) -> None:
+    """
+    Освобождает разобранную страницу: кэш символов/линий/layout страницы pdfplumber
+    и объекты документа, прочитанные pdfminer (потоки картинок и содержимого страницы).
+    Шрифты кэшируются отдельно, в менеджере ресурсов, и переиспользуются следующими страницами.
+    """
+    page.flush_cache()
+    # _cached_objs — приватный кэш PDFDocument в pdfminer.six (версия закреплена в requirements.txt).
+    # После обновления pdfminer атрибута может не оказаться: тогда не падаем, а один раз предупреждаем
+    cached_objs = getattr(pdf.doc, "_cached_objs", None)
+    if isinstance(cached_objs, dict):
+        cached_objs.clear()
+    else:
+        _warn_no_object_cache()
+    gc.collect()
+
+
+_object_cache_warned = False
+
+
+def _warn_no_object_cache() -> None:
+    global _object_cache_warned
+    if not _object_cache_warned:
+        _object_cache_warned = True
+        logger.warning("у PDFDocument нет _cached_objs (другая версия pdfminer.six?) — кэш объектов не сбрасывается")
+
+
+def parse_page_range(path: str, first: int, last: int, traceparent: str | None = None) -> list:
+    """
+    Разбирает страницы first..last (с 1, включительно); выполняется в процессе пула.
+    Возвращает [(номер страницы, предпросмотр, картинки, время по стадиям)]; время открытия файла
+    приходится на первую страницу диапазона, а layout — остаток, не попавший в другие стадии.
+    Если память процесса превысила MAX_RSS_BYTES, разбор обрывается с ParseLimitError.
+    traceparent — спан основного процесса, под которым в трассу попадут спаны диапазона и страниц.
+    """
+    with tracing.span("parser.pages", parent=traceparent, first=first, last=last):
+        return _parse_page_range(path, first, last)
+
+
+def _parse_page_range(path: str, first: int, last: int) -> list:
+    pages = []
+    timer.take()
+    with timer.stage("open"):
+        pdf = pdfplumber.open(path, pages=range(first, last + 1))
+        pdf_pages = pdf.pages
+    with pdf:
+        for page in pdf_pages:
+            with tracing.span("parser.page", page=page.page_number) as page_span:
+                started = time.perf_counter()
+                previews, images = parse_page(page, page.page_number)
+                with timer.stage("release"):
+                    release_page(pdf, page)
+                timings = timer.take()
+                elapsed = time.perf_counter() - started
+                timings["layout"] = max(0.0, elapsed - sum(v for k, v in timings.items() if k != "open"))
+                page_span.set(**{f"seconds.{k}": round(v, 6) for k, v in timings.items()})
+            pages.append((page.page_number, previews, images, {"page": page.page_number, **timings}))
+            rss = current_rss()
+            if MAX_RSS_BYTES and rss > MAX_RSS_BYTES:
+                raise ParseLimitError(
+                    f"разбор страницы {page.page_number} занял {rss // 2**20} МБ памяти "
+                    f"(ограничение {MAX_RSS_BYTES // 2**20} МБ)"
+                )
+    return pages
+
+
+def page_ranges(total: int, per_task: int = PAGES_PER_TASK) -> list[tuple[int, int]]:
+    per_task = max(1, per_task)
+    return [(first, min(first + per_task - 1, total)) for first in range(1, total + 1, per_task)]
+
+
+async def iter_pages(path: str, per_task: int = PAGES_PER_TASK):
+    """
+    Асинхронно отдаёт (номер страницы, предпросмотр, картинки страницы, время по стадиям, всего страниц)
+    в порядке страниц.
+    Все диапазоны сразу уходят в пул и разбираются параллельно, а страница отдаётся, как только
+    готова она и все предыдущие. День недели и группы протягиваются с предыдущих страниц.
+    При закрытии генератора (отмена) ещё не начатые задания снимаются.
+    PDF длиннее MAX_PAGES страниц не разбирается (ParseLimitError).
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_pool()
+    total = await loop.run_in_executor(pool, count_pages, path)
+    if MAX_PAGES and total > MAX_PAGES:
+        raise ParseLimitError(f"в PDF {total} страниц, разбирается не больше {MAX_PAGES}")
+    carrier = ContextCarrier()
+    futures = [
+        (first, last, loop.run_in_executor(pool, parse_page_range, path, first, last, tracing.current_traceparent()))
+        for first, last in page_ranges(total, per_task)
+    ]
+    try:
+        for _, _, future in futures:
+            for pnum, previews, images, timings in await future:
+                yield pnum, carrier.feed(previews), images, timings, total
+    finally:
+        for _, _, future in futures:
+            future.cancel()
+
+
+def merge_images(images: dict, page_images: dict, pnum: int) -> None:
+    """Добавляет картинки страницы в общий словарь {hash: {..., pages}}: каждая картинка один раз."""
+    for sha256, meta in page_images.items():
+        entry = images.setdefault(sha256, {**meta, "pages": []})
+        entry["pages"].append(pnum)
+
+
+async def parse_pdf(path: str) -> tuple[list, dict, list]:
+    """
+    Разбирает весь PDF в пуле процессов.
+    Возвращает (предпросмотр в порядке страниц, картинки, время по стадиям для каждой страницы).
+    """
+    previews, images, timings = [], {}, []
+    with tracing.span("parser.parse") as s:
+        async for pnum, page_previews, page_images, page_timings, _ in iter_pages(path):
+            previews.extend(page_previews)
+            merge_images(images, page_images, pnum)
+            timings.append(page_timings)
+        s.set(pages=len(timings), fragments=len(previews))
+    return previews, images, timings
@@ -0,0 +1,18 @@
+"""
+Общие настройки тестов парсера: модули парсера и common в sys.path, временные каталоги.
+
+Окружение задаётся до импорта модулей: они читают настройки при импорте.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path[:0] = [str(ROOT / "parser"), str(ROOT)]
+
+_tmp = tempfile.mkdtemp(prefix="parser-tests-")
+os.environ["PARSER_UPLOAD_DIR"] = os.path.join(_tmp, "uploads")
+os.environ.setdefault("PARSER_CACHE_DIR", os.path.join(_tmp, "cache"))
+os.environ.setdefault("PARSER_ICON_DIR", os.path.join(_tmp, "icons"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
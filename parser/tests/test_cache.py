@@ -0,0 +1,104 @@
+import os
+import time
+
+from cache import ParseCache
+
+
+def _entry(cache: ParseCache, sha256: str, size: int, age: float) -> None:
+    path = cache.pdf_path(sha256)
+    with open(path, "wb") as f:
+        f.write(b"%PDF-" + b"x" * size)
+    used = time.time() - age
+    os.utime(path, (used, used))
+
+
+def test_lru_eviction_over_size_limit(tmp_path):
+    cache = ParseCache(str(tmp_path), ttl_seconds=3600, max_bytes=2500)
+    _entry(cache, "old", 1000, age=30)
+    _entry(cache, "mid", 1000, age=20)
+    _entry(cache, "new", 1000, age=10)
+    assert cache.evict() == 1
+    assert not os.path.exists(cache.pdf_path("old"))
+    assert os.path.exists(cache.pdf_path("new"))
+
+
+def test_pinned_entry_is_not_evicted(tmp_path):
+    cache = ParseCache(str(tmp_path), ttl_seconds=60, max_bytes=1500)
+    _entry(cache, "parsing", 1000, age=3600)
+    _entry(cache, "idle", 1000, age=10)
+    with cache.pinned("parsing"):
+        # Запись старше TTL, но её PDF ещё читают: вытесняется следующая, размер закреплённой учтён
+        assert cache.evict() == 1
+        assert os.path.exists(cache.pdf_path("parsing"))
+        assert not os.path.exists(cache.pdf_path("idle"))
+    assert cache.evict() == 1
+    assert not os.path.exists(cache.pdf_path("parsing"))
+
+
+def test_pins_are_counted(tmp_path):
+    cache = ParseCache(str(tmp_path), ttl_seconds=0, max_bytes=0)
+    _entry(cache, "shared", 10, age=100)
+    cache.pin("shared")
+    with cache.pinned("shared"):
+        pass
+    assert cache.evict() == 0
+    cache.unpin("shared")
+    assert cache.evict() == 1
+
+
+def test_job_keeps_pdf_pinned_until_finished(tmp_path):
+    import asyncio
+
+    import jobs
+
+    cache = ParseCache(str(tmp_path))
+
+    async def scenario():
+        cache.put("cached", [{"page": 1, "raw": "x"}], {})
+        done = jobs.submit(cache.pdf_path("cached"), "cached", 1, cache)
+        cancelled = jobs.submit(cache.pdf_path("other"), "other", 1, cache)
+        assert cache._pins == {"cached": 1, "other": 1}
+        # Отмена до первого шага задачи: _run не начнётся, закрепление всё равно снимается
+        cancelled.task.cancel()
+        await asyncio.gather(done.task, cancelled.task, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert done.status == "done"
+        assert not cache._pins
+
+    asyncio.run(scenario())
+
+
+def test_cache_io_runs_off_event_loop(monkeypatch):
+    import asyncio
+
+    from fastapi.testclient import TestClient
+
+    import app as parser_app
+
+    calls = []
+
+    def recorded(name, method):
+        def wrapper(*args):
+            try:
+                asyncio.get_running_loop()
+                calls.append((name, "event loop"))
+            except RuntimeError:
+                calls.append((name, "executor"))
+            return method(*args)
+        return wrapper
+
+    async def parse_pdf(path):
+        return [{"page": 1, "raw": "x"}], {}, []
+
+    cache = parser_app.parse_cache
+    for name in ("get", "adopt_upload", "put"):
+        monkeypatch.setattr(cache, name, recorded(name, getattr(cache, name)))
+    monkeypatch.setattr(parser_app, "parse_pdf", parse_pdf)
+
+    pdf = b"%PDF-1.4\n" + os.urandom(64)
+    client = TestClient(parser_app.app)
+    for cached in (False, True):
+        r = client.post("/upload_pdf", files={"file": ("a.pdf", pdf, "application/pdf")})
+        assert r.status_code == 200 and r.json()["cached"] is cached
+    # Чтение превью, перенос загрузки и запись кэша — в пуле потоков, не на event loop
+    assert calls == [("get", "executor"), ("adopt_upload", "executor"), ("put", "executor"), ("get", "executor")]
@@ -0,0 +1,21 @@
+import json
+import os
+
+import pytest
+
+from classifier import classify
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bench", "golden.json")
+
+with open(GOLDEN_PATH, encoding="utf-8") as f:
+    GOLDEN = json.load(f)
+
+
+@pytest.mark.parametrize("item", [g for g in GOLDEN if g["label"] == "manual"], ids=lambda g: g["text"][:40])
+def test_manual_labels(item):
+    assert classify(item["text"]) == item["expected"]
+
+
+def test_snapshots_unchanged():
+    changed = [g["text"] for g in GOLDEN if g["label"] == "snapshot" and classify(g["text"]) != g["expected"]]
+    assert changed == []
@@ -0,0 +1,56 @@
+import glob
+import os
+
+from pdfminer.psparser import LIT
+from PIL import Image
+
+import icons
+
+
+class Stream:
+    """Поток картинки pdfminer: несжатые строки серого изображения."""
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def get_rawdata(self) -> bytes:
+        return self.data
+
+    def get_data(self) -> bytes:
+        return self.data
+
+    def get_filters(self) -> list:
+        return []
+
+
+def _image(width: int, height: int) -> dict:
+    data = os.urandom(width * height)
+    return {"stream": Stream(data), "srcsize": (width, height), "colorspace": [LIT("DeviceGray")], "bits": 8}
+
+
+def test_identical_images_are_stored_once(monkeypatch):
+    img = _image(40, 20)
+    first = icons.store_image(img)
+    assert first["format"] == "png" and (first["width"], first["height"]) == (40, 20)
+
+    def no_encode(_img):
+        raise AssertionError("картинка уже в хранилище — кодировать заново не нужно")
+
+    monkeypatch.setattr(icons, "_encode", no_encode)
+    # Та же картинка с другой страницы или из другой загрузки
+    assert icons.store_image({**img, "stream": Stream(img["stream"].data)}) == first
+    assert glob.glob(os.path.join(icons.ICON_DIR, f"{first['hash']}.*")) == [icons.image_path(first["hash"])]
+
+
+def test_thumbnail_is_created_once():
+    stored = icons.store_image(_image(300, 200))
+    path = icons.thumbnail_path(stored["hash"], 128)
+    with Image.open(path) as thumb:
+        assert thumb.size == (128, 85)
+    mtime = os.path.getmtime(path)
+    assert icons.thumbnail_path(stored["hash"], 128) == path
+    assert os.path.getmtime(path) == mtime
+
+    assert icons.thumbnail_path(stored["hash"], 100) is None
+    assert icons.image_path("../" + stored["hash"]) is None
+    assert icons.thumbnail_path("0" * 64, 128) is None
@@ -0,0 +1,90 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi.testclient import TestClient
+
+import app as parser_app
+import jobs
+import pipeline
+
+
+def _fake_pool(monkeypatch, pages: int, delays: dict, started: list, workers: int = 1):
+    """Пул потоков вместо процессов; страница pnum разбирается delays[pnum] секунд."""
+    pool = ThreadPoolExecutor(max_workers=workers)
+
+    def parse_page_range(path, first, last, traceparent=None):
+        out = []
+        for pnum in range(first, last + 1):
+            started.append(pnum)
+            time.sleep(delays.get(pnum, 0))
+            out.append((pnum, [{"page": pnum, "raw": f"стр. {pnum}", "weekday": None}], {}, {}))
+        return out
+
+    monkeypatch.setattr(pipeline, "get_pool", lambda: pool)
+    monkeypatch.setattr(pipeline, "count_pages", lambda path: pages)
+    monkeypatch.setattr(pipeline, "parse_page_range", parse_page_range)
+    return pool
+
+
+def test_pages_are_yielded_in_order_and_close_cancels_the_rest(monkeypatch):
+    started = []
+    # Первая страница медленнее второй; остальные заняты дольше, чем нужно тесту
+    delays = {1: 0.1, 2: 0, **{pnum: 0.2 for pnum in range(3, 9)}}
+    pool = _fake_pool(monkeypatch, pages=8, delays=delays, started=started, workers=2)
+
+    async def scenario():
+        pages = pipeline.iter_pages("doc.pdf", per_task=1)
+        order = [(await pages.__anext__())[0] for _ in range(2)]
+        # Отмена после двух страниц: ещё не начатые диапазоны из пула снимаются
+        await pages.aclose()
+        return order
+
+    assert asyncio.run(scenario()) == [1, 2]
+    pool.shutdown(wait=True)
+    assert len(started) < 8
+
+
+def _pdf() -> bytes:
+    return b"%PDF-1.4\n" + os.urandom(64)
+
+
+def test_job_results_stream_ndjson_in_page_order(monkeypatch):
+    _fake_pool(monkeypatch, pages=3, delays={1: 0.05}, started=[])
+    with TestClient(parser_app.app) as client:
+        job = client.post("/jobs", files={"file": ("a.pdf", _pdf(), "application/pdf")}).json()
+        r = client.get(f"/jobs/{job['job_id']}/results")
+        assert r.headers["content-type"] == "application/x-ndjson"
+        lines = [json.loads(line) for line in r.text.splitlines()]
+    assert [line["page"] for line in lines[:-1]] == [1, 2, 3]
+    assert all(line["pages_total"] == 3 for line in lines[:-1])
+    assert lines[-1]["status"] == "done" and lines[-1]["pages_done"] == 3
+
+
+def test_cancel_stops_job(monkeypatch):
+    closed = threading.Event()
+
+    async def iter_pages(path, per_task=1):
+        try:
+            yield 1, [{"page": 1, "raw": "стр. 1"}], {}, {}, 2
+            await asyncio.sleep(30)
+            yield 2, [], {}, {}, 2
+        finally:
+            closed.set()
+
+    monkeypatch.setattr(jobs, "iter_pages", iter_pages)
+    with TestClient(parser_app.app) as client:
+        job_id = client.post("/jobs", files={"file": ("a.pdf", _pdf(), "application/pdf")}).json()["job_id"]
+        for _ in range(100):
+            if client.get(f"/jobs/{job_id}").json()["pages_done"] == 1:
+                break
+            time.sleep(0.01)
+        assert client.delete(f"/jobs/{job_id}").status_code == 200
+        assert closed.wait(5)
+        progress = client.get(f"/jobs/{job_id}").json()
+        # Разобранная страница остаётся в результатах
+        assert (progress["status"], progress["pages_done"]) == ("cancelled", 1)
+        assert client.delete("/jobs/unknown").status_code == 404
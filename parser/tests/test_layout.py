@@ -0,0 +1,53 @@
+from layout import SpatialIndex, carry_context, parse_table, split_lesson
+
+
+def _word(text: str, bbox: tuple) -> dict:
+    """Слово в центре ячейки bbox = (x0, top, x1, bottom)."""
+    cx, cy = (bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2
+    return {"text": text, "x0": cx - 10, "x1": cx + 10, "top": cy - 4, "bottom": cy + 4, "upright": True}
+
+
+def _page(cells: dict, pnum: int) -> list:
+    """cells: {bbox: текст}; пустой текст — ячейка без слов."""
+    words = SpatialIndex([_word(text, bbox) for bbox, text in cells.items() if text])
+    return parse_table(list(cells), words, SpatialIndex([]), SpatialIndex([]), pnum)
+
+
+def test_spatial_index_queries_by_center():
+    items = [_word("a", (0, 0, 20, 20)), _word("b", (100, 100, 120, 120)), _word("c", (500, 10, 520, 30))]
+    index = SpatialIndex(items, bucket=48)
+    assert [w["text"] for w in index.query((0, 0, 130, 130))] == ["a", "b"]
+    assert index.query((200, 200, 300, 300)) == []
+
+
+def test_split_lesson_fields():
+    assert split_lesson("Математика; И. О. Петров, доцент; ауд. 212") == {
+        "subject": "Математика", "teacher": "И. О. Петров, доцент", "room": "212",
+    }
+    assert split_lesson("Физкультура") == {"subject": "Физкультура", "teacher": None, "room": None}
+
+
+def test_grid_cells_become_lessons_with_day_slot_and_group():
+    first = _page({
+        (0, 0, 100, 20): "",
+        (100, 0, 200, 20): "ИВТ-1",
+        (200, 0, 300, 20): "ИВТ-2",
+        (0, 20, 300, 40): "понедельник",
+        (0, 40, 100, 100): "08:30-10:00",
+        (100, 40, 200, 100): "Математика; И. О. Петров; ауд. 212",
+        (200, 40, 300, 100): "Физика; ауд. 101",
+    }, pnum=1)
+    assert [(p["subject"], p["teacher"], p["room"], p["groups"]) for p in first] == [
+        ("Математика", "И. О. Петров", "212", ["ИВТ-1"]),
+        ("Физика", None, "101", ["ИВТ-2"]),
+    ]
+    assert {(p["weekday"], p["day"], p["start"], p["end"]) for p in first} == {(0, "понедельник", "08:30", "10:00")}
+
+    # Продолжение таблицы на следующей странице: без шапки и заголовка дня
+    second = _page({
+        (0, 0, 100, 60): "10:10-11:40",
+        (200, 0, 300, 60): "Химия; ауд. 5",
+    }, pnum=2)
+    assert second[0]["weekday"] is None and second[0]["groups"] is None
+    carried = carry_context(first + second)[-1]
+    assert (carried["weekday"], carried["day"], carried["groups"], carried["start"]) == (0, "понедельник", ["ИВТ-2"], "10:10")
@@ -0,0 +1,45 @@
+"""
+Память разбора длинных PDF: 500 страниц укладываются в порог RSS (замер — bench/memory_bench.py
+в отдельном процессе, чтобы пик не включал память других тестов).
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pdfplumber
+
+import pipeline
+
+PARSER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(PARSER_DIR, "bench"))
+
+from memory_bench import write_synthetic_pdf  # noqa: E402
+
+PAGES = 500
+# Без release_page пик около 440 МБ, с ним — около 55 МБ
+MAX_RSS_MB = 150
+
+
+def test_release_page_clears_pdfminer_object_cache(tmp_path):
+    path = str(tmp_path / "doc.pdf")
+    write_synthetic_pdf(path, 2)
+    with pdfplumber.open(path) as pdf:
+        page = pdf.pages[0]
+        page.extract_words()
+        # Приватный кэш pdfminer.six: если обновление его уберёт, release_page перестанет освобождать объекты
+        assert isinstance(pdf.doc._cached_objs, dict) and pdf.doc._cached_objs
+        pipeline.release_page(pdf, page)
+        assert not pdf.doc._cached_objs
+
+
+def test_long_pdf_stays_under_rss_cap():
+    proc = subprocess.run(
+        [sys.executable, os.path.join(PARSER_DIR, "bench", "memory_bench.py"), "--pages", str(PAGES), "--json"],
+        capture_output=True, text=True, timeout=600,
+    )
+    assert proc.returncode in (0, 1), proc.stderr
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    assert result["pages"] == PAGES
+    assert result["empty_pages"] == []
+    assert result["peak_rss_mb"] <= MAX_RSS_MB, result
@@ -0,0 +1,73 @@
+"""
+Разбивка времени по стадиям: ответ с ?profile=1 и метрики парсера в /metrics.
+Разбор страниц подменён — стадии берутся из отдаваемых им замеров.
+"""
+import os
+
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+import app as parser_app
+import metrics
+
+TIMINGS = [{"page": 1, "extract": 0.25, "classify": 0.125}, {"page": 2, "extract": 0.5}]
+
+
+def _sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_stage_timer_sums_and_resets():
+    timer = metrics.StageTimer()
+    for _ in range(2):
+        with timer.stage("classify"):
+            pass
+    with timer.stage("extract"):
+        pass
+    taken = timer.take()
+    assert set(taken) == {"classify", "extract"}
+    assert timer.take() == {}
+    assert metrics.sum_stages([{"page": 1, "extract": 1.0}, {"page": 2, "extract": 0.5, "images": 0.25}]) == {
+        "extract": 1.5, "images": 0.25,
+    }
+
+
+def test_profile_and_metrics(monkeypatch):
+    async def parse_pdf(path):
+        return [{"page": 1, "raw": "x"}, {"page": 2, "raw": "y"}], {}, [dict(t) for t in TIMINGS]
+
+    monkeypatch.setattr(parser_app, "parse_pdf", parse_pdf)
+    names = {
+        "parsed": ("parser_uploads_total", {"result": "parsed"}),
+        "cached": ("parser_uploads_total", {"result": "cached"}),
+        "extract": ("parser_stage_duration_seconds_sum", {"stage": "extract"}),
+        "pages": ("parser_pages_per_upload_sum", {}),
+        "fragments": ("parser_fragments_per_upload_sum", {}),
+        "parses": ("parser_parse_duration_seconds_count", {"mode": "sync"}),
+    }
+    before = {key: _sample(name, **labels) for key, (name, labels) in names.items()}
+
+    pdf = b"%PDF-1.4\n" + os.urandom(64)
+    client = TestClient(parser_app.app)
+    r = client.post("/upload_pdf", params={"profile": 1}, files={"file": ("a.pdf", pdf, "application/pdf")})
+    assert r.status_code == 200
+    profile = r.json()["profile"]
+    assert set(profile["stages"]) == {"upload", "extract", "classify", "cache"}
+    assert profile["stages"]["extract"] == 0.75
+    assert profile["pages"] == TIMINGS
+    assert profile["wall_seconds"] >= profile["stages"]["upload"]
+
+    # Из кэша: разбора не было, в разбивке только запись загрузки
+    cached = client.post("/upload_pdf", params={"profile": 1}, files={"file": ("a.pdf", pdf, "application/pdf")}).json()
+    assert cached["cached"] is True
+    assert set(cached["profile"]["stages"]) == {"upload"} and cached["profile"]["pages"] == []
+    # Без ?profile разбивки в ответе нет
+    assert "profile" not in client.post("/upload_pdf", files={"file": ("a.pdf", pdf, "application/pdf")}).json()
+
+    after = {key: _sample(name, **labels) for key, (name, labels) in names.items()}
+    assert {key: after[key] - before[key] for key in names} == {
+        "parsed": 1, "cached": 2, "extract": 0.75, "pages": 2, "fragments": 2, "parses": 1,
+    }
+    text = client.get("/metrics").text
+    assert 'parser_stage_duration_seconds_count{stage="extract"}' in text
+    assert "parser_in_flight_parses 0.0" in text
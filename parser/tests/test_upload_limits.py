@@ -0,0 +1,50 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import app as parser_app
+
+LIMIT = 1000
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(parser_app, "MAX_UPLOAD_BYTES", LIMIT)
+    monkeypatch.setattr(parser_app, "MULTIPART_OVERHEAD_BYTES", 1000)
+    return TestClient(parser_app.app)
+
+
+@pytest.fixture
+def handler_not_reached(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("тело не должно дойти до обработчика")
+    monkeypatch.setattr(parser_app, "receive_upload", fail)
+
+
+def _pdf(size: int) -> bytes:
+    return b"%PDF-1.4\n" + b"x" * size
+
+
+def test_content_length_rejected_before_form_parsing(client, handler_not_reached):
+    r = client.post("/upload_pdf", files={"file": ("a.pdf", _pdf(100_000), "application/pdf")})
+    assert r.status_code == 413
+
+
+def test_chunked_body_rejected_while_reading(client, handler_not_reached):
+    def body():
+        yield b'--b\r\nContent-Disposition: form-data; name="file"; filename="a.pdf"\r\n\r\n%PDF-1.4\n'
+        for _ in range(100):
+            yield b"x" * 1000
+        yield b"\r\n--b--\r\n"
+
+    r = client.post("/jobs", content=body(), headers={"content-type": "multipart/form-data; boundary=b"})
+    assert r.status_code == 413
+
+
+def test_file_over_limit_inside_small_body(client):
+    r = client.post("/upload_pdf", files={"file": ("a.pdf", _pdf(LIMIT + 100), "application/pdf")})
+    assert r.status_code == 413
+
+
+def test_not_a_pdf(client):
+    r = client.post("/upload_pdf", files={"file": ("a.pdf", b"hello", "application/pdf")})
+    assert r.status_code == 400
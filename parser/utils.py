@@ -1,47 +1,40 @@
-import pdfplumber
-import os
-import re
+import logging
 
-ICON_DIR = os.getenv("PARSER_ICON_DIR", "/app/icons")
-os.makedirs(ICON_DIR, exist_ok=True)
+from icons import store_image
 
-TIME_RE = re.compile(r'(\d{1,2}[:\.]\d{2})\s*(?:–|-)\s*(\d{1,2}[:\.]\d{2})')
-DATE_RE = re.compile(r'(\d{1,2}[.\-]\d{1,2}[.\-]\d{2,4})')
-LECTURE_WORDS = ['лекц', 'лекция', 'лек']
-SEMINAR_WORDS = ['семинар', 'сем']
+from classifier import classify
+
+logger = logging.getLogger(__name__)
 
 def extract_images_from_page(page):
-    """Извлекает изображения со страницы."""
-    saved = []
-    return saved  # упрощено для начала, потом добавим извлечение
+    """
+    Сохраняет изображения страницы в хранилище icons (каждое уникальное — один раз).
+    Возвращает вхождения [{hash, format, width, height, x0, top, x1, bottom}].
+    """
+    found = []
+    for img in page.images:
+        try:
+            meta = store_image(img)
+        except Exception as e:
+            logger.warning("не удалось извлечь изображение со страницы %s: %s", page.page_number, e)
+            continue
+        if meta:
+            found.append({**meta, "x0": img["x0"], "top": img["top"], "x1": img["x1"], "bottom": img["bottom"]})
+    return found
 
 def simple_normalize_text(text: str) -> str:
     """Нормализует текст (удаляет переносы строк, множественные пробелы)."""
     return ' '.join(text.replace('\r', ' ').split())
 
 def guess_type_from_text(text: str) -> str:
-    """Угадывает тип события по тексту (лекция, семинар, практика)."""
-    low = text.lower()
-    for w in LECTURE_WORDS:
-        if w in low:
-            return "lecture"
-    for w in SEMINAR_WORDS:
-        if w in low:
-            return "seminar"
-    if 'практик' in low or 'лаб' in low:
-        return "practice"
-    return "unknown"
+    """Угадывает тип события по тексту (лекция, семинар, практика). Если нужны и другие поля — зовите classify."""
+    return classify(text)["lesson_type"]
 
 def extract_times(text: str):
-    """Извлекает время начала и окончания из текста."""
-    m = TIME_RE.search(text)
-    if m:
-        return m.group(1).replace('.', ':'), m.group(2).replace('.', ':')
-    return None, None
+    """Извлекает время начала и окончания из текста (HH:MM)."""
+    fields = classify(text)
+    return fields["start"], fields["end"]
 
 def extract_date(text: str):
-    """Извлекает дату из текста."""
-    m = DATE_RE.search(text)
-    if m:
-        return m.group(1)
-    return None
+    """Извлекает дату из текста в ISO (YYYY-MM-DD)."""
+    return classify(text)["date"]
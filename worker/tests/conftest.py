@@ -0,0 +1,15 @@
+"""
+Общие настройки тестов worker: модуль worker и common в sys.path.
+
+Окружение задаётся до импорта worker: он читает настройки при импорте.
+"""
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path[:0] = [str(ROOT / "worker"), str(ROOT)]
+
+os.environ["BACKEND_URL"] = "http://backend.test"
+os.environ["BOT_SERVICE_URL"] = "http://bot.test"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
@@ -0,0 +1,127 @@
+"""
+Цикл Dispatcher против подменённых backend и bot-service (httpx.MockTransport):
+что подтверждается, что засчитывается как неудача, а что просто возвращается из аренды.
+"""
+import asyncio
+import json
+
+import httpx
+from prometheus_client import REGISTRY
+
+import worker
+
+LEASE_ID = "lease-1"
+
+
+def _services(reminder_ids: list, send) -> tuple:
+    """Транспорт, который отдаёт аренду с reminder_ids и передаёт /send в send; записывает ack/fail/release."""
+    calls = {"ack": [], "fail": [], "release": []}
+    events = [{"reminder_id": rid, "id": rid, "type": "homework", "title": f"дз {rid}", "fire_at": "2030-03-09T12:00:00"} for rid in reminder_ids]
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        body = json.loads(request.content or b"{}")
+        if path == "/events/reminders/claim":
+            return httpx.Response(200, json={"lease_id": LEASE_ID, "lease_until": "2030-03-09T12:05:00", "events": events})
+        if path == "/send":
+            return await send(int(body["idempotency_key"].split(":")[1]))
+        calls[path.rsplit("/", 1)[1]].append(body)
+        return httpx.Response(200, json={"ok": True})
+
+    return calls, httpx.MockTransport(handler)
+
+
+def _cycle(transport: httpx.MockTransport) -> tuple:
+    async def scenario():
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await worker.Dispatcher(client).check_and_send()
+
+    return asyncio.run(scenario())
+
+
+def test_cycle_acks_sent_and_reports_failures():
+    async def send(rid: int) -> httpx.Response:
+        if rid == 2:
+            detail = {"error_code": 429, "description": "Too Many Requests", "permanent": False, "retry_after": 30}
+            return httpx.Response(502, json={"detail": detail})
+        if rid == 3:
+            return httpx.Response(502, json={"detail": {"error_code": 403, "description": "bot was blocked", "permanent": True}})
+        return httpx.Response(200, json={"ok": True, "message_id": 100 + rid})
+
+    calls, transport = _services([1, 2, 3], send)
+    assert _cycle(transport) == ({1, 2, 3}, {2, 3})
+
+    assert calls["ack"] == [{"items": [{"id": 1, "sent_message_id": 101}], "lease_id": LEASE_ID}]
+    [fail] = calls["fail"]
+    assert fail["lease_id"] == LEASE_ID
+    assert [(f["id"], f["permanent"], f["retry_after"]) for f in fail["items"]] == [(2, False, 30), (3, True, None)]
+    assert fail["items"][1]["error"] == "Telegram 403: bot was blocked"
+    # Всё неудачное уже засчитано через fail — снимать аренду нечего
+    assert calls["release"] == []
+
+
+def test_deadline_releases_unsent_without_counting_attempt(monkeypatch):
+    monkeypatch.setattr(worker, "CYCLE_DEADLINE", 0.05)
+
+    async def send(rid: int) -> httpx.Response:
+        if rid == 2:
+            await asyncio.sleep(5)
+        return httpx.Response(200, json={"ok": True, "message_id": 100 + rid})
+
+    calls, transport = _services([1, 2], send)
+    assert _cycle(transport) == ({1, 2}, {2})
+    assert calls["ack"] == [{"items": [{"id": 1, "sent_message_id": 101}], "lease_id": LEASE_ID}]
+    assert calls["fail"] == []
+    assert calls["release"] == [{"lease_id": LEASE_ID, "ids": [2]}]
+
+
+def test_sends_run_concurrently_up_to_limit(monkeypatch):
+    monkeypatch.setattr(worker, "CONCURRENCY", 2)
+    active = 0
+    peak = 0
+
+    async def send(rid: int) -> httpx.Response:
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.02)
+        active -= 1
+        return httpx.Response(200, json={"ok": True, "message_id": 100 + rid})
+
+    calls, transport = _services([1, 2, 3, 4, 5], send)
+    assert _cycle(transport) == ({1, 2, 3, 4, 5}, set())
+    assert peak == 2
+    assert sorted(a["id"] for a in calls["ack"][0]["items"]) == [1, 2, 3, 4, 5]
+
+
+def _sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_cycle_metrics(monkeypatch):
+    monkeypatch.setattr(worker, "CYCLE_DEADLINE", 0.05)
+    # Любой цикл длиннее нуля секунд считается перебором
+    monkeypatch.setattr(worker, "POLL_INTERVAL", 0)
+
+    async def send(rid: int) -> httpx.Response:
+        if rid == 2:
+            return httpx.Response(502, json={"detail": {"error_code": 403, "description": "forbidden", "permanent": True}})
+        if rid == 3:
+            await asyncio.sleep(5)
+        return httpx.Response(200, json={"ok": True, "message_id": 100 + rid})
+
+    names = {
+        "sent": ("worker_reminders_sent_total", {"type": "homework"}),
+        "lag": ("worker_reminder_lag_seconds_count", {"type": "homework"}),
+        "permanent": ("worker_reminder_failures_total", {"type": "homework", "kind": "permanent"}),
+        "deadline": ("worker_reminder_failures_total", {"type": "homework", "kind": "deadline"}),
+        "cycles": ("worker_cycle_duration_seconds_count", {}),
+        "overruns": ("worker_cycle_overruns_total", {}),
+    }
+    before = {key: _sample(name, **labels) for key, (name, labels) in names.items()}
+    _, transport = _services([1, 2, 3], send)
+    _cycle(transport)
+    after = {key: _sample(name, **labels) for key, (name, labels) in names.items()}
+    assert {key: after[key] - before[key] for key in names} == {
+        "sent": 1, "lag": 1, "permanent": 1, "deadline": 1, "cycles": 1, "overruns": 1,
+    }
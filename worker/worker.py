@@ -1,13 +1,88 @@
+import asyncio
+import heapq
+import logging
 import os
+import socket
+import time
 import httpx
-from apscheduler.schedulers.blocking import BlockingScheduler
-from datetime import datetime
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+from common import jsonlog, tracing
+
+logger = logging.getLogger("worker")
 
 BACKEND_URL = os.getenv("BACKEND_URL", "http://backend:8000")
 BOT_SERVICE_URL = os.getenv("BOT_SERVICE_URL", "http://bot:8081")
+# Как часто сверять версию данных с backend (дешёвый условный запрос) и через сколько повторять неудачные отправки
 POLL_INTERVAL = int(os.getenv("WORKER_POLL_INTERVAL", "60"))
+# Сколько напоминаний отправлять одновременно
+CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "10"))
+# Максимальная длительность одного цикла отправки; не успевшие отправки откладываются
+CYCLE_DEADLINE = float(os.getenv("WORKER_CYCLE_DEADLINE", str(POLL_INTERVAL)))
+# Таймаут одного запроса к bot-service (сам bot-service перебирает маршруты до Telegram)
+SEND_TIMEOUT = float(os.getenv("WORKER_SEND_TIMEOUT", "60"))
+# Сколько напоминаний арендовать за цикл и на сколько (аренда должна пережить весь цикл)
+CLAIM_BATCH = int(os.getenv("WORKER_CLAIM_BATCH", "100"))
+LEASE_SECONDS = int(os.getenv("WORKER_LEASE_SECONDS", str(int(CYCLE_DEADLINE) + 60)))
+# SSE-поток изменений: backend шлёт keep-alive каждые 15 с, дольше тишины — переподключаемся
+STREAM_READ_TIMEOUT = float(os.getenv("WORKER_STREAM_READ_TIMEOUT", "60"))
+STREAM_RECONNECT_DELAY = float(os.getenv("WORKER_STREAM_RECONNECT_DELAY", "5"))
+WORKER_ID = os.getenv("WORKER_ID", f"{socket.gethostname()}:{os.getpid()}")
+# Порт /metrics для Prometheus (0 — не поднимать)
+METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9101"))
+
+REMINDER_LAG_SECONDS = Histogram(
+    "worker_reminder_lag_seconds",
+    "Delay between intended remind time (fire_at) and actual send",
+    ["type"],
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 4 * 3600, 24 * 3600),
+)
+CYCLE_DURATION_SECONDS = Histogram(
+    "worker_cycle_duration_seconds",
+    "Duration of one claim/send/ack cycle",
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+CYCLE_OVERRUNS_TOTAL = Counter(
+    "worker_cycle_overruns_total",
+    "Cycles that took longer than WORKER_POLL_INTERVAL",
+)
+DUE_BACKLOG = Gauge(
+    "worker_due_backlog",
+    "Reminders already due but not yet sent",
+)
+SCHEDULED_REMINDERS = Gauge(
+    "worker_scheduled_reminders",
+    "Reminders loaded into the local schedule",
+)
+REMINDERS_SENT_TOTAL = Counter(
+    "worker_reminders_sent_total",
+    "Reminders sent successfully",
+    ["type"],
+)
+REMINDER_FAILURES_TOTAL = Counter(
+    "worker_reminder_failures_total",
+    "Reminders that failed or missed the cycle deadline",
+    ["type", "kind"],
+)
+UPSTREAM_CALL_SECONDS = Histogram(
+    "worker_upstream_call_duration_seconds",
+    "Time spent in calls to bot-service and backend",
+    ["service", "call"],
+)
+
+
+@contextmanager
+def _upstream(service: str, call: str, **attributes):
+    """Замер запроса к bot-service/backend: метрика и клиентский спан (заголовки для него — _headers())."""
+    with UPSTREAM_CALL_SECONDS.labels(service=service, call=call).time():
+        with tracing.span(f"{service} {call}", kind="client", **attributes) as s:
+            yield s
 
-scheduler = BlockingScheduler()
+
+def _headers(headers: dict | None = None) -> dict:
+    """Заголовки исходящего запроса: id корреляции цикла и traceparent текущего спана."""
+    return tracing.inject({**jsonlog.propagation_headers(), **(headers or {})})
 
 
 def _format_exam_control_reminder(ev: dict, date) -> str:
@@ -30,52 +105,380 @@ def _format_exam_control_reminder(ev: dict, date) -> str:
     return "\n".join(lines)
 
 
-@scheduler.scheduled_job('interval', seconds=POLL_INTERVAL)
-def check_and_send():
-    """Проверяет и отправляет напоминания о предстоящих событиях."""
-    print(datetime.utcnow().isoformat(), "Worker: проверка напоминаний")
+def _when_label(offset_hours) -> str:
+    """Подпись к напоминанию по смещению: «завтра», «через 7 дн.», «через 1 ч»."""
     try:
-        with httpx.Client() as client:
-            r = client.get(f"{BACKEND_URL}/events/due_reminders", timeout=10.0)
+        hours = int(offset_hours)
+    except (TypeError, ValueError):
+        return "завтра"
+    if hours == 24:
+        return "завтра"
+    if hours and hours % 24 == 0:
+        return f"через {hours // 24} дн."
+    return f"через {hours} ч"
+
+
+def _build_reminder_text(ev: dict) -> str:
+    date = ev.get("date")
+    ev_type = (ev.get("type") or "").lower()
+    if ev_type == "exam_control":
+        return _format_exam_control_reminder(ev, date)
+    title = (ev.get("title") or "").strip()
+    body = ev.get("body") or ""
+    room = ev.get("room") or None
+    teacher = ev.get("teacher") or None
+    text = f"⏰ Напоминание: {_when_label(ev.get('offset_hours', 24))} ({date})"
+    if title:
+        text += f" — {title}"
+        if room:
+            text += f" ({room})"
+    else:
+        if room:
+            text += f" — Аудитория {room}"
+    if teacher:
+        text += f"\nПреподаватель: {teacher}"
+    if body:
+        text += f"\n{body}"
+    return text
+
+
+async def _dispatch_one(client: httpx.AsyncClient, ev: dict) -> dict:
+    """Отправляет одно напоминание; возвращает подтверждение {id, sent_message_id} для backend."""
+    payload = {
+        "chat_id": ev.get("chat_id"),
+        "thread_id": ev.get("thread_id"),
+        "text": _build_reminder_text(ev),
+        # Повтор после таймаута или падения до подтверждения (ack) вернёт исходный message_id
+        # (fire_at в ключе: после переноса события напоминание уйдёт заново)
+        "idempotency_key": f"reminder:{ev.get('reminder_id')}:{ev.get('fire_at')}",
+    }
+    with _upstream("bot", "send", reminder_id=ev.get("reminder_id")) as s:
+        resp = await client.post(
+            f"{BOT_SERVICE_URL}/send", json=payload, headers=_headers(), timeout=SEND_TIMEOUT,
+        )
+        s.set(**{"http.status_code": resp.status_code})
+    resp.raise_for_status()
+    ev_type = ev.get("type") or "unknown"
+    REMINDERS_SENT_TOTAL.labels(type=ev_type).inc()
+    try:
+        lag = (datetime.utcnow() - datetime.fromisoformat(ev["fire_at"])).total_seconds()
+        REMINDER_LAG_SECONDS.labels(type=ev_type).observe(max(0.0, lag))
+    except (KeyError, TypeError, ValueError):
+        pass
+    message_id = resp.json().get("message_id")
+    logger.debug("напоминание отправлено", extra={"reminder_id": ev.get("reminder_id"), "message_id": message_id})
+    return {"id": ev.get("reminder_id"), "sent_message_id": message_id}
+
+
+async def _ack(client: httpx.AsyncClient, lease_id: str, acks: list) -> None:
+    """Помечает все отправленные за цикл напоминания одним запросом к backend."""
+    if not acks:
+        return
+    try:
+        with _upstream("backend", "ack"):
+            r = await client.post(
+                f"{BACKEND_URL}/events/reminders/ack",
+                json={"items": acks, "lease_id": lease_id},
+                headers=_headers(),
+                timeout=10.0,
+            )
+        r.raise_for_status()
+    except Exception as e:
+        # Не страшно: при повторе bot-service вернёт тот же message_id по ключу идемпотентности
+        logger.warning("не удалось подтвердить отправленные напоминания: %s", e)
+
+
+def _failure_info(reminder_id: int, exc: BaseException) -> dict:
+    """
+    Описание неудачной отправки для backend: {id, error, permanent, retry_after}.
+    bot-service отдаёт ошибку Telegram структурированно (permanent для 400/403);
+    прочие 4xx от bot-service (например, не задан chat_id) тоже не исправятся повтором.
+    """
+    info = {"id": reminder_id, "error": f"{type(exc).__name__}: {exc}"[:500], "permanent": False, "retry_after": None}
+    if isinstance(exc, httpx.HTTPStatusError):
+        try:
+            detail = exc.response.json().get("detail")
+        except ValueError:
+            detail = None
+        if isinstance(detail, dict):
+            info["error"] = f"Telegram {detail.get('error_code')}: {detail.get('description')}"
+            info["permanent"] = bool(detail.get("permanent"))
+            info["retry_after"] = detail.get("retry_after")
+        elif detail:
+            info["error"] = str(detail)[:500]
+        status = exc.response.status_code
+        if 400 <= status < 500 and status != 429:
+            info["permanent"] = True
+    return info
+
+
+async def _fail(client: httpx.AsyncClient, lease_id: str, failures: list) -> None:
+    """Сообщает backend о неудачных отправках: он назначит повтор с паузой или переведёт в dead."""
+    if not failures:
+        return
+    try:
+        with _upstream("backend", "fail"):
+            r = await client.post(
+                f"{BACKEND_URL}/events/reminders/fail",
+                json={"lease_id": lease_id, "items": failures},
+                headers=_headers(),
+                timeout=10.0,
+            )
+        r.raise_for_status()
+    except Exception as e:
+        # Аренда истечёт через WORKER_LEASE_SECONDS, попытка просто не будет засчитана
+        logger.warning("не удалось сообщить о неудачных отправках: %s", e)
+
+
+async def _release(client: httpx.AsyncClient, lease_id: str, ids: list) -> None:
+    """Возвращает неудачные напоминания из аренды, чтобы их мог взять любой worker."""
+    if not ids:
+        return
+    try:
+        with _upstream("backend", "release"):
+            r = await client.post(
+                f"{BACKEND_URL}/events/reminders/release",
+                json={"lease_id": lease_id, "ids": ids},
+                headers=_headers(),
+                timeout=10.0,
+            )
+        r.raise_for_status()
+    except Exception as e:
+        # Аренда всё равно истечёт через WORKER_LEASE_SECONDS
+        logger.warning("не удалось снять аренду с напоминаний: %s", e)
+
+
+class Dispatcher:
+    """
+    Параллельная отправка напоминаний: не больше WORKER_CONCURRENCY одновременно,
+    цикл ограничен WORKER_CYCLE_DEADLINE. Циклы не перекрываются (single-flight),
+    а напоминание, которое уже отправляется, повторно не берётся. Напоминания арендуются
+    у backend, поэтому несколько worker-ов не отправят одно и то же дважды.
+    """
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self._cycle_lock = asyncio.Lock()
+        self._semaphore = asyncio.Semaphore(CONCURRENCY)
+        self._in_flight: set = set()
+
+    async def _send(self, ev: dict) -> dict:
+        async with self._semaphore:
+            return await _dispatch_one(self.client, ev)
+
+    async def check_and_send(self) -> tuple:
+        """
+        Арендует и отправляет наступившие напоминания.
+        Возвращает (id арендованных напоминаний, id напоминаний с ошибкой отправки).
+        """
+        if self._cycle_lock.locked():
+            # Предыдущий цикл ещё идёт — он и так отправит всё, что пора
+            return set(), set()
+        async with self._cycle_lock:
+            started = time.monotonic()
+            # Один id корреляции на цикл: его получают claim/ack/fail у backend и все отправки в bot-service
+            token = jsonlog.bind()
+            try:
+                with tracing.span("worker.cycle", worker_id=WORKER_ID):
+                    return await self._cycle()
+            finally:
+                jsonlog.correlation_id.reset(token)
+                elapsed = time.monotonic() - started
+                CYCLE_DURATION_SECONDS.observe(elapsed)
+                if elapsed > POLL_INTERVAL:
+                    CYCLE_OVERRUNS_TOTAL.inc()
+
+    async def _cycle(self) -> tuple:
+        logger.debug("проверка напоминаний")
+        failed = set()
+        try:
+            with _upstream("backend", "claim"):
+                r = await self.client.post(
+                    f"{BACKEND_URL}/events/reminders/claim",
+                    json={"limit": CLAIM_BATCH, "lease_seconds": LEASE_SECONDS},
+                    headers=_headers(),
+                    timeout=10.0,
+                )
             r.raise_for_status()
-            events = r.json()
-            for ev in events:
-                date = ev.get("date")
-                ev_type = (ev.get("type") or "").lower()
-                if ev_type == "exam_control":
-                    text = _format_exam_control_reminder(ev, date)
+            lease = r.json()
+            events = [ev for ev in lease.get("events", []) if ev.get("reminder_id") not in self._in_flight]
+        except Exception as e:
+            logger.warning("проверка напоминаний не удалась: %s", e)
+            return set(), failed
+        if not events:
+            return set(), failed
+
+        tasks = {}
+        acks = []
+        failures = []
+        types = {}
+        for ev in events:
+            self._in_flight.add(ev.get("reminder_id"))
+            tasks[asyncio.create_task(self._send(ev))] = ev.get("reminder_id")
+            types[ev.get("reminder_id")] = ev.get("type") or "unknown"
+        try:
+            done, pending = await asyncio.wait(tasks, timeout=CYCLE_DEADLINE)
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+                logger.warning("цикл не уложился в %s с, отложено напоминаний: %s", CYCLE_DEADLINE, len(pending))
+            for task, reminder_id in tasks.items():
+                if task.cancelled():
+                    # Не уложились в дедлайн — это не ошибка доставки, попытку не засчитываем
+                    failed.add(reminder_id)
+                    REMINDER_FAILURES_TOTAL.labels(type=types[reminder_id], kind="deadline").inc()
+                elif task.exception() is not None:
+                    failed.add(reminder_id)
+                    info = _failure_info(reminder_id, task.exception())
+                    failures.append(info)
+                    kind = "permanent" if info["permanent"] else "transient"
+                    REMINDER_FAILURES_TOTAL.labels(type=types[reminder_id], kind=kind).inc()
+                    logger.error("ошибка отправки напоминания %s: %s", reminder_id, info["error"], extra={"reminder_id": reminder_id, "permanent": info["permanent"]})
                 else:
-                    title = (ev.get("title") or "").strip()
-                    body = ev.get("body") or ""
-                    room = ev.get("room") or None
-                    teacher = ev.get("teacher") or None
-                    text = f"⏰ Напоминание: завтра ({date})"
-                    if title:
-                        text += f" — {title}"
-                        if room:
-                            text += f" ({room})"
-                    else:
-                        if room:
-                            text += f" — Аудитория {room}"
-                    if teacher:
-                        text += f"\nПреподаватель: {teacher}"
-                    if body:
-                        text += f"\n{body}"
-                payload = {
-                    "chat_id": ev.get("chat_id"),
-                    "thread_id": ev.get("thread_id"),
-                    "text": text
-                }
+                    acks.append(task.result())
+            await _ack(self.client, lease["lease_id"], acks)
+            await _fail(self.client, lease["lease_id"], failures)
+            failed_ids = {f["id"] for f in failures}
+            await _release(self.client, lease["lease_id"], sorted(failed - failed_ids))
+        finally:
+            self._in_flight.difference_update(tasks.values())
+        return set(tasks.values()), failed
+
+
+class ReminderSchedule:
+    """
+    Мин-куча (remind_at, reminder_id) с напоминаниями из backend.
+    Перезагружается только когда backend сообщает о новой версии данных (ETag / 304).
+    """
+
+    def __init__(self):
+        self.heap: list[tuple[datetime, int]] = []
+        self.etag: str | None = None
+        # reminder_id -> не раньше какого момента повторять неудачную отправку
+        self.deferred: dict[int, datetime] = {}
+
+    async def refresh(self, client: httpx.AsyncClient) -> bool:
+        """Сверяет версию с backend; возвращает True, если расписание перезагружено."""
+        headers = {"If-None-Match": self.etag} if self.etag else {}
+        with _upstream("backend", "upcoming"):
+            r = await client.get(f"{BACKEND_URL}/events/upcoming_reminders", headers=_headers(headers), timeout=10.0)
+        if r.status_code == 304:
+            return False
+        r.raise_for_status()
+        data = r.json()
+        now = datetime.utcnow()
+        self.deferred = {k: v for k, v in self.deferred.items() if v > now}
+        self.heap = []
+        for item in data.get("reminders", []):
+            remind_at = datetime.fromisoformat(item["remind_at"])
+            retry_at = self.deferred.get(item["id"])
+            if retry_at is not None and retry_at > remind_at:
+                remind_at = retry_at
+            self.heap.append((remind_at, item["id"]))
+        heapq.heapify(self.heap)
+        self.etag = r.headers.get("ETag")
+        return True
+
+    def due_count(self, now: datetime) -> int:
+        return sum(1 for remind_at, _ in self.heap if remind_at <= now)
+
+    def next_due(self) -> datetime | None:
+        return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, now: datetime) -> list[int]:
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            due.append(heapq.heappop(self.heap)[1])
+        return due
+
+    def defer(self, reminder_id: int, until: datetime) -> None:
+        """Откладывает повтор неудачной отправки до until (переживает перезагрузку кучи)."""
+        self.deferred[reminder_id] = until
+        heapq.heappush(self.heap, (until, reminder_id))
+
+
+async def watch_changes(changed: asyncio.Event) -> None:
+    """
+    Слушает SSE-поток изменений backend и будит основной цикл при каждом изменении,
+    чтобы новые и перенесённые напоминания попадали в кучу сразу, а не при следующей сверке.
+    """
+    timeout = httpx.Timeout(10.0, read=STREAM_READ_TIMEOUT)
+    while True:
+        try:
+            async with httpx.AsyncClient(timeout=timeout) as client:
+                async with client.stream("GET", f"{BACKEND_URL}/events/stream") as r:
+                    r.raise_for_status()
+                    async for line in r.aiter_lines():
+                        # hello (после переподключения) и change — в обоих случаях сверяем версию
+                        if line.startswith("event:"):
+                            changed.set()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("поток изменений backend недоступен, переподключение: %s", e)
+        await asyncio.sleep(STREAM_RECONNECT_DELAY)
+
+
+async def run():
+    """
+    Спит ровно до ближайшего напоминания, следующей сверки версии или сообщения
+    из потока изменений, затем отправляет всё, что уже пора.
+    """
+    schedule = ReminderSchedule()
+    next_refresh = datetime.utcnow()
+    changed = asyncio.Event()
+    watcher = asyncio.create_task(watch_changes(changed))
+    try:
+        limits = httpx.Limits(max_connections=CONCURRENCY * 2, max_keepalive_connections=CONCURRENCY)
+        async with httpx.AsyncClient(limits=limits) as client:
+            dispatcher = Dispatcher(client)
+            while True:
+                now = datetime.utcnow()
+                if now >= next_refresh:
+                    try:
+                        if await schedule.refresh(client):
+                            logger.info("расписание обновлено, напоминаний: %s", len(schedule.heap))
+                    except Exception as e:
+                        logger.warning("не удалось обновить расписание напоминаний: %s", e)
+                    next_refresh = now + timedelta(seconds=POLL_INTERVAL)
+
+                SCHEDULED_REMINDERS.set(len(schedule.heap))
+                DUE_BACKLOG.set(schedule.due_count(now))
+                due = schedule.pop_due(now)
+                if due:
+                    claimed, failed = await dispatcher.check_and_send()
+                    # Неудачные не раньше чем через интервал (точное время повтора с паузой назначит backend)
+                    retry_at = datetime.utcnow() + timedelta(seconds=POLL_INTERVAL)
+                    for reminder_id in failed:
+                        schedule.defer(reminder_id, retry_at)
+                    # Не достались нам — их арендовал другой worker; если он упадёт, подберём после истечения аренды
+                    lease_check_at = datetime.utcnow() + timedelta(seconds=LEASE_SECONDS)
+                    for reminder_id in set(due) - claimed:
+                        schedule.defer(reminder_id, lease_check_at)
+                    # Отметки об отправке изменили версию — сверимся сразу
+                    next_refresh = datetime.utcnow()
+                    continue
+
+                wake_at = next_refresh
+                nxt = schedule.next_due()
+                if nxt is not None and nxt < wake_at:
+                    wake_at = nxt
                 try:
-                    resp = client.post(f"{BOT_SERVICE_URL}/send", json=payload, timeout=10.0)
-                    resp.raise_for_status()
-                    # Помечаем как отправленное
-                    client.post(f"{BACKEND_URL}/events/{ev.get('id')}/mark_reminder_sent", timeout=5.0)
-                except Exception as e:
-                    print("❌ Worker: ошибка отправки напоминания для события", ev.get("id"), e)
-    except Exception as e:
-        print("⚠️ Проверка Worker не удалась:", e)
+                    await asyncio.wait_for(changed.wait(), timeout=max(0.0, (wake_at - datetime.utcnow()).total_seconds()))
+                    changed.clear()
+                    next_refresh = datetime.utcnow()
+                except asyncio.TimeoutError:
+                    pass
+    finally:
+        watcher.cancel()
+
 
 if __name__ == '__main__':
-    print("✅ Worker запущен, опрашивает каждые", POLL_INTERVAL, "секунд")
-    scheduler.start()
+    jsonlog.setup("worker")
+    tracing.setup("worker")
+    logger.info("worker %s запущен, сверяет расписание с backend каждые %s секунд", WORKER_ID, POLL_INTERVAL)
+    if METRICS_PORT:
+        start_http_server(METRICS_PORT)
+        logger.info("метрики Prometheus на порту %s", METRICS_PORT)
+    asyncio.run(run())